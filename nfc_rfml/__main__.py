@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from nfc_rfml import app
+import os
+import sys
+
+# The modules of the project import each other from this folder (e.g. `from dataset.format import ...`)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import main
 
 if __name__ == '__main__':
-    app.main()
+    main()
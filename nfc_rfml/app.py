@@ -1,45 +1,401 @@
+import os
+import csv
 from pathlib import Path
-
+from threading import Thread
+from datetime import datetime
+from collections import Counter
+from argparse import ArgumentParser
 import numpy as np
 
+from dataset.capture import open_capture
 from dataset.configuration import load_conf, save_conf
-from dataset.format import read_dataset
-from learn.build import reload_model, build_cnn, build_svm
-from learn.evaluate import analyse_model
+from dataset.decode import READER_THRESHOLD, SAMPLE_RATE, decode_signal, format_frame
+from dataset.format import read_dataset, split_indices, tags_files
+from dataset.normalize import WindowStats
+from dataset.tsfeatures import FEATURE_SETS, INDEX_COLUMNS
+from serve.batching import BatchScheduler
+from serve.feature_model import DESCRIPTION as FEATURE_MODEL
+from serve.engine import InferenceEngine, measure_latency, window_shape
+from serve.sources import file_source, socket_source
+
+# The modules depending on TensorFlow, sklearn or matplotlib are imported by the functions which need them, so that
+# the other commands start quickly
+
+# The default paths are relative to this folder, wherever the commands are run from
+PACKAGE = Path(__file__).resolve().parent
+EXPERIMENT = "experiment.json"
+CONF = PACKAGE / EXPERIMENT
+MODELS = PACKAGE.parent / "saved_models"
+DATA = PACKAGE.parent / "data" / "dataset" / "2"
+STATS = Path("normalization.json")
+
+
+def preprocess_data(conf_path=CONF):
+    print("Load experiment configuration_________")
+    conf = load_conf(conf_path, model=False)
+    if not conf['data'].get('cache'):
+        print("No cache folder is configured, the preprocessed dataset will not be kept")
+
+    print("Read dataset__________________________")
+    X, y, _ = read_dataset(conf['data'])
+    labels, counts = np.unique(y, return_counts=True)
+    print(f"{len(X)} windows of shape {X.shape[1:]}:", dict(zip(labels.tolist(), counts.tolist())))
 
-CONF = Path("experiment.json")
-MODELS = Path("../saved_models")
-MODEL_TO_RELOAD = Path("youssef-ds2-all-640-fixed")
 
+def train_model(conf_path=CONF, output_dir=MODELS):
+    from learn.build import build_cnn, build_svm
 
-def train_model():
     print("Load experiment configuration_________")
-    conf = load_conf(CONF)
+    conf = load_conf(conf_path)
     print("Read dataset__________________________")
-    X, y = read_dataset(conf['data'])
+    X, y, stats = read_dataset(conf['data'])
 
     print("Build model and train it______________")
+    oversample = conf['data'].get('balance') == "oversample"
     if conf['model']['type'] == "svm":
-        build_svm(X, y)
+        build_svm(X, y, conf['model'], oversample)
     else:
-        save_path = build_cnn(X, y, conf['model'])
+        save_path = build_cnn(X, y, conf['model'], output_dir, oversample=oversample)
         print("Save model and performance data_______")
-        save_conf(CONF, save_path)
+        save_conf(conf_path, save_path)
+        # Keep the training normalization statistics to apply them to new data
+        if stats is not None:
+            stats.save(save_path / STATS)
 
 
-def load_model(model_path):
+def compare_svm(conf_path=CONF, engines=None):
+    from learn.svm import ENGINES, compare_svms, train_test_indices
+    from dataset.format import oversample_indices
+
     print("Load experiment configuration_________")
-    conf = load_conf(model_path / CONF)
+    conf = load_conf(conf_path, model=False)
     print("Read dataset__________________________")
-    X, y = read_dataset(conf['data'])
-    X = np.expand_dims(X, axis=3)
+    X, y, _ = read_dataset(conf['data'])
+    train, test = train_test_indices(len(y))
+    if conf['data'].get('balance') == "oversample":
+        train = oversample_indices(y, train)
+
+    print("Compare SVM engines___________________")
+    compare_svms(X, y, train, test, conf['model'], engines or ENGINES)
+
+
+def load_model(model_path, output_dir=None):
+    from learn.build import reload_model
+    from learn.evaluate import analyse_model
+
+    print("Load experiment configuration_________")
+    conf = load_conf(model_path / EXPERIMENT)
+    # Normalize the data as the training data was (older models did not save their statistics)
+    stats = WindowStats.load(model_path / STATS) if (model_path / STATS).exists() else None
+    print("Read dataset__________________________")
+    X, y, _ = read_dataset(conf['data'], stats)
 
     print("Reload model__________________________")
     model = reload_model(model_path / "model.tf", conf, X.shape[1:])
     print("Analyse model performance_____________")
-    analyse_model(model, X, y, conf['data']['classes'], model_path / "rerun-model")
+    output_dir = Path(output_dir or model_path / "rerun-model")
+    os.makedirs(output_dir / "wrong-predictions", exist_ok=True)
+    os.makedirs(output_dir / "correct-predictions", exist_ok=True)
+    analyse_model(model, X, y, conf['data']['classes'], output_dir, conf['model']['batchsize'],
+                  conf['model'].get('maxplots', 100))
+
+
+def quantize(model_path):
+    from learn.build import reload_model
+    from learn.quantize import quantize_model
+
+    print("Load experiment configuration_________")
+    conf = load_conf(model_path / EXPERIMENT)
+    stats = WindowStats.load(model_path / STATS) if (model_path / STATS).exists() else None
+    print("Read dataset__________________________")
+    X, y, _ = read_dataset(conf['data'], stats)
+    # The same split as during training, the calibration windows are taken from the training data
+    train, _, test = split_indices(y, 0.7, 0.2, 0.1, conf['model'].get('seed', 42))
+
+    print("Reload model__________________________")
+    model = reload_model(model_path / "model.tf", conf, X.shape[1:])
+    print("Quantize model and compare versions___")
+    quantize_model(model, X, y, train, test, model_path, conf['model']['batchsize'])
+
+
+def sweep(spec_path, output_dir=None, workers=1, threads=None):
+    from learn.sweep import read_sweep, run_sweep
+
+    print("Read sweep description________________")
+    trials, pruner = read_sweep(spec_path)
+    output_dir = output_dir or MODELS / f"sweep-{datetime.now():%Y-%m-%d %Hh%M}"
+    rows = run_sweep(trials, output_dir, workers, threads, pruner)
+
+    print("Results_______________________________")
+    for row in rows:
+        print(row)
+
+
+def tsfeatures(data_path, tags, output, cache_dir=None, window_size=256, max_windows=None, features="efficient",
+               jobs=0, chunksize=None, select=False):
+    from dataset.tsfeatures import extract_captures, write_table, select_table
+
+    files = [file for group in tags_files(data_path, tags) for file in group]
+    # The cached tables use the format of the output, next to which they are kept by default
+    extension = "parquet" if output.suffix == ".parquet" else "npz"
+    cache_dir = cache_dir or output.parent / "tsfeatures-cache"
+
+    print("Extract features______________________")
+    table = extract_captures(data_path, files, cache_dir, window_size, max_windows, features, jobs, chunksize,
+                             extension)
+    write_table(table, output)
+    print(f"{len(table)} windows of {table.shape[1] - len(INDEX_COLUMNS)} features written in {output}")
+
+    if select:
+        print("Select features_______________________")
+        selected = select_table(table)
+        with open(output.parent / "selected_features.csv", "w", newline="") as file:
+            csv.writer(file).writerows([["feature"]] + [[name] for name in selected])
+        print(f"{len(selected)} features selected")
+
+
+def train_features(selected_path, data_path, tags, output_dir=MODELS, cache_dir=None, window_size=256,
+                   max_windows=None, jobs=0):
+    from dataset.tsfeatures import SelectedFeatures, read_selected, extract_captures
+    from learn.build import build_feature_model
+
+    names = read_selected(selected_path)
+    files = [file for group in tags_files(data_path, tags) for file in group]
+    cache_dir = cache_dir or selected_path.parent / "tsfeatures-cache"
+
+    print(f"Extract {len(names)} selected features___")
+    # Only the calculators of the selected features are run
+    # The undefined features are imputed with the values of the training windows only
+    table = extract_captures(data_path, files, cache_dir, window_size, max_windows, SelectedFeatures(names).parameters,
+                             jobs, impute=False)
+
+    print("Build model and train it______________")
+    model_dir = build_feature_model(table, names, window_size, output_dir)
+    print(f"Model saved in {model_dir}")
+
+
+def load_engine(model_path, exported=False):
+    print("Load model____________________________")
+    # The models trained on selected features are classical models, run with their own extractor
+    if (Path(model_path) / FEATURE_MODEL).exists():
+        return InferenceEngine.from_feature_model(model_path)
+    # The exported TFLite model can be run without TensorFlow
+    if exported:
+        return InferenceEngine.from_exported_model(model_path)
+    return InferenceEngine.from_saved_model(model_path)
+
+
+def predict(model_path, captures, exported=False, output=None):
+    engine = load_engine(model_path, exported)
+    rows = []
+
+    print("Identify tags_________________________")
+    for capture in captures:
+        # Each capture is a separate stream, the model is shared
+        capture_engine = InferenceEngine(engine.model, engine.conf, engine.stats, batch_size=256)
+        predictions = list(capture_engine.run(file_source(capture, chunk_size=2**20)))
+        rows += [(capture, p.start, p.tag, p.confidence) for p in predictions]
+
+        votes = Counter(p.tag for p in predictions)
+        if votes:
+            tag, count = votes.most_common(1)[0]
+            print(f"{capture}: tag {tag} ({count}/{len(predictions)} windows)", dict(votes))
+        else:
+            print(f"{capture}: no window detected")
+
+    if output is not None:
+        with open(output, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["capture", "start", "tag", "confidence"])
+            writer.writerows(rows)
+
+
+def benchmark(model_path, batch_sizes=(1, 32, 500), exported=False):
+    engine = load_engine(model_path, exported)
+    shape = window_shape(engine.format_windows, engine.conf['data']['windowsize'])
+
+    print("Measure latency_______________________")
+    for batch_size in batch_sizes:
+        latency = measure_latency(engine.forward, shape, batch_size, repetitions=max(1000 // batch_size, 10))
+        print(f"Batch size {batch_size}: {latency:.3f} ms per batch, {batch_size / latency * 1000:.0f} windows/s")
+
+
+def decode(captures, sample_rate=SAMPLE_RATE, threshold=READER_THRESHOLD, output=None):
+    lines = []
+
+    for capture in captures:
+        frames = decode_signal(open_capture(capture), sample_rate, threshold)
+        print(f"{capture}: {sum(f.source == 'Reader' for f in frames)} reader frames, "
+              f"{sum(f.source == 'Tag' for f in frames)} tag frames")
+        lines += [format_frame(frame) for frame in frames]
+
+    if output is None:
+        print("\n".join(lines))
+    else:
+        with open(output, "w") as file:
+            file.writelines(f"{line}\n" for line in lines)
+
+
+def parse_source(source, follow=False):
+    """Open a source of samples from its description on the command line.
+    :param source: "tcp:host:port" for a TCP socket, "unix:path" for a Unix socket, or the path to a file or FIFO
+    :param follow: Whether to wait for new samples at the end of a file
+    :return: A generator of arrays of samples
+    """
+    if source.startswith("tcp:"):
+        host, port = source[len("tcp:"):].rsplit(":", 1)
+        return socket_source((host, int(port)))
+    if source.startswith("unix:"):
+        return socket_source(source[len("unix:"):])
+    return file_source(source, follow=follow)
+
+
+def serve_model(model_path, sources, max_batch_size=64, max_wait=0.002, exported=False):
+    engine = load_engine(model_path, exported)
+    # The windows of all the readers are classified together
+    scheduler = BatchScheduler(engine.forward, max_batch_size, max_wait)
+    engines = [InferenceEngine(engine.model, engine.conf, engine.stats, scheduler=scheduler) for _ in sources]
+
+    def identify(reader, reader_engine, source):
+        for prediction in reader_engine.run(source):
+            print(f"Reader {reader}: tag {prediction.tag} ({prediction.confidence:.2f}) at sample {prediction.start}: "
+                  f"{prediction.latency * 1000:.1f} ms")
+
+    print("Identify tags_________________________")
+    readers = [Thread(target=identify, args=reader) for reader in zip(range(len(sources)), engines, sources)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+
+    scheduler.close()
+    for reader, reader_engine in enumerate(engines):
+        print(f"Reader {reader}:", reader_engine.latency_report())
+    print("Batches:", scheduler.report())
+
+
+def main(arguments=None):
+    parser = ArgumentParser(description="Identify NFC tags from their I/Q signals with machine learning")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("preprocess", help="Read and preprocess the dataset, filling the cache")
+    command.add_argument("--conf", help="The experiment configuration", default=CONF, type=Path)
+
+    command = commands.add_parser("train", help="Train a model and save it with its performance data")
+    command.add_argument("--conf", help="The experiment configuration", default=CONF, type=Path)
+    command.add_argument("--output", help="The folder in which the model's folder is created", default=MODELS,
+                         type=Path)
+
+    command = commands.add_parser("compare-svm", help="Compare the training time and accuracy of the SVM engines")
+    command.add_argument("--conf", help="The experiment configuration", default=CONF, type=Path)
+    command.add_argument("--engines", help="The engines to compare (default: all of them)", nargs="+")
+
+    command = commands.add_parser("sweep", help="Train the variants of an experiment in parallel and compare them")
+    command.add_argument("spec", help="The description of the sweep (see sweep.json)", type=Path)
+    command.add_argument("--output", help="The folder of the sweep (default: a new folder in saved_models)",
+                         type=Path)
+    command.add_argument("--workers", help="The number of trials run at the same time", default=1, type=int)
+    command.add_argument("--threads", help="The number of CPU threads of each trial", type=int)
+
+    command = commands.add_parser("evaluate", help="Analyse the performance of a saved model on its dataset")
+    command.add_argument("model", help="The folder of the saved model", type=Path)
+    command.add_argument("--output", help="The folder for the results (default: rerun-model in the model's folder)",
+                         type=Path)
+
+    command = commands.add_parser("quantize", help="Export quantized versions of a saved model and compare them")
+    command.add_argument("model", help="The folder of the saved model", type=Path)
+
+    command = commands.add_parser("tsfeatures", help="Extract tsfresh features from the windows of the captures")
+    command.add_argument("--datapath", help="The folder of the captures", default=DATA,
+                         type=Path)
+    command.add_argument("--tags", help="The tags whose captures are read", default=[1, 6, 9], type=int, nargs="+")
+    command.add_argument("--output", help="The table of features, a .parquet or .npz file",
+                         default=Path("features.npz"), type=Path)
+    command.add_argument("--cache", help="The folder of the features of each capture (default: next to the output)",
+                         type=Path)
+    command.add_argument("--windowsize", help="The number of samples per window", default=256, type=int)
+    command.add_argument("--maxwindows", help="The maximum number of windows per capture", type=int)
+    command.add_argument("--features", help="The tsfresh feature set", default="efficient",
+                         choices=FEATURE_SETS)
+    command.add_argument("--jobs", help="The number of extraction processes (0 to extract in this process)",
+                         default=os.cpu_count(), type=int)
+    command.add_argument("--chunksize", help="The number of series given to a process at once", type=int)
+    command.add_argument("--select", help="Also write the relevant features in selected_features.csv",
+                         action="store_true")
+
+    command = commands.add_parser("train-features", help="Train a classical model on the selected tsfresh features")
+    command.add_argument("selected", help="The selected features (selected_features.csv)", type=Path)
+    command.add_argument("--datapath", help="The folder of the captures", default=DATA,
+                         type=Path)
+    command.add_argument("--tags", help="The tags whose captures are read", default=[1, 6, 9], type=int, nargs="+")
+    command.add_argument("--output", help="The folder in which the model's folder is created", default=MODELS,
+                         type=Path)
+    command.add_argument("--cache", help="The folder of the features of each capture (default: next to the selection)",
+                         type=Path)
+    command.add_argument("--windowsize", help="The number of samples per window", default=256, type=int)
+    command.add_argument("--maxwindows", help="The maximum number of windows per capture", type=int)
+    command.add_argument("--jobs", help="The number of extraction processes (0 to extract in this process)",
+                         default=os.cpu_count(), type=int)
+
+    command = commands.add_parser("predict", help="Identify the tags in capture files")
+    command.add_argument("model", help="The folder of the saved model", type=Path)
+    command.add_argument("captures", help="The capture files (raw complex64 samples)", nargs="+")
+    command.add_argument("--output", help="A csv file in which to write every prediction", type=Path)
+    command.add_argument("--exported", help="Use the exported TFLite model", action="store_true")
+
+    command = commands.add_parser("benchmark", help="Measure the inference latency of a saved model")
+    command.add_argument("model", help="The folder of the saved model", type=Path)
+    command.add_argument("--batch-sizes", help="The batch sizes to measure", default=[1, 32, 500], type=int,
+                         nargs="+")
+    command.add_argument("--exported", help="Use the exported TFLite model", action="store_true")
+
+    command = commands.add_parser("decode", help="Decode the NFC-A frames of the reader and the tag in capture files")
+    command.add_argument("captures", help="The capture files (raw complex64 samples)", nargs="+")
+    command.add_argument("--samplerate", help="The sample rate of the captures", default=SAMPLE_RATE, type=float)
+    command.add_argument("--threshold", help="The magnitude under which the reader's carrier is paused",
+                         default=READER_THRESHOLD, type=float)
+    command.add_argument("--output", help="A text file in which to write the frames", type=Path)
+
+    command = commands.add_parser("serve", help="Identify tags live from files, FIFOs or sockets")
+    command.add_argument("model", help="The folder of the saved model", type=Path)
+    command.add_argument("sources", help="A file or FIFO path, tcp:host:port or unix:path for each reader",
+                         nargs="+")
+    command.add_argument("--follow", help="Wait for new samples at the end of the files", action="store_true")
+    command.add_argument("--max-batch-size", help="The maximum number of windows per batch", default=64, type=int)
+    command.add_argument("--max-wait", help="The maximum time to wait for a batch to fill, in seconds",
+                         default=0.002, type=float)
+    command.add_argument("--exported", help="Use the exported TFLite model", action="store_true")
+
+    args = parser.parse_args(arguments)
+
+    if args.command == "preprocess":
+        preprocess_data(args.conf)
+    elif args.command == "train":
+        train_model(args.conf, args.output)
+    elif args.command == "compare-svm":
+        compare_svm(args.conf, args.engines)
+    elif args.command == "sweep":
+        sweep(args.spec, args.output, args.workers, args.threads)
+    elif args.command == "evaluate":
+        load_model(args.model, args.output)
+    elif args.command == "quantize":
+        quantize(args.model)
+    elif args.command == "tsfeatures":
+        tsfeatures(args.datapath, args.tags, args.output, args.cache, args.windowsize, args.maxwindows, args.features,
+                   args.jobs, args.chunksize, args.select)
+    elif args.command == "train-features":
+        train_features(args.selected, args.datapath, args.tags, args.output, args.cache, args.windowsize,
+                       args.maxwindows, args.jobs)
+    elif args.command == "predict":
+        predict(args.model, args.captures, args.exported, args.output)
+    elif args.command == "benchmark":
+        benchmark(args.model, args.batch_sizes, args.exported)
+    elif args.command == "decode":
+        decode(args.captures, args.samplerate, args.threshold, args.output)
+    elif args.command == "serve":
+        sources = [parse_source(source, args.follow) for source in args.sources]
+        serve_model(args.model, sources, args.max_batch_size, args.max_wait, args.exported)
 
 
 if __name__ == '__main__':
-    # train_model()
-    load_model(MODELS / MODEL_TO_RELOAD)
+    main()
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+from contextlib import contextmanager
+import numpy as np
+
+from dataset.normalize import WindowStats
+
+"""
+This module provides an on-disk cache for preprocessed datasets, so that experiments using the same data configuration
+on the same captures can skip reading and preprocessing the raw signals.
+"""
+
+# Parameters of the data configuration which do not change the resulting dataset
+IGNORED_PARAMETERS = ["cache", "cachesize", "mmap", "chunksize", "workers"]
+MANIFEST = "manifest.json"
+# File locked by the processes updating the manifest (e.g. the workers of a sweep sharing the cache)
+LOCK = "manifest.lock"
+# Increment when the preprocessing changes, to invalidate older entries
+VERSION = 3
+
+
+def cache_key(data_conf, path, file_groups, stats=None):
+    """Compute the key of a dataset from its data configuration and the state of the source files.
+    :param data_conf: A dictionary containing the experiment's data parameters
+    :param path: The path to the data files
+    :param file_groups: The files used for each tag
+    :param stats: The normalization statistics given to normalize the dataset, if they are not computed on it
+    :return: A hexadecimal digest identifying the preprocessed dataset
+    """
+    # The windows layout is stored as a function once the configuration is loaded
+    conf = {name: getattr(value, "__name__", value) for name, value in data_conf.items()
+            if name not in IGNORED_PARAMETERS}
+
+    sources = []
+    for files in file_groups:
+        for file in files:
+            stat = os.stat(os.path.join(path, file))
+            sources.append([file, stat.st_size, stat.st_mtime_ns])
+
+    description = json.dumps({"version": VERSION, "conf": conf, "sources": sources, "stats": stats},
+                             sort_keys=True, default=str)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def read_manifest(cache_dir):
+    """Read the description of the cache entries (size and last access time).
+    :param cache_dir: The folder of the cache
+    :return: A dictionary of entries indexed by key
+    """
+    try:
+        with open(os.path.join(cache_dir, MANIFEST), "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_manifest(cache_dir, manifest):
+    """Atomically replace the manifest of the cache.
+    :param cache_dir: The folder of the cache
+    :param manifest: A dictionary of entries indexed by key
+    """
+    temporary = os.path.join(cache_dir, f"{MANIFEST}.{os.getpid()}")
+    with open(temporary, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temporary, os.path.join(cache_dir, MANIFEST))
+
+
+@contextmanager
+def locked_manifest(cache_dir):
+    """Read the manifest of the cache and write it back once updated, holding a lock all along so that concurrent
+    processes do not lose each other's entries. The lock is released by the system if the process dies.
+    :param cache_dir: The folder of the cache
+    :return: A context manager giving the dictionary of entries indexed by key, to update in place
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, LOCK), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            manifest = read_manifest(cache_dir)
+            yield manifest
+            write_manifest(cache_dir, manifest)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_cached(cache_dir, key):
+    """Load a preprocessed dataset from the cache, memory-mapping the data instead of reading it.
+    :param cache_dir: The folder of the cache
+    :param key: The key of the dataset
+    :return: A triple (formatted data, labels, normalization statistics or None), or None if the dataset is not in
+             the cache
+    """
+    entry = os.path.join(cache_dir, key)
+    if not os.path.isdir(entry):
+        return None
+
+    X = np.load(os.path.join(entry, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(entry, "y.npy"))
+    stats_path = os.path.join(entry, "stats.json")
+    stats = WindowStats.load(stats_path) if os.path.exists(stats_path) else None
+
+    # Record the access for the LRU eviction
+    with locked_manifest(cache_dir) as manifest:
+        manifest.setdefault(key, {"size": dataset_size(entry)})["accessed"] = time.time()
+
+    return X, y, stats
+
+
+def store_cached(cache_dir, key, X, y, stats, max_size):
+    """Store a preprocessed dataset in the cache, evicting the least recently used entries if it gets too big.
+    :param cache_dir: The folder of the cache
+    :param key: The key of the dataset
+    :param X: The formatted data
+    :param y: The labels
+    :param stats: The normalization statistics of the dataset, or None
+    :param max_size: The maximum size of the cache, in bytes
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Write the entry in a temporary folder first, so that a partially written entry is never read
+    temporary = os.path.join(cache_dir, f".{key}.{os.getpid()}")
+    os.makedirs(temporary, exist_ok=True)
+    np.save(os.path.join(temporary, "X.npy"), X)
+    np.save(os.path.join(temporary, "y.npy"), y)
+    if stats is not None:
+        stats.save(os.path.join(temporary, "stats.json"))
+
+    entry = os.path.join(cache_dir, key)
+    try:
+        os.rename(temporary, entry)
+    except OSError:
+        # Another process stored the same dataset in the meantime
+        shutil.rmtree(temporary, ignore_errors=True)
+
+    with locked_manifest(cache_dir) as manifest:
+        manifest[key] = {"size": dataset_size(entry), "accessed": time.time()}
+        evict(cache_dir, manifest, max_size, keep=key)
+
+
+def evict(cache_dir, manifest, max_size, keep=None):
+    """Delete the least recently used entries until the cache fits in the given size.
+    The entries on disk which the manifest is missing (e.g. written by an interrupted process) are counted too.
+    :param cache_dir: The folder of the cache
+    :param manifest: A dictionary of entries indexed by key, updated in place
+    :param max_size: The maximum size of the cache, in bytes
+    :param keep: The key of an entry which must not be evicted
+    """
+    # The temporary folders of the entries being written start with a dot
+    entries = [name for name in os.listdir(cache_dir)
+               if not name.startswith(".") and os.path.isdir(os.path.join(cache_dir, name))]
+    for key in set(manifest) - set(entries):
+        del manifest[key]
+    for key in set(entries) - set(manifest):
+        entry = os.path.join(cache_dir, key)
+        manifest[key] = {"size": dataset_size(entry), "accessed": os.path.getmtime(entry)}
+
+    total = sum(entry["size"] for entry in manifest.values())
+
+    for key in sorted(manifest, key=lambda k: manifest[k].get("accessed", 0)):
+        if total <= max_size:
+            break
+        if key == keep:
+            continue
+
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+        total -= manifest.pop(key)["size"]
+
+
+def dataset_size(entry):
+    """Compute the size of a cache entry on disk, in bytes."""
+    return sum(os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry))
@@ -0,0 +1,112 @@
+import os
+import numpy as np
+
+"""
+This module provides lazy, memory-mapped access to raw capture files, so that large datasets are only read from disk
+when parts of the signals are actually used.
+"""
+
+
+def open_capture(file_path):
+    """Memory-map a raw capture file as an array of complex numbers, without reading it.
+    :param file_path: The path to the capture file
+    :return: A read-only memory-mapped array of complex64 samples
+    """
+    return np.memmap(file_path, dtype=np.complex64, mode="r")
+
+
+class ConcatenatedSignal:
+    """
+    Read-only view over a sequence of signals (usually memory-mapped captures) behaving like their concatenation.
+    Indexing only reads the requested samples, so the full signal is never built in memory (unless it is converted to
+    an array, see `__array__`).
+    """
+
+    def __init__(self, parts):
+        self.parts = [np.asarray(part) for part in parts]
+        self.offsets = np.cumsum([0] + [len(part) for part in self.parts])
+        self.dtype = self.parts[0].dtype if self.parts else np.dtype(np.complex64)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def shape(self):
+        return len(self),
+
+    @property
+    def size(self):
+        return len(self)
+
+    @property
+    def ndim(self):
+        return 1
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return self[np.arange(start, stop, step)]
+            return self._slice(start, stop)
+
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError(f"index {key} is out of bounds for signal of length {len(self)}")
+            part = np.searchsorted(self.offsets, key, side="right") - 1
+            return self.parts[part][key - self.offsets[part]]
+
+        return self._take(np.asarray(key))
+
+    def _slice(self, start, stop):
+        """Read the contiguous range [start, stop) of the signal, touching only the parts it overlaps.
+        The range is copied when it spans several parts, otherwise it is a read-only view of its part.
+        """
+        if stop <= start:
+            return np.empty(0, dtype=self.dtype)
+
+        first = np.searchsorted(self.offsets, start, side="right") - 1
+        last = np.searchsorted(self.offsets, stop, side="left") - 1
+        # Most slices lie within a single capture, in which case no copy is needed at all
+        if first == last:
+            view = self.parts[first][start - self.offsets[first]:stop - self.offsets[first]]
+            # The parts are the captures themselves, which must not be written through the view
+            view.flags.writeable = False
+            return view
+
+        out = np.empty(stop - start, dtype=self.dtype)
+        for part in range(first, last + 1):
+            lo = max(start, self.offsets[part])
+            hi = min(stop, self.offsets[part + 1])
+            out[lo - start:hi - start] = self.parts[part][lo - self.offsets[part]:hi - self.offsets[part]]
+
+        return out
+
+    def _take(self, indices):
+        """Gather the samples at the given (possibly multidimensional) integer indices."""
+        indices = np.where(indices < 0, indices + len(self), indices)
+        if indices.size and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError(f"indices are out of bounds for signal of length {len(self)}")
+
+        out = np.empty(indices.shape, dtype=self.dtype)
+        parts = np.searchsorted(self.offsets, indices, side="right") - 1
+        for part in np.unique(parts):
+            mask = parts == part
+            out[mask] = self.parts[part][indices[mask] - self.offsets[part]]
+
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        # Reads the whole signal in memory, the preprocessing avoids it by walking through the signal in chunks
+        signal = self._slice(0, len(self)) if len(self.parts) != 1 else self.parts[0]
+        return signal if dtype is None else signal.astype(dtype)
+
+
+def load_captures(path, files):
+    """Memory-map the given captures and expose them as a single signal.
+    :param path: The path to the data files
+    :param files: The names of the files to concatenate
+    :return: A lazy signal behaving like the concatenation of the captures
+    """
+    return ConcatenatedSignal([open_capture(os.path.join(path, file)) for file in files])
@@ -1,31 +1,89 @@
+import os
 import json
-from shutil import copyfile
+from pathlib import Path
+from importlib import import_module
 
 from dataset.format import windows_2d, windows_3d
-from learn.models.youssef_cnn import YoussefCNN
-from learn.models.riyaz_cnn import RiyazCNN
+from dataset.features import windows_features
 
 
 windows = {
     "2d": windows_2d,
-    "3d": windows_3d
+    "3d": windows_3d,
+    "features": windows_features
 }
 
+# Paths of the data configuration, which are relative to the configuration file
+PATH_PARAMETERS = ["datapath", "cache"]
+
+# The models are imported when the configuration is loaded, since importing them requires TensorFlow
 model_type = {
-    "youssef": YoussefCNN,
-    "riyaz": RiyazCNN,
+    "youssef": "learn.models.youssef_cnn.YoussefCNN",
+    "riyaz": "learn.models.riyaz_cnn.RiyazCNN",
     "svm": "svm"
 }
 
 
-def load_conf(conf_path):
+def model_class(name):
+    """Import the class of a model from its name in the configuration (or return "svm")."""
+    if model_type[name] == "svm":
+        return "svm"
+
+    module, cls = model_type[name].rsplit(".", 1)
+    return getattr(import_module(module), cls)
+
+
+def load_conf(conf_path, model=True):
+    """Read an experiment configuration, replacing the names of the windows layout and the model type by the
+    corresponding function and class.
+    :param conf_path: The path to the json file
+    :param model: Whether to import the model class, the exported models are run without it (nor TensorFlow)
+    :return: The configuration as a dictionary
+    """
     with open(conf_path, "r") as file:
         conf = json.load(file)
 
+    return resolve_conf(resolve_paths(conf, Path(conf_path).parent), model)
+
+
+def resolve_paths(conf, conf_dir):
+    """Make the relative paths of a data configuration relative to the folder of its file, instead of the current
+    directory, so that the commands can be run from anywhere.
+    :param conf: The configuration as read from its json file, modified in place
+    :param conf_dir: The folder of the configuration file
+    :return: The configuration
+    """
+    for name in PATH_PARAMETERS:
+        value = conf['data'].get(name)
+        if value and not os.path.isabs(value):
+            conf['data'][name] = os.path.normpath(os.path.join(conf_dir, value))
+    return conf
+
+
+def resolve_conf(conf, model=True):
+    """Replace the names of the windows layout and the model type of a configuration by the corresponding function
+    and class (see `load_conf`).
+    :param conf: The configuration as read from its json file, modified in place
+    :param model: Whether to import the model class
+    :return: The configuration
+    """
     conf['data']['windows'] = windows[conf['data']['windows']]
-    conf['model']['type'] = model_type[conf['model']['type']]
+    if model:
+        conf['model']['type'] = model_class(conf['model']['type'])
     return conf
 
 
 def save_conf(conf_path, save_path):
-    copyfile(conf_path, save_path / "experiment.json")
+    """Copy a configuration file in the folder of a model, its relative paths being rewritten from that folder.
+    :param conf_path: The path to the json file
+    :param save_path: The folder of the model
+    """
+    with open(conf_path, "r") as file:
+        conf = resolve_paths(json.load(file), Path(conf_path).parent)
+
+    for name in PATH_PARAMETERS:
+        if conf['data'].get(name):
+            conf['data'][name] = os.path.relpath(conf['data'][name], save_path)
+
+    with open(Path(save_path) / "experiment.json", "w") as file:
+        json.dump(conf, file, indent=2)
@@ -0,0 +1,241 @@
+from collections import namedtuple
+import numpy as np
+
+"""
+This module demodulates and decodes the NFC-A (ISO 14443-A, 106 kbit/s) frames of a capture, with NumPy operations on
+the whole signal at once: the reader's frames (100% ASK pauses, Modified Miller coding) and the tag's answers (load
+modulation on a subcarrier, Manchester coding). The frames are printed like the Proxmark traces of
+data/decoded-reader-frames.
+"""
+
+CARRIER_FREQUENCY = 13.56e6
+# Duration of a bit at 106 kbit/s, in seconds
+BIT_DURATION = 128 / CARRIER_FREQUENCY
+# Sample rate of the captures of dataset 1, which were used to decode the reference frames
+SAMPLE_RATE = 768e3
+# Magnitude under which the carrier is considered paused by the reader (the offset of the GNU Radio flowgraph)
+READER_THRESHOLD = 0.1
+# Gap between two pauses, in bits, after which they belong to different reader frames (at most 2 inside a frame)
+READER_GAP = 2.5
+# Gap between two modulated parts, in bits, after which they belong to different tag frames
+TAG_GAP = 2
+# Ratio between the tag's modulation and the median step of the magnitude (mostly noise) from which it is detected
+NOISE_FACTOR = 6
+MEDIAN_STRIDE = 16
+# Fraction of the contrast of the start of a tag frame under which a bit is considered unmodulated (end of the frame)
+END_CONTRAST = 0.35
+# The shortest answer of a tag is a 4-bit acknowledgement, shorter frames are noise
+MIN_TAG_BITS = 4
+# Shifts of the start of a tag frame, in samples, among which the one best aligned with its bits is chosen
+SHIFTS = [-1, -0.5, 0, 0.5, 1]
+
+# A decoded frame: who sent it ("Reader" or "Tag"), the sample at which it starts, and its bits (parity bits included)
+Frame = namedtuple("Frame", ["source", "start", "bits"])
+
+
+def moving_max(values, size):
+    """Compute the maximum of a signal over a centered window of `size` samples, keeping its length."""
+    size = max(int(size), 1)
+    padded = np.concatenate((np.full(size // 2, -np.inf, dtype=values.dtype), values,
+                             np.full(size, -np.inf, dtype=values.dtype)))
+    result = np.full(len(values), -np.inf, dtype=values.dtype)
+    for shift in range(size):
+        np.maximum(result, padded[shift:shift + len(values)], out=result)
+    return result
+
+
+def runs(mask):
+    """Find the runs of True values of a boolean array.
+    :return: The starts and (exclusive) ends of the runs
+    """
+    edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def cover(length, starts, ends):
+    """Build a boolean mask which is True on the given intervals (which may overlap or exceed the signal)."""
+    changes = np.zeros(length + 1, dtype=np.int64)
+    np.add.at(changes, np.clip(starts, 0, length), 1)
+    np.add.at(changes, np.clip(ends, 0, length), -1)
+    return np.cumsum(changes[:-1]) > 0
+
+
+def group(positions, gap):
+    """Group sorted positions which are closer than `gap` to the previous one.
+    :return: The group of each position, and the index of the first position of each group
+    """
+    groups = np.concatenate(([0], np.cumsum(np.diff(positions) > gap)))
+    return groups, np.flatnonzero(np.diff(groups, prepend=-1))
+
+
+def reader_frames(magnitudes, bit, threshold=READER_THRESHOLD):
+    """Decode the frames sent by the reader, coded in Modified Miller: a pause in the middle of a bit (sequence X) is
+    a 1, a pause at its start (sequence Z) is a 0, and a bit without pause (sequence Y) is a 0 following a 1.
+    A frame starts with Z and ends with a 0 followed by Y.
+    :param magnitudes: The magnitude of the signal
+    :param bit: The duration of a bit, in samples
+    :param threshold: The magnitude under which the carrier is paused
+    :return: A list of frames
+    """
+    starts, ends = runs(magnitudes < threshold)
+    # Longer drops are the field being switched off, not pauses
+    starts = starts[(ends - starts <= bit) & (starts > 0)]
+    if len(starts) == 0:
+        return []
+
+    frames, firsts = group(starts, READER_GAP * bit)
+    lasts = np.concatenate((firsts[1:], [len(starts)])) - 1
+    # Position of each pause in half bits from the start of its frame: odd positions are X, even ones Z
+    halves = np.rint((starts - starts[firsts][frames]) / (bit / 2)).astype(np.int64)
+    slots, ones = halves // 2, (halves % 2).astype(np.uint8)
+
+    counts = slots[lasts] + 1
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    bits = np.zeros(counts.sum(), dtype=np.uint8)
+    bits[offsets[frames] + slots] = ones
+    # A last X is the last bit of data, a last Z is the 0 of the end of the frame
+    lengths = slots[lasts] + ones[lasts] - 1
+
+    return [Frame("Reader", int(starts[first]), bits[offset + 1:offset + 1 + length])
+            for first, offset, length in zip(firsts, offsets, lengths) if length > 0]
+
+
+def half_means(cumulative, starts, positions, bit):
+    """Compute the mean magnitude of both halves of bits.
+    :param cumulative: The cumulative sum of the magnitude, starting with 0
+    :param starts: The first sample of the frame of each bit
+    :param positions: The position of each bit in its frame
+    :param bit: The duration of a bit, in samples
+    :return: Two arrays with the means of the first and second halves of the bits
+    """
+    limits = np.rint(starts[:, np.newaxis] + (positions[:, np.newaxis] + np.array([0, 0.5, 1])) * bit)
+    limits = np.clip(limits.astype(np.int64), 0, len(cumulative) - 1)
+    lengths = np.maximum(np.diff(limits, axis=1), 1)
+    means = np.diff(cumulative[limits], axis=1) / lengths
+    return means[:, 0], means[:, 1]
+
+
+def tag_frames(magnitudes, bit, excluded, threshold=None):
+    """Decode the answers of the tag, coded in Manchester on the subcarrier: a bit modulated during its first half
+    (sequence D) is a 1, a bit modulated during its second half (sequence E) is a 0. A frame starts with D and ends with
+    an unmodulated bit (sequence F).
+    :param magnitudes: The magnitude of the signal
+    :param bit: The duration of a bit, in samples
+    :param excluded: A mask of the samples where the tag cannot answer (reader frames, field off)
+    :param threshold: The step of the magnitude from which the tag is considered to modulate the carrier (defaults to
+                      `NOISE_FACTOR` times the median step)
+    :return: A list of frames
+    """
+    cumulative = np.concatenate(([0], np.cumsum(magnitudes, dtype=np.float64)))
+    half = max(int(round(bit / 2)), 1)
+    # The step of the magnitude at each sample, between the half bits before and after it
+    steps = np.zeros(len(magnitudes), dtype=np.float32)
+    steps[half:len(magnitudes) - half] = np.abs(2 * cumulative[half:len(magnitudes) - half] -
+                                                cumulative[:len(magnitudes) - 2 * half] -
+                                                cumulative[2 * half:len(magnitudes)]) / half
+    if threshold is None:
+        # (estimated on a fraction of the samples, which is as good and much faster)
+        threshold = NOISE_FACTOR * np.median(steps[::MEDIAN_STRIDE]) + np.finfo(np.float32).eps
+
+    # The modulation changes at least once per bit in Manchester coding, so a frame has a strong step in every bit
+    starts, ends = runs((moving_max(steps, bit) > threshold) & ~excluded)
+    if len(starts) == 0:
+        return []
+
+    frames = np.concatenate(([0], np.cumsum(starts[1:] - ends[:-1] > TAG_GAP * bit)))
+    firsts = np.flatnonzero(np.diff(frames, prepend=-1))
+    lasts = np.concatenate((firsts[1:], [len(starts)])) - 1
+    coarse_starts, coarse_ends = starts[firsts], ends[lasts]
+
+    # The frame starts at its first strong step (the strongest one may be the end of the first modulated half)
+    # (noise may make the frame seem to start up to `TAG_GAP` bits earlier)
+    candidates = np.minimum(coarse_starts[:, np.newaxis] + np.arange(int((TAG_GAP + 2) * bit) + 1),
+                            len(magnitudes) - 1)
+    strengths = steps[candidates]
+    first = np.argmax(strengths >= 0.5 * strengths.max(axis=1, keepdims=True), axis=1)[:, np.newaxis]
+    # The peak of that step is where the strength stops increasing
+    decreasing = np.concatenate((strengths[:, 1:] < strengths[:, :-1], np.ones((len(strengths), 1), bool)), axis=1)
+    peaks = np.argmax(decreasing & (np.arange(strengths.shape[1]) >= first), axis=1)
+    frame_starts = candidates[np.arange(len(candidates)), peaks]
+
+    # The bits of each frame, and two more to see its end
+    slots = np.maximum(np.ceil((coarse_ends - frame_starts) / bit), 1).astype(np.int64) + 2
+    offsets = np.concatenate(([0], np.cumsum(slots)[:-1]))
+    positions = np.arange(slots.sum()) - np.repeat(offsets, slots)
+    # The start is only known to a sample, the bits are read with the shift which contrasts their halves the most
+    halves = [half_means(cumulative, np.repeat(frame_starts, slots) + shift, positions, bit) for shift in SHIFTS]
+    contrasts = np.array([second - first for first, second in halves])
+    scores = np.add.reduceat(np.abs(contrasts), offsets, axis=1)
+    contrasts = contrasts[np.repeat(np.argmax(scores, axis=0), slots), np.arange(slots.sum())]
+
+    # The start of frame (D) gives the direction of the modulation, whichever way the tag changes the magnitude
+    references = np.repeat(contrasts[offsets], slots)
+    ones = (np.sign(references) * contrasts > 0).astype(np.uint8)
+    # The frame ends at its first unmodulated bit (F), which the silence of the tag follows (a single weak bit is noise)
+    weak = (np.abs(contrasts) < END_CONTRAST * np.abs(references)) & (positions > 0)
+    following = np.append(weak[1:], True)
+    following[offsets[1:] - 1] = True
+    unmodulated = weak & following
+    lengths = np.minimum.reduceat(np.where(unmodulated, positions, np.repeat(slots, slots)), offsets) - 1
+
+    return [Frame("Tag", int(start), ones[offset + 1:offset + 1 + length])
+            for start, offset, length in zip(frame_starts, offsets, lengths) if length >= MIN_TAG_BITS]
+
+
+def decode_signal(signal, sample_rate=SAMPLE_RATE, threshold=READER_THRESHOLD, tag_threshold=None):
+    """Decode the frames exchanged by the reader and the tag in a capture.
+    :param signal: The I/Q signal as a 1D array of complex numbers (e.g. a memory-mapped capture)
+    :param sample_rate: The sample rate of the capture, in samples per second
+    :param threshold: The magnitude under which the reader's carrier is paused
+    :param tag_threshold: The variation of the magnitude from which the tag modulates the carrier (see `tag_frames`)
+    :return: The list of frames, in the order in which they were sent
+    """
+    magnitudes = np.abs(np.asarray(signal)).astype(np.float32)
+    bit = sample_rate * BIT_DURATION
+
+    readers = reader_frames(magnitudes, bit, threshold)
+    # The tag does not answer while the reader is sending, nor when the field is off
+    starts = np.array([frame.start for frame in readers], dtype=np.int64)
+    ends = starts + np.array([len(frame.bits) + 3 for frame in readers], dtype=np.int64) * bit
+    off_starts, off_ends = runs(magnitudes < threshold)
+    excluded = cover(len(magnitudes), np.concatenate((starts - int(bit), off_starts - 2 * int(bit))),
+                     np.concatenate((np.ceil(ends).astype(np.int64), off_ends + 2 * int(bit))))
+
+    tags = tag_frames(magnitudes, bit, excluded, tag_threshold)
+    return sorted(readers + tags, key=lambda frame: frame.start)
+
+
+def format_bits(bits):
+    """Format the bits of a frame like the Proxmark traces: bytes with a correct (odd) parity are padded with spaces,
+    bytes with a wrong parity are in parentheses, a 7-bit short frame is in brackets, trailing bits which do not make
+    a byte are between slashes, and a byte missing its parity bit is followed by "(No parity)".
+    :param bits: The bits of the frame in the order they were sent (least significant bit of each byte first, each
+                 byte followed by its parity bit)
+    :return: The formatted frame
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    if len(bits) == 7:
+        return f"[{bits_value(bits):02X}]"
+
+    parts = []
+    for start in range(0, len(bits) - 8, 9):
+        value = bits_value(bits[start:start + 8])
+        parts.append(f" {value:02X} " if bits[start:start + 9].sum() % 2 == 1 else f"({value:02X})")
+
+    rest = bits[len(bits) // 9 * 9:]
+    if len(rest) == 8:
+        parts += [f" {bits_value(rest):02X} ", "(No parity)"]
+    elif len(rest) > 0:
+        parts.append(f"/{bits_value(rest):02X}\\")
+
+    return " ".join(parts)
+
+
+def bits_value(bits):
+    """Compute the value of bits sent least significant first."""
+    return int(np.dot(bits.astype(np.int64), 1 << np.arange(len(bits))))
+
+
+def format_frame(frame):
+    """Format a frame as a line of the traces, e.g. "Reader ->  30   00   02   A8 "."""
+    return f"{frame.source} -> {format_bits(frame.bits)}"
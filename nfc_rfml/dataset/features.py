@@ -0,0 +1,163 @@
+import numpy as np
+
+"""
+This module provides a curated set of RF fingerprint features, computed on batches of complex windows at once, as a
+compact alternative to the raw I/Q layouts for the classical models (see `windows_features`).
+"""
+
+# Number of windows processed at once, which bounds the size of the temporary arrays
+CHUNK_SIZE = 4096
+# Number of samples of the moving average smoothing the envelope
+SMOOTHING = 16
+
+FEATURES = [
+    "rise_time",             # 10% to 90% rise of the load-modulation envelope, as a fraction of the window
+    "fall_time",             # 90% to 10% fall of the envelope
+    "modulation_depth",      # (max - min) / (max + min) of the envelope
+    "crest_factor",          # peak to RMS ratio of the envelope
+    "carrier_offset",        # dominant frequency of the I/Q signal, in cycles per sample
+    "subcarrier_frequency",  # dominant frequency of the envelope (the load modulation), in cycles per sample
+    "amplitude_imbalance",   # log ratio of the in-phase and quadrature standard deviations
+    "phase_imbalance",       # correlation of the in-phase and quadrature parts
+    "dc_offset",             # magnitude of the mean sample relative to the RMS value
+    "phase_noise",           # weighted standard deviation of the instantaneous frequency, in radians per sample
+    "spectral_centroid",     # moments of the power spectrum, in cycles per sample
+    "spectral_spread",
+    "spectral_skewness",
+    "spectral_kurtosis",
+]
+
+
+def moving_average(values, size):
+    """Smooth each row with a centered moving average (computed with cumulative sums, valid part only)."""
+    cumulative = np.cumsum(values, axis=1, dtype=np.float64)
+    cumulative = np.concatenate((np.zeros((len(values), 1)), cumulative), axis=1)
+    return ((cumulative[:, size:] - cumulative[:, :-size]) / size).astype(np.float32)
+
+
+def crossing(mask, last=False):
+    """Find the first (or last) True value of each row of a boolean array."""
+    if last:
+        return mask.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+    return np.argmax(mask, axis=1)
+
+
+def peak_frequency(spectrum, frequencies):
+    """Find the frequency of the highest bin of each row, refined by parabolic interpolation between its neighbours.
+    :param spectrum: The magnitudes of the spectra, one per row
+    :param frequencies: The frequency of each bin, in cycles per sample
+    :return: The dominant frequency of each row
+    """
+    peak = np.argmax(spectrum, axis=1)
+    rows = np.arange(len(spectrum))
+    left = spectrum[rows, np.maximum(peak - 1, 0)]
+    center = spectrum[rows, peak]
+    right = spectrum[rows, np.minimum(peak + 1, spectrum.shape[1] - 1)]
+
+    curvature = left - 2 * center + right
+    shift = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, 1), 0)
+    return frequencies[peak] + shift * (frequencies[1] - frequencies[0])
+
+
+def envelope_features(magnitudes):
+    """Compute the timing and shape features of the envelopes of the windows."""
+    envelope = moving_average(magnitudes, SMOOTHING)
+    length = envelope.shape[1]
+    low, high = envelope.min(axis=1, keepdims=True), envelope.max(axis=1, keepdims=True)
+    span = np.maximum(high - low, np.finfo(np.float32).tiny)
+    level = (envelope - low) / span
+
+    rise = (crossing(level >= 0.9) - crossing(level >= 0.1)) / length
+    fall = (crossing(level >= 0.1, last=True) - crossing(level >= 0.9, last=True)) / length
+    depth = (high - low) / np.maximum(high + low, np.finfo(np.float32).tiny)
+    crest = high / np.maximum(np.sqrt(np.mean(np.square(envelope), axis=1, keepdims=True)), np.finfo(np.float32).tiny)
+
+    return np.abs(rise), np.abs(fall), depth[:, 0], crest[:, 0]
+
+
+def iq_features(windows):
+    """Compute the I/Q imbalance and DC offset features of the windows."""
+    mean = windows.mean(axis=1, keepdims=True)
+    centered = windows - mean
+    in_phase, quadrature = centered.real, centered.imag
+    tiny = np.finfo(np.float32).tiny
+
+    std_i = np.maximum(in_phase.std(axis=1), tiny)
+    std_q = np.maximum(quadrature.std(axis=1), tiny)
+    amplitude = np.log(std_i / std_q)
+    # The guard of each factor underflows once they are multiplied, their product needs its own (e.g. for constant
+    # windows, whose correlation is then 0)
+    phase = np.mean(in_phase * quadrature, axis=1) / np.maximum(std_i * std_q, np.finfo(np.float32).eps)
+    rms = np.maximum(np.sqrt(np.mean(np.abs(windows) ** 2, axis=1)), tiny)
+    dc_offset = np.abs(mean[:, 0]) / rms
+
+    return amplitude, phase, dc_offset
+
+
+def phase_noise(windows, magnitudes):
+    """Compute the spread of the instantaneous frequency, weighted by the amplitude so that noise-only samples (whose
+    phase is meaningless) barely count."""
+    frequency = np.angle(windows[:, 1:] * np.conj(windows[:, :-1]))
+    weights = magnitudes[:, 1:] * magnitudes[:, :-1]
+    total = np.maximum(weights.sum(axis=1, keepdims=True), np.finfo(np.float32).tiny)
+
+    mean = np.sum(weights * frequency, axis=1, keepdims=True) / total
+    return np.sqrt(np.sum(weights * np.square(frequency - mean), axis=1) / total[:, 0])
+
+
+def spectral_features(windows, magnitudes):
+    """Compute the dominant frequencies and the moments of the power spectrum of the windows."""
+    length = windows.shape[1]
+    frequencies = np.fft.fftshift(np.fft.fftfreq(length)).astype(np.float32)
+    power = np.square(np.abs(np.fft.fftshift(np.fft.fft(windows, axis=1), axes=1))).astype(np.float32)
+    carrier = peak_frequency(power, frequencies)
+
+    envelope = magnitudes - magnitudes.mean(axis=1, keepdims=True)
+    envelope_spectrum = np.abs(np.fft.rfft(envelope, axis=1))
+    # The lowest bins hold what is left of the envelope's shape, not its modulation
+    envelope_spectrum[:, :2] = 0
+    subcarrier = peak_frequency(envelope_spectrum, np.fft.rfftfreq(length))
+
+    weights = power / np.maximum(power.sum(axis=1, keepdims=True), np.finfo(np.float32).tiny)
+    centroid = weights @ frequencies
+    deviation = frequencies - centroid[:, np.newaxis]
+    weighted = weights * np.square(deviation)
+    spread = np.sqrt(weighted.sum(axis=1))
+    # Multiplications rather than powers, which are much slower on whole spectra. A spectrum without spread (a
+    # constant or silent window) has no skewness nor kurtosis, instead of overflowing to inf * 0
+    spread_rows = spread[:, np.newaxis]
+    standard = np.where(spread_rows > 0, deviation / np.where(spread_rows > 0, spread_rows, 1), 0)
+    skewness = np.sum(weights * standard * standard * standard, axis=1)
+    kurtosis = np.sum(weights * np.square(np.square(standard)), axis=1)
+
+    return carrier, subcarrier, centroid, spread, skewness, kurtosis
+
+
+def chunk_features(windows):
+    """Compute the features of a chunk of windows (see `windows_features`)."""
+    windows = np.asarray(windows, dtype=np.complex64)
+    magnitudes = np.abs(windows)
+
+    rise, fall, depth, crest = envelope_features(magnitudes)
+    carrier, subcarrier, centroid, spread, skewness, kurtosis = spectral_features(windows, magnitudes)
+    amplitude, phase, dc_offset = iq_features(windows)
+    noise = phase_noise(windows, magnitudes)
+
+    return np.stack((rise, fall, depth, crest, carrier, subcarrier, amplitude, phase, dc_offset, noise,
+                     centroid, spread, skewness, kurtosis), axis=1).astype(np.float32)
+
+
+def windows_features(windows):
+    """Describe each window by the fingerprint features listed in `FEATURES`, instead of its raw samples.
+    The features are dimensionless (times relative to the window, frequencies in cycles per sample, ratios), so they
+    do not need to be normalized.
+    :param windows: A 2D array (or list) of complex windows, one per row
+    :return: A 2D float32 array with one row of features per window
+    """
+    windows = np.asarray(windows)
+    features = np.empty((len(windows), len(FEATURES)), dtype=np.float32)
+
+    for start in range(0, len(windows), CHUNK_SIZE):
+        features[start:start + CHUNK_SIZE] = chunk_features(windows[start:start + CHUNK_SIZE])
+
+    return features
@@ -1,15 +1,20 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from scipy import complex64
-from scipy.signal import find_peaks
-from sklearn.model_selection import train_test_split
+from numpy.lib.stride_tricks import as_strided
 
-from tensorflow.keras.utils import to_categorical
+from dataset.capture import open_capture, load_captures
+from dataset.cache import cache_key, load_cached, store_cached
+from dataset.normalize import WindowStats, normalization_method, normalize_dataset
+from dataset.shared import share_array, attach_array, release_block, start_tracker
 
 """
 This module provides functions to load I/Q signals datasets in memory, formatting them as necessary for learning.
 """
 
+# Number of samples read at once from memory-mapped captures, when no chunk size is configured
+CHUNK_SIZE = 2 ** 20
+
 
 def partition(lst, n):
     """Generate as many n-sized segments as possible from lst (the last segment may be smaller).
@@ -21,20 +26,94 @@ def partition(lst, n):
         yield lst[i:i + n]
 
 
+def strided_windows(signal, window_size):
+    """View every window of a signal (one per sample) without copying it, as `sliding_window_view` does in NumPy 1.20+.
+    :param signal: The I/Q signal as a 1D array
+    :param window_size: The wanted size for the signal windows
+    :return: A read-only two-dimensional view with one window per row
+    """
+    return as_strided(signal, shape=(len(signal) - window_size + 1, window_size),
+                      strides=(signal.strides[0], signal.strides[0]), writeable=False)
+
+
+def signal_windows(signal, window_size, hop=None):
+    """Cut the signal in windows of `window_size` samples, starting a new window every `hop` samples.
+    The windows are a strided view on the signal, so no sample is copied. A truncated last window is dropped.
+    :param signal: The I/Q signal as a 1D array of complex numbers
+    :param window_size: The wanted size for the signal windows
+    :param hop: The number of samples between the starts of two windows (defaults to `window_size`, i.e. no overlap)
+    :return: A two-dimensional array with one window per row
+    """
+    signal = np.asarray(signal)
+    hop = hop or window_size
+
+    if len(signal) < window_size:
+        return np.empty((0, window_size), dtype=signal.dtype)
+
+    # Non-overlapping windows are a simple reshape of the signal, which keeps them contiguous
+    if hop == window_size:
+        return signal[:len(signal) // window_size * window_size].reshape(-1, window_size)
+
+    return strided_windows(signal, window_size)[::hop]
+
+
 def windows_2d(windows):
     """Store the segments in simple arrays with the real parts first and then the imaginary parts.
-    :param windows: A list of partitions each containing a fixed number of complex numbers
-    :return: A list of arrays with all the real parts followed by all the imaginary parts
+    :param windows: A list of partitions (or a 2D array of windows) each containing a fixed number of complex numbers
+    :return: A contiguous array with, for each window, all the real parts followed by all the imaginary parts
+             (float32 for complex64 windows)
     """
-    return [np.append(np.real(window), [np.imag(window)]) for window in windows]
+    windows = np.asarray(windows)
+    return np.concatenate((windows.real, windows.imag), axis=-1)
 
 
 def windows_3d(windows):
     """Store the segments in 2d arrays with one dimension for the real parts and one for the imaginary parts.
-    :param windows: A list of partitions each containing a fixed number of complex numbers
-    :return: A list of two-dimensional arrays with each an array for real parts and one for imaginary parts
+    :param windows: A list of partitions (or a 2D array of windows) each containing a fixed number of complex numbers
+    :return: A contiguous array of two-dimensional arrays with each an array for real parts and one for imaginary parts
+             (float32 for complex64 windows)
     """
-    return np.stack((np.real(windows), np.imag(windows)), axis=1)
+    windows = np.asarray(windows)
+    return np.stack((windows.real, windows.imag), axis=1)
+
+
+def select_window_starts(indices, window_size):
+    """Greedily select window starts among sorted peak indices: each window starts at the first peak located after
+    the end of the previous window. Peaks inside a window are skipped in one binary search, so the cost depends on the
+    number of windows and not on the number of peaks.
+    :param indices: The sorted indices of the detected peaks
+    :param window_size: The wanted size for the signal windows
+    :return: An array with the start index of each window
+    """
+    starts = []
+    position = 0
+
+    while position < len(indices):
+        start = indices[position]
+        starts.append(start)
+        # Jump to the first peak after the end of this window
+        position = np.searchsorted(indices, start + window_size, side="right")
+
+    return np.array(starts, dtype=np.intp)
+
+
+def gather_windows(signal, starts, window_size):
+    """Gather all the windows starting at the given indices in one fancy-indexing operation.
+    :param signal: The I/Q signal as a 1D array of complex numbers (or a lazy signal)
+    :param starts: The start index of each window
+    :param window_size: The wanted size for the signal windows
+    :return: A two-dimensional array with one window per row, without the truncated windows at the end of the signal
+    """
+    starts = np.asarray(starts, dtype=np.intp)
+    starts = starts[starts + window_size <= len(signal)]
+
+    if len(starts) == 0:
+        return np.empty((0, window_size), dtype=signal.dtype)
+
+    if isinstance(signal, np.ndarray):
+        return strided_windows(signal, window_size)[starts]
+
+    return signal[starts[:, np.newaxis] + np.arange(window_size)]
 
 
 def filter_peaks_windows(signal, window_size, format_windows, height=0.1, threshold=0.005):
@@ -49,24 +128,173 @@ def filter_peaks_windows(signal, window_size, format_windows, height=0.1, thresh
     :param threshold: The prominence parameter used to find peaks in the signal
     :return: A list of windows filtered using a peak finding method and formatted according to given function
     """
+    # scipy.signal takes more than a second to import, only preprocessing pays for it
+    from scipy.signal import find_peaks
+
     mags = np.abs(signal)
     # Detect peaks higher than height and with vertical distance to neighbours higher than threshold
     indices, _ = find_peaks(mags, height=height, threshold=threshold)
-    windows = []
 
-    # Partition the signal into windows
-    while indices.size != 0:
-        start = indices[0]
-        indices = indices[indices > start + window_size]
-        windows.append(signal[start:start + window_size])
-
-    # Remove the last window, if it is truncated
-    if len(windows[-1]) < window_size:
-        windows = windows[:-1]
+    # Partition the signal into windows, removing the last one if it is truncated
+    starts = select_window_starts(indices, window_size)
+    windows = gather_windows(signal, starts, window_size)
 
     return format_windows(windows)
 
 
+class PeakWindowScanner:
+    """
+    Incremental version of `filter_peaks_windows`, for signals received (or read) in chunks.
+    Only the last few samples of the signal are kept between chunks: a carry-over of `overlap` samples gives the peak
+    detection its context across chunk boundaries, and the samples of a window are kept until it is complete.
+    The windows are the same as with `filter_peaks_windows`, unless a flat peak is longer than `overlap` samples.
+    """
+
+    def __init__(self, window_size, height=0.1, threshold=0.005, overlap=64):
+        self.window_size = window_size
+        self.height = height
+        self.threshold = threshold
+        self.overlap = max(overlap, 1)
+
+        self.buffer = np.empty(0, dtype=np.complex64)
+        # Absolute index of the first sample in the buffer
+        self.offset = 0
+        # Absolute index before which every peak has already been detected
+        self.scanned = 0
+        # Absolute index of the end of the last window started, peaks before it cannot start a new window
+        self.window_end = -1
+        self.pending = np.empty(0, dtype=np.intp)
+        # Absolute start indices of the windows returned by the last call
+        self.starts = np.empty(0, dtype=np.intp)
+
+    def push(self, samples):
+        """Add samples at the end of the signal and return the windows which could be completed.
+        :param samples: The next samples of the I/Q signal as a 1D array of complex numbers
+        :return: A two-dimensional array with one (complex) window per row
+        """
+        self.buffer = np.concatenate((self.buffer, np.asarray(samples, dtype=self.buffer.dtype)))
+        return self._scan(self.offset + len(self.buffer) - self.overlap)
+
+    def flush(self):
+        """Detect the peaks in the remaining samples, once the end of the signal has been reached.
+        :return: The last complete windows, as in `push`
+        """
+        return self._scan(self.offset + len(self.buffer))
+
+    def _scan(self, decidable):
+        end = self.offset + len(self.buffer)
+
+        # Peaks before `decidable` have enough samples on their right to be detected as in the whole signal
+        if decidable > self.scanned:
+            start = max(self.scanned - self.overlap, self.offset)
+            from scipy.signal import find_peaks
+
+            mags = np.abs(self.buffer[start - self.offset:end - self.offset])
+            indices, _ = find_peaks(mags, height=self.height, threshold=self.threshold)
+            indices = indices + start
+            indices = indices[(indices >= self.scanned) & (indices < decidable) & (indices > self.window_end)]
+
+            starts = select_window_starts(indices, self.window_size)
+            if len(starts):
+                self.window_end = starts[-1] + self.window_size
+                self.pending = np.concatenate((self.pending, starts))
+            self.scanned = decidable
+
+        # Take the windows which are complete
+        complete = self.pending[self.pending + self.window_size <= end]
+        self.pending = self.pending[self.pending + self.window_size > end]
+        windows = gather_windows(self.buffer, complete - self.offset, self.window_size)
+        self.starts = complete
+
+        # Only keep the samples still needed for the peak detection context and the pending windows
+        keep = min([self.scanned - self.overlap, end] + list(self.pending))
+        if keep > self.offset:
+            self.buffer = self.buffer[keep - self.offset:]
+            self.offset = keep
+
+        return windows
+
+
+class FixedWindowScanner:
+    """
+    Incremental version of `signal_windows`, for signals received in chunks and cut without peak detection (the
+    `filter` parameter off). It has the interface of `PeakWindowScanner`, and gives the same windows as
+    `signal_windows` on the whole signal.
+    """
+
+    def __init__(self, window_size, hop=None):
+        self.window_size = window_size
+        self.hop = hop or window_size
+
+        self.buffer = np.empty(0, dtype=np.complex64)
+        # Absolute index of the first sample in the buffer
+        self.offset = 0
+        # Absolute index of the start of the next window
+        self.next_start = 0
+        # Absolute start indices of the windows returned by the last call
+        self.starts = np.empty(0, dtype=np.intp)
+
+    def push(self, samples):
+        """Add samples at the end of the signal and return the windows which could be completed.
+        :param samples: The next samples of the I/Q signal as a 1D array of complex numbers
+        :return: A two-dimensional array with one (complex) window per row
+        """
+        self.buffer = np.concatenate((self.buffer, np.asarray(samples, dtype=self.buffer.dtype)))
+        # With a hop longer than the windows, the samples between two windows are skipped as they arrive
+        self._drop()
+        end = self.offset + len(self.buffer)
+
+        count = max((end - self.next_start - self.window_size) // self.hop + 1, 0)
+        self.starts = self.next_start + np.arange(count, dtype=np.intp) * self.hop
+        windows = gather_windows(self.buffer, self.starts - self.offset, self.window_size)
+        self.next_start += count * self.hop
+        self._drop()
+
+        return windows
+
+    def _drop(self):
+        """Forget the samples before the start of the next window, which are not needed anymore."""
+        drop = min(max(self.next_start - self.offset, 0), len(self.buffer))
+        self.buffer = self.buffer[drop:]
+        self.offset += drop
+
+    def flush(self):
+        """Return the last windows, once the end of the signal has been reached: the truncated last window is dropped,
+        as in `signal_windows`, so there are none.
+        :return: An empty two-dimensional array of windows
+        """
+        self.starts = np.empty(0, dtype=np.intp)
+        return np.empty((0, self.window_size), dtype=self.buffer.dtype)
+
+
+def stream_peaks_windows(signal, window_size, format_windows, chunk_size=2 ** 20, height=0.1, threshold=0.005,
+                         overlap=64):
+    """
+    Streaming variant of `filter_peaks_windows`, which walks through the signal in chunks so that only a bounded
+    amount of it is in memory at any time. Useful on long captures, memory-mapped or given as a file path.
+
+    :param signal: The I/Q signal as a 1D array of complex numbers, a lazy signal, or the path to a capture file
+    :param window_size: The wanted size for the signal windows (data segments)
+    :param format_windows: The function with which to format the signal into windows
+    :param chunk_size: The number of samples to process at once
+    :param height: The minimum height for a peak to be considered
+    :param threshold: The prominence parameter used to find peaks in the signal
+    :param overlap: The number of samples carried over between chunks to detect peaks at their boundaries
+    :return: A generator of formatted windows batches (the last one may be empty)
+    """
+    if isinstance(signal, (str, os.PathLike)):
+        signal = open_capture(signal)
+
+    scanner = PeakWindowScanner(window_size, height, threshold, overlap)
+
+    for start in range(0, len(signal), chunk_size):
+        windows = scanner.push(signal[start:start + chunk_size])
+        if len(windows):
+            yield format_windows(windows)
+
+    yield format_windows(scanner.flush())
+
+
 def tags_files(path, tags):
     """Inspect the files in the given path and return the ones which contain the tag numbers specified.
     :param path: The path to the dataset's folder
@@ -85,82 +313,270 @@ def tags_files(path, tags):
     return file_groups
 
 
-def load_data(path, file_groups):
+def load_data(path, file_groups, mmap=False):
     """Read data from the raw files and concatenate signals from the same tags in a dataset array
     :param path: The path to the data files
     :param file_groups: The way in which to concatenate the files
+    :param mmap: Whether to memory-map the captures instead of reading them, exposing each tag as a lazy signal
     :return: An array of the appended signals in order of label
     """
+    if mmap:
+        return [load_captures(path, files) for files in file_groups]
+
     data = []
 
     for files in file_groups:
-        # Read each capture
-        signal = np.array([])
-        for file in files:
-            signal = np.append(signal, np.fromfile(os.path.join(path, file), dtype=complex64), 0)
-
+        # Read each capture and concatenate them at once, keeping the samples' original precision
+        signal = np.concatenate([np.fromfile(os.path.join(path, file), dtype=np.complex64) for file in files])
         data.append(signal)
 
     return data
 
 
-def harmonize_length(data, labels):
-    """Harmonize the length of the different labels, make sure each one has the same amount of data
+def harmonize_length(data, labels, strategy="undersample", stats=None):
+    """Harmonize the length of the different labels, make sure each one has the same amount of data.
+    The windows are written directly in a single preallocated float32 array.
     :param data: The dataset containing all data
     :param labels: The labels for the data
+    :param strategy: How to balance the labels: "undersample" truncates each label to the smallest amount of windows,
+                     "weights" keeps every window (the imbalance is then compensated by class weights, see
+                     `class_weights`) and "oversample" keeps every window too, the training windows being repeated
+                     once the dataset is split (see `oversample_indices`)
+    :param stats: Normalization statistics to update with the windows as they are written, if any
     :return: The harmonized dataset and the labels correctly set for this dataset
     """
-    # Find the smallest number of windows in a class
-    min_window_number = min([len(x) for x in data])
+    counts = [len(data[label]) for label in labels]
+    if strategy == "undersample":
+        targets = [min(counts)] * len(labels)
+    elif strategy in ("oversample", "weights"):
+        targets = counts
+    else:
+        raise ValueError(f"Unknown balancing strategy: {strategy}")
+
+    X = np.empty((sum(targets),) + data[labels[0]].shape[1:], dtype=np.float32)
+    y = np.empty(sum(targets), dtype=int)
+
+    position = 0
+    for label, count, target in zip(labels, counts, targets):
+        windows = data[label]
+        end = position + target
 
-    X, y = [], []
-    # Go through the added data and truncate it to ensure a balanced dataset
-    for label in labels:
-        X.extend(data[label][:min_window_number])
-        y.extend([label] * min_window_number)
+        X[position:end] = windows[:target]
+        y[position:end] = label
 
-    X, y = np.array(X), np.array(y)
+        if stats is not None:
+            stats.update(X[position:end])
+        position = end
 
     return X, y
 
 
-def read_dataset(data_conf):
+def class_weights(y):
+    """Compute the weight of each class so that they all have the same importance during training.
+    :param y: The labels of the training data
+    :return: A dictionary of weights indexed by label
     """
-    Sort and read the given files as complex numbers and partition them in smaller segments.
+    labels, counts = np.unique(y, return_counts=True)
+    weights = len(y) / (len(labels) * counts)
+    return dict(zip(labels.tolist(), weights.tolist()))
+
+
+def oversample_indices(y, indices, seed=42):
+    """Repeat random windows of the smaller classes, up to the amount of windows of the largest one.
+    Only the training indices are to be oversampled, once the dataset is split, so that no copy of a training window
+    is validated or tested.
+    :param y: The labels of the dataset
+    :param indices: The indices of the windows to balance
+    :param seed: The seed used to choose the repeated windows
+    :return: The sorted indices, with the repeated ones
+    """
+    rng = np.random.default_rng(seed)
+    labels, counts = np.unique(y[indices], return_counts=True)
+    repeated = [rng.choice(indices[y[indices] == label], counts.max() - count) for label, count in zip(labels, counts)]
+    return np.sort(np.concatenate([indices] + repeated))
+
+
+def chunked_windows(signal, window_size, format_windows, hop=None, chunk_size=CHUNK_SIZE):
+    """Cut a lazy signal in windows as `signal_windows` does, reading about `chunk_size` samples at a time instead of
+    the whole signal.
+    :param signal: The I/Q signal, e.g. memory-mapped captures (see `dataset.capture.ConcatenatedSignal`)
+    :param window_size: The wanted size for the signal windows
+    :param format_windows: The function with which to format the windows
+    :param hop: The number of samples between the starts of two windows (defaults to `window_size`)
+    :param chunk_size: The number of samples to read at once
+    :return: The formatted windows
+    """
+    hop = hop or window_size
+    count = max((len(signal) - window_size) // hop + 1, 0)
+    per_chunk = max(chunk_size // hop, 1)
+
+    batches = [format_windows(np.empty((0, window_size), dtype=signal.dtype))]
+    for first in range(0, count, per_chunk):
+        last = min(first + per_chunk, count) - 1
+        batches.append(format_windows(signal_windows(signal[first * hop:last * hop + window_size], window_size, hop)))
+
+    return np.concatenate(batches)
+
+
+def format_tag(signal, data_conf):
+    """Cut the signal of a tag in windows and format them as configured.
+    Memory-mapped signals are read chunk by chunk (of `chunksize` samples, or `CHUNK_SIZE`), so that they are never
+    read in memory at once.
+    :param signal: The I/Q signal of the tag, in memory or memory-mapped (see `load_data`)
+    :param data_conf: A dictionary containing the experiment's parameters
+    :return: The formatted windows of the tag
+    """
+    lazy = not isinstance(signal, np.ndarray)
+    chunk_size = data_conf.get('chunksize') or (CHUNK_SIZE if lazy else None)
+
+    if data_conf['filter'] and chunk_size:
+        return np.concatenate(list(stream_peaks_windows(signal, data_conf['windowsize'], data_conf['windows'],
+                                                        chunk_size)))
+    if data_conf['filter']:
+        return filter_peaks_windows(signal, data_conf['windowsize'], data_conf['windows'])
+    if lazy:
+        return chunked_windows(signal, data_conf['windowsize'], data_conf['windows'], data_conf.get('hop'), chunk_size)
+
+    windows = signal_windows(signal, data_conf['windowsize'], data_conf.get('hop'))
+    return data_conf['windows'](windows)
+
+
+def format_tag_files(data_conf, files):
+    """Read and format the captures of a tag in a worker process, sharing the result instead of returning it.
+    :param data_conf: A dictionary containing the experiment's parameters
+    :param files: The files of the tag
+    :return: The descriptor of the formatted windows in shared memory
+    """
+    signal = load_data(data_conf['datapath'], [files], mmap=True)[0]
+    return share_array(format_tag(signal, data_conf))
+
+
+def parallel_format_tags(data_conf, files_per_tag):
+    """Read and format the captures of each tag in a pool of `data_conf['workers']` processes.
+    :param data_conf: A dictionary containing the experiment's parameters
+    :param files_per_tag: The sorted files to read for each tag
+    :return: A couple (formatted windows of each tag, shared memory blocks to release once they are not used anymore)
+    """
+    start_tracker()
+    with ProcessPoolExecutor(max_workers=data_conf['workers']) as pool:
+        futures = [pool.submit(format_tag_files, data_conf, files) for files in files_per_tag]
+
+    # The blocks shared by the other workers are attached even if a worker failed, so that they are all released
+    attached = []
+    try:
+        for future in futures:
+            if future.exception() is None:
+                attached.append(attach_array(future.result()))
+        for future in futures:
+            future.result()
+    except BaseException:
+        blocks = [block for _, block in attached]
+        # The arrays have to be deleted before their blocks are closed
+        attached.clear()
+        for block in blocks:
+            release_block(block)
+        raise
+
+    return [array for array, _ in attached], [block for _, block in attached]
+
+
+def preprocess_dataset(data_conf, files_per_tag, stats=None):
+    """
+    Read the given files as complex numbers and partition them in smaller segments.
     Then, format these segments using a a given function and store them in a list of training/testing data.
     Finally, build a list of labels using the filename.
 
     :param data_conf: A dictionary containing the experiment's parameters
-    :return: A couple of numpy arrays in the form (formatted data, labels)
+    :param files_per_tag: The sorted files to read for each tag
+    :param stats: Normalization statistics to reuse (e.g. those of a trained model) instead of computing them
+    :return: A triple in the form (formatted data, labels, normalization statistics or None)
     """
+    if data_conf.get('workers'):
+        # Each tag is processed in its own worker, which writes its windows in shared memory
+        data, blocks = parallel_format_tags(data_conf, files_per_tag)
+    else:
+        tags = load_data(data_conf['datapath'], files_per_tag, data_conf.get('mmap', False))
+        # Format signal in segments and add them to the collection of training/testing data
+        data, blocks = [format_tag(tag, data_conf) for tag in tags], []
+
+    # The normalization statistics are computed while the windows are written in the dataset
+    method = normalization_method(data_conf['normalize'], data_conf['windows'])
+    if method and stats is None and method != "rms":
+        stats = WindowStats(method)
+        X, y = harmonize_length(data, data_conf['classes'], data_conf.get('balance', "undersample"), stats)
+    else:
+        X, y = harmonize_length(data, data_conf['classes'], data_conf.get('balance', "undersample"))
+
+    del data
+    for block in blocks:
+        release_block(block)
+
+    # Normalize our data in place
+    if method:
+        X, stats = normalize_dataset(X, method, stats)
+    else:
+        stats = None
+
+    return X, y, stats
+
+
+def read_dataset(data_conf, stats=None):
+    """
+    Sort the dataset's files and preprocess them (see `preprocess_dataset`). If a cache folder is configured, the
+    preprocessed dataset is stored there and reused as long as the data configuration and the files are the same.
+
+    :param data_conf: A dictionary containing the experiment's parameters
+    :param stats: Normalization statistics to reuse (e.g. those of a trained model) instead of computing them
+    :return: A triple in the form (formatted data, labels, normalization statistics or None)
+    """
+    # Checked first, so that a cached dataset is not reused with a normalization which does not suit it
+    normalization_method(data_conf['normalize'], data_conf['windows'])
     files_per_tag = tags_files(data_conf['datapath'], data_conf['tags'])
-    tags = load_data(data_conf['datapath'], files_per_tag)
 
-    data = []
-    for tag in tags:
-        # Format signal in segments and add them to the collection of training/testing data
-        if data_conf['filter']:
-            formatted = filter_peaks_windows(tag, data_conf['windowsize'], data_conf['windows'])
-        else:
-            windows = list(partition(tag, data_conf['windowsize']))
-            formatted = data_conf['windows'](windows)
+    if not data_conf.get('cache'):
+        return preprocess_dataset(data_conf, files_per_tag, stats)
 
-        data.append(formatted)
+    # Reused statistics give a different dataset than the ones computed on the data
+    key = cache_key(data_conf, data_conf['datapath'], files_per_tag, stats and stats.to_dict())
+    cached = load_cached(data_conf['cache'], key)
+    if cached is not None:
+        return cached
 
-    X, y = harmonize_length(data, data_conf['classes'])
+    X, y, stats = preprocess_dataset(data_conf, files_per_tag, stats)
+    # The size of the cache is given in gigabytes
+    store_cached(data_conf['cache'], key, X, y, stats, data_conf.get('cachesize', 10) * 1e9)
 
-    # Normalize our data
-    if data_conf['normalize']:
-        max_value = np.abs(X).max()
-        X = X / max_value
+    return X, y, stats
 
-    return X, y
+
+def split_indices(y, train_ratio, validation_ratio, test_ratio, seed=42):
+    """
+    Split the indices of a dataset in given portions of training, validation and testing indices, without copying the
+    data itself. The split is stratified, so that each portion has the same proportion of each label, and reproducible.
+
+    :param y: The labels of the dataset
+    :param train_ratio: The wanted percentage of training data
+    :param validation_ratio: The wanted percentage of validation data
+    :param test_ratio: The wanted percentage of test data
+    :param seed: The seed of the random split
+    :return: Three sorted arrays with the training, validation and test indices
+    """
+    # Imported here, so that reading and preprocessing the data does not pay for importing sklearn
+    from sklearn.model_selection import train_test_split
+
+    train, test = train_test_split(np.arange(len(y)), train_size=train_ratio, random_state=seed, stratify=y)
+    validation, test = train_test_split(test, test_size=test_ratio / (test_ratio + validation_ratio),
+                                        random_state=seed, stratify=y[test])
+
+    # Sorted indices make reading the windows from memory-mapped data faster
+    return np.sort(train), np.sort(validation), np.sort(test)
 
 
 def split_data(X, y, train_ratio, validation_ratio, test_ratio):
     """
-    Split the data and the labels in given portions of training, validation and testing data. Also converts the labels
-    to categorical data.
+    Split the data and the labels in given portions of training, validation and testing data (see `split_indices`).
+    Also converts the labels to categorical data.
+    Note that this copies the dataset, `split_indices` and `learn.pipeline.window_dataset` should be preferred.
 
     :param X: Data to split in portions defined in the ratio parameters
     :param y: Labels to split in the same manner as the data
@@ -169,19 +585,10 @@ def split_data(X, y, train_ratio, validation_ratio, test_ratio):
     :param test_ratio: The wanted percentage of test data
     :return: Three couples with training data and labels, validation data and labels, and test data and labels
     """
-    # https://datascience.stackexchange.com/a/53161
     nb_classes = len(set(y))
-    y = to_categorical(y.astype(int), nb_classes)
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=1 - train_ratio)
-
-    X_val, X_test, y_val, y_test = train_test_split(X_test, y_test,
-                                                    test_size=test_ratio / (test_ratio + validation_ratio),
-                                                    shuffle=False)
-
+    # One-hot labels, as `to_categorical` would, without requiring TensorFlow
+    categorical = np.eye(nb_classes, dtype=np.float32)[y.astype(int)]
     dimensions = len(X.shape)
-    X_train = np.expand_dims(X_train, axis=dimensions)
-    X_val = np.expand_dims(X_val, axis=dimensions)
-    X_test = np.expand_dims(X_test, axis=dimensions)
 
-    return (X_train, y_train), (X_val, y_val), (X_test, y_test)
+    return tuple((np.expand_dims(X[indices], axis=dimensions), categorical[indices])
+                 for indices in split_indices(y, train_ratio, validation_ratio, test_ratio))
@@ -0,0 +1,133 @@
+import json
+import numpy as np
+
+from dataset.features import windows_features
+
+"""
+This module provides incremental normalization statistics over formatted windows, and functions to normalize datasets
+in place with them.
+"""
+
+# Number of windows processed at once, which bounds the size of the temporary arrays
+CHUNK_SIZE = 4096
+# Methods which treat the formatted windows as I/Q samples, and would mix up unrelated features
+SIGNAL_METHODS = ["standard", "rms"]
+
+
+def channels(windows):
+    """Separate the in-phase and quadrature parts of formatted windows, without copying them.
+    :param windows: Windows in the 2d layout (real parts then imaginary parts) or the 3d layout (one row per part)
+    :return: A couple of views (in-phase parts, quadrature parts)
+    """
+    if windows.ndim == 2:
+        half = windows.shape[1] // 2
+        return windows[:, :half], windows[:, half:]
+
+    return windows[:, 0], windows[:, 1]
+
+
+class WindowStats:
+    """
+    Normalization statistics of a dataset, accumulated batch by batch: maximum absolute value, and per-channel
+    (in-phase and quadrature) mean and standard deviation.
+    """
+
+    def __init__(self, method="max", count=0, maximum=0.0, sums=(0.0, 0.0), squares=(0.0, 0.0)):
+        self.method = method
+        self.count = count
+        self.maximum = maximum
+        self.sums = np.array(sums, dtype=np.float64)
+        self.squares = np.array(squares, dtype=np.float64)
+
+    def update(self, windows):
+        """Add a batch of formatted windows to the statistics.
+        :param windows: The formatted windows
+        """
+        for start in range(0, len(windows), CHUNK_SIZE):
+            chunk = windows[start:start + CHUNK_SIZE]
+            if chunk.size == 0:
+                continue
+
+            self.maximum = max(self.maximum, float(np.abs(chunk).max()))
+            for channel, values in enumerate(channels(chunk)):
+                values = values.astype(np.float64)
+                self.sums[channel] += values.sum()
+                self.squares[channel] += np.square(values).sum()
+            self.count += chunk.size // 2
+
+    @property
+    def mean(self):
+        return self.sums / max(self.count, 1)
+
+    @property
+    def std(self):
+        return np.sqrt(np.maximum(self.squares / max(self.count, 1) - np.square(self.mean), 0))
+
+    def apply(self, X):
+        """Normalize a dataset in place with these statistics, chunk by chunk so that no full-size copy is created.
+        :param X: The formatted dataset (a writable array of floats)
+        :return: The normalized dataset (the same array)
+        """
+        for start in range(0, len(X), CHUNK_SIZE):
+            chunk = X[start:start + CHUNK_SIZE]
+
+            if self.method == "max":
+                chunk /= self.maximum
+            elif self.method == "standard":
+                for channel, values in enumerate(channels(chunk)):
+                    values -= self.mean[channel]
+                    values /= self.std[channel]
+            elif self.method == "rms":
+                # Each window is scaled by its own root mean square value, no dataset statistic is needed
+                axes = tuple(range(1, chunk.ndim))
+                rms = np.sqrt(np.mean(np.square(chunk), axis=axes, keepdims=True))
+                chunk /= np.maximum(rms, np.finfo(chunk.dtype).tiny)
+            else:
+                raise ValueError(f"Unknown normalization method: {self.method}")
+
+        return X
+
+    def to_dict(self):
+        return {"method": self.method, "count": self.count, "maximum": self.maximum,
+                "sums": self.sums.tolist(), "squares": self.squares.tolist()}
+
+    def save(self, path):
+        """Write the statistics in a json file, e.g. alongside a trained model."""
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Read statistics saved with `save`."""
+        with open(path, "r") as file:
+            return cls(**json.load(file))
+
+
+def normalization_method(normalize, windows=None):
+    """Read the normalization method from the data configuration (`true` stands for the historical "max" method).
+    :param normalize: The value of the `normalize` parameter
+    :param windows: The windows layout (as a function), to check that the method suits it
+    :return: The name of the method, or None if the data is not to be normalized
+    :raise ValueError: If the method normalizes the features of the features layout as I/Q samples
+    """
+    method = "max" if normalize is True else normalize or None
+
+    if method in SIGNAL_METHODS and windows is windows_features:
+        raise ValueError(f"The {method} normalization cannot be applied to the features layout, whose columns are "
+                         f"unrelated features rather than I/Q samples")
+    return method
+
+
+def normalize_dataset(X, method, stats=None):
+    """Normalize a dataset in place, computing its statistics in a single pass unless some are given.
+    :param X: The formatted dataset (a writable array of floats)
+    :param method: The normalization method ("max", "standard" or "rms")
+    :param stats: Statistics to reuse, e.g. those of the training data, instead of computing them on X
+    :return: The normalized dataset and the statistics used
+    """
+    if stats is None:
+        stats = WindowStats(method)
+        if method != "rms":
+            stats.update(X)
+
+    return stats.apply(X), stats
@@ -0,0 +1,48 @@
+import numpy as np
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+"""
+This module provides functions to hand arrays over between processes through shared memory, instead of pickling them.
+"""
+
+
+def share_array(array):
+    """Copy an array in a new shared memory block, which stays available after this process closes its handle.
+    :param array: The array to share
+    :return: A small picklable descriptor (block name, shape, dtype) with which to attach the array
+    """
+    array = np.ascontiguousarray(array)
+    # Shared memory blocks cannot be empty
+    block = SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    # The block can only be closed once no array uses its buffer anymore
+    del shared
+    block.close()
+
+    return block.name, array.shape, array.dtype.str
+
+
+def attach_array(descriptor):
+    """Attach an array shared by another process, without copying it.
+    :param descriptor: The descriptor returned by `share_array`
+    :return: A couple (array, shared memory block), the block has to be released once the array is no longer used
+    """
+    name, shape, dtype = descriptor
+    block = SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf), block
+
+
+def release_block(block):
+    """Close and delete a shared memory block, once the arrays attached to it have been deleted."""
+    block.close()
+    block.unlink()
+
+
+def start_tracker():
+    """
+    Start the resource tracker before creating worker processes, so that they share it with this process.
+    Otherwise, each worker would start its own tracker, which deletes the blocks it created when the worker exits.
+    """
+    resource_tracker.ensure_running()
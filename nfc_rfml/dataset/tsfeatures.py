@@ -0,0 +1,278 @@
+import os
+import csv
+import re
+import json
+import hashlib
+import warnings
+import numpy as np
+
+from dataset.capture import open_capture
+from dataset.format import filter_peaks_windows
+
+"""
+This module extracts tsfresh features from the windows of the captures, one row of features per window. The features
+of each capture are kept in a cache keyed by the capture file and the extraction parameters, so that only new or
+modified captures are extracted again, and the rows of all the captures are assembled in a columnar table (Parquet or
+npz). pandas and tsfresh are only imported by the functions which need them.
+"""
+
+# Increment when the extraction changes, to invalidate older cache entries
+VERSION = 2
+# Columns identifying the windows, before the features
+INDEX_COLUMNS = ["tag", "capture", "window"]
+FEATURE_SETS = ["minimal", "efficient", "comprehensive"]
+
+
+def capture_tag(file):
+    """Read the number of the tag from the name of a capture file (e.g. 3 for "tag3-2.nfc")."""
+    match = re.search(r"tag(\d+)", file)
+    if match is None:
+        raise ValueError(f"No tag number in the capture name: {file}")
+    return int(match.group(1))
+
+
+def fc_parameters(features):
+    """Build the tsfresh settings of a feature set.
+    :param features: One of `FEATURE_SETS`, or a dictionary of settings per kind ("I" and "Q", see
+                     `tsfresh.feature_extraction.settings.from_columns`)
+    :return: A couple (default settings, settings per kind), one of which is None
+    """
+    if isinstance(features, dict):
+        return None, features
+
+    from tsfresh.feature_extraction import ComprehensiveFCParameters, EfficientFCParameters, MinimalFCParameters
+
+    settings = {
+        "minimal": MinimalFCParameters,
+        "efficient": EfficientFCParameters,
+        "comprehensive": ComprehensiveFCParameters
+    }
+    return settings[features](), None
+
+
+def capture_key(path, file, params):
+    """Compute the cache key of the features of a capture.
+    :param path: The folder of the captures
+    :param file: The name of the capture file
+    :param params: The extraction parameters which change the features (window size, feature set, etc.)
+    :return: A hexadecimal digest identifying the features of the capture
+    """
+    stat = os.stat(os.path.join(path, file))
+    description = json.dumps({"version": VERSION, "params": params, "source": [file, stat.st_size, stat.st_mtime_ns]},
+                             sort_keys=True, default=str)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def capture_windows(path, file, window_size, max_windows=None):
+    """Cut the windows of a capture at the peaks of its signal (the tag's answers), as the datasets are.
+    :return: A 2D array of complex windows
+    """
+    windows = filter_peaks_windows(open_capture(os.path.join(path, file)), window_size, np.asarray)
+    return windows[:max_windows]
+
+
+def windows_frame(windows):
+    """Lay windows out in the long format expected by tsfresh, one row per sample.
+    :param windows: A 2D array of complex windows
+    :return: A DataFrame with the id of the window, the position of the sample in it, and its I and Q values
+    """
+    import pandas as pd
+
+    count, size = windows.shape
+    return pd.DataFrame({"id": np.repeat(np.arange(count), size),
+                         "time": np.tile(np.arange(size), count),
+                         "I": windows.real.ravel(),
+                         "Q": windows.imag.ravel()})
+
+
+def imputation_values(X):
+    """Compute the values replacing the undefined features of each column, as tsfresh's `impute` does: the minimum of
+    the finite values for -inf, their maximum for +inf and their median for NaN (0 for columns without any).
+    :param X: A 2D array of features, one row per window (e.g. the training windows)
+    :return: A dictionary of lists ("min", "max" and "median") with a value per column
+    """
+    finite = np.where(np.isfinite(X), X, np.nan)
+    with warnings.catch_warnings():
+        # The columns without finite values give NaN, replaced below
+        warnings.simplefilter("ignore", RuntimeWarning)
+        values = {"min": np.nanmin(finite, axis=0), "max": np.nanmax(finite, axis=0),
+                  "median": np.nanmedian(finite, axis=0)}
+    return {name: np.nan_to_num(column, nan=0.0).tolist() for name, column in values.items()}
+
+
+def impute_features(X, values):
+    """Replace the undefined features with the values computed by `imputation_values`, which must not depend on the
+    windows being imputed (e.g. a small batch at inference).
+    :param X: A 2D array of features, one row per window
+    :param values: The imputation values of each column
+    :return: A new array without infinite nor NaN values
+    """
+    X = np.where(np.isneginf(X), np.asarray(values['min'], dtype=X.dtype), X)
+    X = np.where(np.isposinf(X), np.asarray(values['max'], dtype=X.dtype), X)
+    return np.where(np.isnan(X), np.asarray(values['median'], dtype=X.dtype), X)
+
+
+def extract_windows_features(windows, features="efficient", n_jobs=0, chunksize=None, impute=True):
+    """Extract tsfresh features from windows, one row per window.
+    :param windows: A 2D array of complex windows
+    :param features: The feature set (see `fc_parameters`)
+    :param n_jobs: The number of processes of tsfresh (0 to extract in this process)
+    :param chunksize: The number of (window, kind) series given to a process at once (None lets tsfresh decide)
+    :param impute: Whether to replace the undefined features (e.g. on constant parts) with values computed on these
+                   windows, or to leave them to be imputed with other values (see `impute_features`)
+    :return: A DataFrame of features indexed by the position of the window
+    """
+    from tsfresh import extract_features
+
+    default, per_kind = fc_parameters(features)
+    extracted = extract_features(windows_frame(windows), column_id="id", column_sort="time",
+                                 default_fc_parameters=default, kind_to_fc_parameters=per_kind,
+                                 n_jobs=n_jobs, chunksize=chunksize, disable_progressbar=True).sort_index()
+    if impute:
+        extracted[:] = impute_features(extracted.to_numpy(), imputation_values(extracted.to_numpy()))
+    return extracted
+
+
+def write_table(table, path):
+    """Write a table of features, in Parquet or npz according to the extension of the path.
+    :param table: A DataFrame with the `INDEX_COLUMNS` followed by the features
+    :param path: The path of the file, ending in .parquet or .npz
+    """
+    if str(path).endswith(".parquet"):
+        table.to_parquet(path, index=False)
+        return
+
+    features = [column for column in table.columns if column not in INDEX_COLUMNS]
+    np.savez(path, tag=table['tag'].to_numpy(), capture=table['capture'].to_numpy(dtype=str),
+             window=table['window'].to_numpy(), columns=np.array(features, dtype=str),
+             values=table[features].to_numpy(dtype=np.float32))
+
+
+def read_table(path):
+    """Read a table of features written by `write_table`."""
+    import pandas as pd
+
+    if str(path).endswith(".parquet"):
+        return pd.read_parquet(path)
+
+    with np.load(path) as file:
+        table = pd.DataFrame(file['values'], columns=file['columns'].tolist())
+        table.insert(0, "window", file['window'])
+        table.insert(0, "capture", file['capture'])
+        table.insert(0, "tag", file['tag'])
+    return table
+
+
+def extract_captures(path, files, cache_dir, window_size=256, max_windows=None, features="efficient", n_jobs=0,
+                     chunksize=None, extension="npz", impute=True):
+    """Extract the features of the windows of captures, reusing the cached features of the captures already seen.
+    The windows of all the new captures are extracted together, so that tsfresh distributes them over its processes.
+    The features are cached as extracted, undefined values included.
+    :param path: The folder of the captures
+    :param files: The names of the capture files
+    :param cache_dir: The folder in which the features of each capture are kept
+    :param window_size: The number of samples per window
+    :param max_windows: The maximum number of windows per capture (all of them by default)
+    :param features: The feature set (see `fc_parameters`)
+    :param n_jobs: The number of processes of tsfresh
+    :param chunksize: The number of series given to a process at once
+    :param extension: The format of the cached tables, "npz" or "parquet"
+    :param impute: Whether to replace the undefined features with values computed on all the windows, or to leave
+                   them (e.g. to compute the values on the training windows only, see `impute_features`)
+    :return: A DataFrame with the `INDEX_COLUMNS` and the features of every window of the captures, in order
+    """
+    import pandas as pd
+
+    os.makedirs(cache_dir, exist_ok=True)
+    params = {"windowsize": window_size, "maxwindows": max_windows, "features": features}
+    entries = {file: os.path.join(cache_dir, f"{capture_key(path, file, params)}.{extension}") for file in files}
+    missing = [file for file in files if not os.path.exists(entries[file])]
+
+    if missing:
+        print(f"Extract features from {len(missing)} of {len(files)} captures")
+        windows = [capture_windows(path, file, window_size, max_windows) for file in missing]
+        extracted = extract_windows_features(np.concatenate(windows), features, n_jobs, chunksize, impute=False)
+
+        start = 0
+        for file, capture in zip(missing, windows):
+            table = extracted.iloc[start:start + len(capture)].reset_index(drop=True)
+            table.insert(0, "window", np.arange(len(capture)))
+            table.insert(0, "capture", file)
+            table.insert(0, "tag", capture_tag(file))
+            # Written aside then renamed, so that an interrupted extraction never leaves a partial entry
+            temporary = f"{entries[file]}.{os.getpid()}.{extension}"
+            write_table(table, temporary)
+            os.replace(temporary, entries[file])
+            start += len(capture)
+
+    table = pd.concat([read_table(entries[file]) for file in files], ignore_index=True)
+    if impute:
+        names = [column for column in table.columns if column not in INDEX_COLUMNS]
+        values = table[names].to_numpy()
+        table[names] = impute_features(values, imputation_values(values))
+    return table
+
+
+def select_table(table):
+    """Select the features which are relevant to tell the tags apart (tsfresh's hypothesis tests).
+    :param table: A table of features, as returned by `extract_captures`
+    :return: The names of the selected features, most relevant first
+    """
+    from tsfresh import select_features
+
+    features = table.drop(columns=INDEX_COLUMNS)
+    return select_features(features, table['tag']).columns.tolist()
+
+
+def read_selected(path):
+    """Read the names of the selected features.
+    :param path: A csv file with a "feature" column (written by `--select`), or a table of the selected features as
+                 tsfresh writes it (their names are then its columns)
+    :return: The list of feature names
+    """
+    with open(path, "r", newline="") as file:
+        rows = list(csv.reader(file))
+
+    if rows and rows[0] == ["feature"]:
+        return [row[0] for row in rows[1:] if row]
+    return [name for name in rows[0] if name not in ("", "id")]
+
+
+class SelectedFeatures:
+    """
+    Minimal extractor computing only the selected features of windows, instead of the hundreds of features of a whole
+    tsfresh feature set. It formats windows like the other layouts (see `dataset.configuration.windows`), so that the
+    inference engine can use it directly.
+    """
+
+    def __init__(self, names, n_jobs=0, imputation=None):
+        """
+        :param names: The names of the features, as tsfresh names their columns (e.g. "I__mean")
+        :param n_jobs: The number of processes of tsfresh (0 is the fastest for the small batches of the engine)
+        :param imputation: The values replacing the undefined features, computed on the training windows (see
+                           `imputation_values`). Without them (models saved before they were kept), the undefined
+                           features are replaced by 0.
+        """
+        from tsfresh.feature_extraction.settings import from_columns
+
+        self.names = list(names)
+        self.n_jobs = n_jobs
+        zeros = [0.0] * len(self.names)
+        self.imputation = imputation or {"min": zeros, "max": zeros, "median": zeros}
+        # The settings of the calculators needed by the features, and of nothing else
+        self.parameters = from_columns(self.names)
+        self.__name__ = "selected_features"
+
+    def __call__(self, windows):
+        """Compute the selected features of windows.
+        :param windows: A 2D array (or list) of complex windows, one per row
+        :return: A 2D float32 array with the features of each window, in the order of their names
+        """
+        windows = np.asarray(windows)
+        if len(windows) == 0:
+            return np.empty((0, len(self.names)), dtype=np.float32)
+
+        # The values of a batch are not representative, the undefined features are imputed as in training
+        extracted = extract_windows_features(windows, self.parameters, self.n_jobs, impute=False)
+        # Some calculators return several features at once
+        return impute_features(extracted[self.names].to_numpy(dtype=np.float32), self.imputation)
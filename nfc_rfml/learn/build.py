@@ -1,14 +1,24 @@
 import os
+import json
+import numpy as np
 from pathlib import Path
+from time import perf_counter
 from datetime import datetime
 
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
-from sklearn.metrics import classification_report, confusion_matrix
-from sklearn.model_selection import train_test_split
 from sklearn.svm import SVC
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import classification_report, confusion_matrix
 
-from dataset.format import split_data
+from dataset.format import split_indices, oversample_indices
+from dataset.tsfeatures import imputation_values, impute_features
 from learn.evaluate import evaluate_model
+from learn.export import export_tflite, compare_models
+from learn.pipeline import window_dataset
+from learn.svm import make_svm, train_test_indices, training_weights
+from serve.lite import LiteModel
+from serve.feature_model import FeatureModel, write_description
 
 """
 Provide some do-all functions to configure, train and evaluate models.
@@ -19,82 +29,183 @@ def reload_model(model_path, conf, Xshape):
     """Reload a given model's weights and return the model object
     :param model_path: The path to the saved model weights
     :param conf: A dictionary containing the experiment's parameters
-    :param Xshape: The shape of the dataset
+    :param Xshape: The shape of the windows in the dataset
     :return: The correct model with its trained weights, ready to make predictions
     """
-    shape = (None,) + Xshape
+    # The models take windows with a channel dimension
+    shape = (None,) + tuple(Xshape) + (1,)
 
-    model = conf['model']['type'](nb_outputs=len(conf['data']['tags']), input_shape=shape)
+    model = conf['model']['type'](nb_outputs=len(conf['data']['tags']), input_shape=shape,
+                                  jit_compile=conf['model'].get('jit', False))
     model.load_weights(str(model_path)).expect_partial()
     return model
 
 
-def build_cnn(X, y, model_conf):
+def build_cnn(X, y, model_conf, output_dir="../saved_models", callbacks=(), oversample=False):
     """Split the dataset, build the CNN with the given parameters and train it, recording performance
     :param X: The full dataset
     :param y: The labels for the dataset
     :param model_conf: The experiment parameters for the model
+    :param output_dir: The folder in which the folder of the model is created
+    :param callbacks: Additional Keras callbacks for the training (e.g. a sweep's `PruningCallback`)
+    :param oversample: Whether to balance the classes by repeating training windows (the "oversample" balance)
     :return: The directory in which to save model-related data
     """
-    # Split data into train, validation and test data
-    (X_train, y_train), (X_val, y_val), (X_test, y_test) = split_data(X, y, 0.7, 0.2, 0.1)
+    # Split data into train, validation and test data, the windows are only read batch by batch during training
+    seed = model_conf.get('seed', 42)
+    train, validation, test = split_indices(y, 0.7, 0.2, 0.1, seed)
+    if oversample:
+        train = oversample_indices(y, train, seed)
+    # The labels are kept as integers instead of one-hot vectors
+    labels = y.astype(np.int64)
+    batch_size = model_conf['batchsize']
+    cache = model_conf.get('cachebatches', False)
+    train_data = window_dataset(X, labels, train, batch_size, shuffle=True, cache=cache, seed=seed)
+    validation_data = window_dataset(X, labels, validation, batch_size, cache=cache)
 
     # Build model and output its structure
-    shape = (None,) + X_train.shape[1:]
-    model = model_conf['type'](nb_outputs=len(set(y)), input_shape=shape)
+    shape = (None,) + X.shape[1:] + (1,)
+    model = model_conf['type'](nb_outputs=len(set(y)), input_shape=shape, jit_compile=model_conf.get('jit', False))
 
     # Configure model
-    model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+    model.compile(optimizer="adam", loss="sparse_categorical_crossentropy", metrics=["accuracy"])
 
     # Setup the folder structure
     dt = datetime.now().strftime("%Y-%m-%d %Hh%M")
-    model_dir = Path(f"../saved_models/{dt}")
+    model_dir = Path(output_dir) / dt
     os.makedirs(model_dir / "wrong-predictions")
     os.makedirs(model_dir / "correct-predictions")
     model_path = str(model_dir / "model.tf")
 
     # Save the best model to disk
-    callbacks = [ModelCheckpoint(filepath=model_path, monitor="val_loss", save_best_only=True)]
+    callbacks = [ModelCheckpoint(filepath=model_path, monitor="val_loss", save_best_only=True)] + list(callbacks)
     # Make sure the training stops when the performance stops getting better
     if model_conf['earlystopping']:
         callbacks.append(EarlyStopping(monitor="val_loss", patience=8))
 
+    # Compensate for unbalanced classes (when the dataset was neither undersampled nor oversampled)
+    weights = training_weights(y, train)
+
     # Train model and adjust with validation set
-    history = model.fit(X_train, y_train,
+    history = model.fit(train_data,
                         epochs=model_conf['epochs'],
-                        batch_size=model_conf['batchsize'],
                         callbacks=callbacks,
-                        validation_data=(X_val, y_val))
+                        validation_data=validation_data,
+                        class_weight=weights)
 
     # Get the best model's parameters
     model.load_weights(model_path)
 
     print("Evaluate model________________________")
-    evaluate_model(model, history, y, X_test, y_test, model_dir)
+    evaluate_model(model, history, y, X[test], y[test], model_dir, batch_size, model_conf.get('maxplots', 100))
+
+    if model_conf.get('export', True):
+        print("Export model__________________________")
+        export_model(model, X[test], model_dir, batch_size)
 
     return model_dir
 
 
-def build_svm(X, y):
+def export_model(model, X_test, model_dir, batch_size=500):
+    """Export a trained model to TFLite and check that it makes the same predictions as the Keras model
+    :param model: The trained model
+    :param X_test: The test data
+    :param model_dir: The folder of the model, where model.tflite and the comparison (export.json) are written
+    :param batch_size: The number of windows per batch
+    :return: The comparison of the predictions of both models (see `learn.export.compare_models`)
+    """
+    size = export_tflite(model, model_dir / "model.tflite")
+    comparison = compare_models(model, LiteModel(model_dir / "model.tflite"), X_test, batch_size)
+    comparison["size"] = size
+    print(comparison)
+
+    with open(model_dir / "export.json", "w") as file:
+        json.dump(comparison, file, indent=2)
+
+    return comparison
+
+
+def build_svm(X, y, model_conf=None, oversample=False):
     """Split the dataset, build the SVM, and train it, printing the performance
-    :param X: The full dataset
+    :param X: The full dataset (e.g. memory-mapped from the cache, the streaming engines read it batch by batch)
     :param y: The labels for the dataset
+    :param model_conf: The experiment parameters for the model, which choose the SVM engine (see `learn.svm.make_svm`)
+    :param oversample: Whether to balance the classes by repeating training windows (the "oversample" balance)
+    :return: The test accuracy and macro-averaged F1 score, as a dictionary
     """
-    # Split data into train and test data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-    print(X_train.shape, X_test.shape, y_train.shape, y_test.shape)
+    model_conf = model_conf or {}
+
+    # Split data into train and test data, the windows are only read when fitting and predicting
+    train, test = train_test_indices(len(y))
+    if oversample:
+        train = oversample_indices(y, train)
+    print(X.shape, len(train), len(test))
 
-    model = SVC()
-    model.fit(X_train, y_train)
+    # Compensate for unbalanced classes, as the CNNs do
+    model = make_svm(model_conf, training_weights(y, train))
+    start = perf_counter()
+    model.fit(X, y, train)
+    fit_time = perf_counter() - start
 
-    training_pred = model.predict(X_train)
-    y_pred = model.predict(X_test)
+    training_pred = model.predict(X, train)
+    y_pred = model.predict(X, test)
 
     print("-------------------------------------------")
-    print("Training performance")
-    print(classification_report(y_train, training_pred))
+    print(f"Training performance ({model_conf.get('engine', 'svc')}, {fit_time:.1f} s)")
+    print(classification_report(y[train], training_pred))
     print("-------------------------------------------")
     print("Testing performance")
-    print(classification_report(y_test, y_pred))
-    print(confusion_matrix(y_test, y_pred))
+    print(classification_report(y[test], y_pred))
+    print(confusion_matrix(y[test], y_pred))
     print("-------------------------------------------")
+
+    report = classification_report(y[test], y_pred, output_dict=True, zero_division=0)
+    return {"accuracy": report['accuracy'], "f1": report['macro avg']['f1-score'], "fit": fit_time}
+
+
+def build_feature_model(table, features, window_size, output_dir="../saved_models", model_conf=None):
+    """Train an SVM on a few selected features of the windows, and save it for the inference engine
+    :param table: The features of the windows, with their tag, not imputed yet (see
+                  `dataset.tsfeatures.extract_captures`)
+    :param features: The names of the features on which to train
+    :param window_size: The number of samples of the windows from which the features were extracted
+    :param output_dir: The folder in which the folder of the model is created
+    :param model_conf: Optionally "C", "gamma" and "seed" for the SVM
+    :return: The directory in which the model was saved
+    """
+    model_conf = model_conf or {}
+    tags = sorted(table['tag'].unique().tolist())
+    X = table[features].to_numpy(dtype=np.float32)
+    y = np.searchsorted(tags, table['tag'].to_numpy())
+
+    train, test = train_test_indices(len(y))
+    print(X.shape, len(train), len(test))
+    # The undefined features are replaced with values of the training windows, which the engine reuses
+    imputation = imputation_values(X[train])
+    X = impute_features(X, imputation)
+
+    # The features have very different scales, and the engine needs probabilities for the confidence
+    classifier = make_pipeline(StandardScaler(), SVC(C=model_conf.get('C', 1.0), gamma=model_conf.get('gamma', "scale"),
+                                                     probability=True, random_state=model_conf.get('seed', 42)))
+    start = perf_counter()
+    classifier.fit(X[train], y[train])
+    fit_time = perf_counter() - start
+    y_pred = classifier.predict(X[test])
+
+    print("-------------------------------------------")
+    print(f"Testing performance ({len(features)} features, {fit_time:.1f} s)")
+    print(classification_report(y[test], y_pred))
+    print(confusion_matrix(y[test], y_pred))
+    print("-------------------------------------------")
+
+    model_dir = Path(output_dir) / f"features-{datetime.now():%Y-%m-%d %Hh%M}"
+    os.makedirs(model_dir)
+    FeatureModel(classifier).save(model_dir)
+    write_description(model_dir, list(features), window_size, tags, imputation)
+
+    report = classification_report(y[test], y_pred, output_dict=True, zero_division=0)
+    metrics = {"accuracy": report['accuracy'], "f1": report['macro avg']['f1-score'], "fit": fit_time}
+    with open(model_dir / "metrics.json", "w") as file:
+        json.dump(metrics, file, indent=2)
+
+    return model_dir
@@ -1,11 +1,14 @@
+import json
 from pathlib import Path
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib import cm
 from sklearn.metrics import classification_report, confusion_matrix
 
+from learn.pipeline import window_dataset
+from learn.render import plot_signal_window, plot_windows_tile, render
+
 """
 Provide functions to save stats on a model and its performance and to plot confusion matrices and performance history.
+Matplotlib is only imported by the plotting functions, as it is slow to import.
 """
 
 
@@ -24,12 +27,35 @@ def write_stats(volume, segments_size, conf_mat, report, model_structure, output
                     f"{report}\n\nConfusion matrix:\n{conf_mat}"))
 
 
+def write_metrics(y_test, y_pred, history, output_dir):
+    """Store the main performance figures in a json file, so that they can be collected by scripts (e.g. sweeps).
+    :param y_test: The test labels
+    :param y_pred: The predicted labels
+    :param history: The history object generated by Keras
+    :param output_dir: The folder where the file is to be written
+    """
+    report = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
+    val_loss = history.history.get('val_loss', [])
+    metrics = {"accuracy": report['accuracy'],
+               "f1": report['macro avg']['f1-score'],
+               "val_loss": min(val_loss) if val_loss else None,
+               "epochs": len(history.history.get('loss', []))}
+
+    with open(output_dir / "metrics.json", "w") as file:
+        json.dump(metrics, file, indent=2)
+
+    return metrics
+
+
 def plot_confusion_matrix(conf_mat, labels, output_dir):
     """Plot a nice looking confusion matrix and store it in an image file.
     :param conf_mat: The confusion matrix in text form
     :param labels: The labels of the classes
     :param output_dir: The folder where the file is to be written
     """
+    import matplotlib.pyplot as plt
+    from matplotlib import cm
+
     conf_mat = conf_mat.astype(int)
 
     fig, ax = plt.subplots(figsize=(10, 10))
@@ -63,6 +89,8 @@ def plot_history(history, output_dir):
     :param history: The history object generated by Keras.
     :param output_dir: The folder where the file is to be written.
     """
+    import matplotlib.pyplot as plt
+
     plt.rc('axes', axisbelow=True)
     # Plot accuracy history
     fig, ax = plt.subplots(figsize=(12, 7))
@@ -89,58 +117,65 @@ def plot_history(history, output_dir):
     plt.close(fig)
 
 
-def plot_signal_window(window, index, label, output_dir):
-    """Plot a signal window
-    :param window: The window to plot
-    :param index: The window index over the whole dataset
-    :param label: The label to which the window actually belongs
-    :param output_dir: The folder where our different files are to be written
+def analyse_predictions(y, y_pred, X, output_dir, max_plots=100, workers=None, tile_size=16, seed=42):
     """
-    fig, ax = plt.subplots(figsize=(30, 10))
-
-    ax.plot(window[0], 'b-')
-    ax.plot(window[1], 'r-')
-    ax.grid(True)
-    ax.set_title(f"Window index: {index}, Label: {label}")
-    ax.set_xlabel("Samples")
-    ax.set_ylabel("Amplitude")
-    ax.legend(["In phase", "In quadrature"], loc="upper left")
-
-    fig.savefig(output_dir / f"t{label}-{index}.png", bbox_inches="tight")
-    plt.close(fig)
-
+    Determine the wrongly predicted windows and plot some of them with as many of the correctly predicted ones, each
+    alone and together in overview images. Every wrongly predicted window is also kept in misclassified.npz.
 
-def analyse_predictions(y, y_pred, X, output_dir):
-    """Determine the wrongly predicted windows and plot them with some of the correctly predicted ones
     :param y: The complete labels set
     :param y_pred: The predicted labels
     :param X: The complete dataset
     :param output_dir: The folder where our different files are to be written
+    :param max_plots: The maximum number of wrongly predicted windows to plot
+    :param workers: The number of processes drawing the plots (defaults to the number of CPUs)
+    :param tile_size: The number of windows per overview image
+    :param seed: The seed of the selection of the plotted windows
     """
-    wrong_indices = np.nonzero((y_pred != y))[0]
-    print("Wrong predictions:", wrong_indices)
+    wrong_indices = np.flatnonzero(y_pred != y)
+    print("Wrong predictions:", len(wrong_indices))
+    np.savez_compressed(output_dir / "misclassified.npz", indices=wrong_indices, windows=X[wrong_indices],
+                        labels=y[wrong_indices], predictions=y_pred[wrong_indices])
+
+    rng = np.random.default_rng(seed)
+    wrong_selection = np.sort(rng.choice(wrong_indices, min(max_plots, len(wrong_indices)), replace=False))
+    correct_indices = np.flatnonzero(y_pred == y)
+    # Take as many correctly labelled windows as there are wrong ones
+    correct_selection = np.sort(rng.choice(correct_indices, min(len(wrong_selection), len(correct_indices)),
+                                           replace=False))
 
-    for index in wrong_indices:
-        plot_signal_window(X[index], index, y[index], output_dir / "wrong-predictions")
+    tasks = []
+    for selection, folder in ((wrong_selection, output_dir / "wrong-predictions"),
+                              (correct_selection, output_dir / "correct-predictions")):
+        tasks += [(plot_signal_window, (X[index], index, y[index], folder)) for index in selection]
+        for number, start in enumerate(range(0, len(selection), tile_size)):
+            tile = selection[start:start + tile_size]
+            tasks.append((plot_windows_tile, (X[tile], tile, y[tile], y_pred[tile], folder / f"overview-{number}.png")))
+
+    render(tasks, workers)
 
-    correct_indices = np.delete(np.arange(len(y)), wrong_indices)
-    # Take as many correctly labelled windows as there are wrong ones
-    selection = np.random.choice(correct_indices, len(wrong_indices), replace=False)
 
-    for index in selection:
-        plot_signal_window(X[index], index, y[index], output_dir / "correct-predictions")
+def predict_classes(model, X, batch_size=500):
+    """Predict the class of every window of a dataset, feeding the model batch by batch
+    :param model: The classifier itself
+    :param X: The windows to classify (without the channel dimension)
+    :param batch_size: The number of windows per batch
+    :return: The predicted labels
+    """
+    y_pred = model.predict(window_dataset(X, None, np.arange(len(X)), batch_size))
+    return np.argmax(y_pred, axis=1)
 
 
-def analyse_model(model, X, y, labels, output_dir):
+def analyse_model(model, X, y, labels, output_dir, batch_size=500, max_plots=100):
     """Get the necessary data to analyse a reloaded model
     :param model: The classifier itself
     :param X: The test data
     :param y: The test labels
     :param labels: The labels for the whole dataset
     :param output_dir: The folder where our different files are to be written
+    :param batch_size: The number of windows per batch when predicting
+    :param max_plots: The maximum number of wrongly predicted windows to plot
     """
-    y_pred = model.predict(X)
-    y_pred = np.argmax(y_pred, axis=1)
+    y_pred = predict_classes(model, X, batch_size)
 
     conf_mat = confusion_matrix(y, y_pred, labels=labels)
     plot_confusion_matrix(conf_mat, labels, output_dir)
@@ -149,24 +184,24 @@ def analyse_model(model, X, y, labels, output_dir):
     amounts = dict(zip(unique, counts))
     report = classification_report(y, y_pred)
 
-    write_stats(amounts, len(X[0][0]), conf_mat, report, "", output_dir)
+    write_stats(amounts, X.shape[-1], conf_mat, report, "", output_dir)
 
-    analyse_predictions(y, y_pred, X, output_dir)
+    analyse_predictions(y, y_pred, X, output_dir, max_plots)
 
 
-def evaluate_model(model, history, y, X_test, y_test, output_dir):
+def evaluate_model(model, history, y, X_test, y_test, output_dir, batch_size=500, max_plots=100):
     """Get all the necessary data to fill our performance results folder and call appropriate functions.
     :param model: The classifier itself
     :param history: The history object returned after the training process
     :param y: The labels for the whole dataset
-    :param X_test: The test data
+    :param X_test: The test data (without the channel dimension)
     :param y_test: The test labels
     :param output_dir: The folder where our different files are to be written
+    :param batch_size: The number of windows per batch when predicting
+    :param max_plots: The maximum number of wrongly predicted windows to plot
     """
     # Evaluate model with test set
-    y_pred = model.predict(X_test)
-    y_pred = np.argmax(y_pred, axis=1)
-    y_test = np.argmax(y_test, axis=1)
+    y_pred = predict_classes(model, X_test, batch_size)
 
     # Count the amount of data for each class
     unique, counts = np.unique(y, return_counts=True)
@@ -182,12 +217,13 @@ def evaluate_model(model, history, y, X_test, y_test, output_dir):
     model.summary(print_fn=lambda x: structure.append(x))
     model_structure = "\n".join(structure)
 
-    write_stats(amounts, len(X_test[0][0]), conf_mat, report, model_structure, output_dir)
+    write_stats(amounts, X_test.shape[-1], conf_mat, report, model_structure, output_dir)
+    write_metrics(y_test, y_pred, history, output_dir)
 
     plot_confusion_matrix(conf_mat, labels, output_dir)
     plot_history(history, output_dir)
 
-    analyse_predictions(y_test, y_pred, X_test, output_dir)
+    analyse_predictions(y_test, y_pred, X_test, output_dir, max_plots)
 
 
 def _test():
@@ -0,0 +1,50 @@
+import numpy as np
+import tensorflow as tf
+
+"""
+Provide functions to export trained models to TFLite, so that they can be run without TensorFlow (see `serve.lite`),
+and to check that the exported models agree with the original ones.
+"""
+
+
+def export_tflite(model, output_path, converter_options=None):
+    """Convert the inference function of a trained model to a TFLite flatbuffer.
+    :param model: The trained model (an `RFMLCNN`)
+    :param output_path: The path of the file to write (usually model.tflite in the model's folder)
+    :param converter_options: A function configuring the converter before the conversion (e.g. for quantization)
+    :return: The size of the exported model in bytes
+    """
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([model.inference_function.get_concrete_function()])
+    if converter_options is not None:
+        converter_options(converter)
+
+    flatbuffer = converter.convert()
+    with open(output_path, "wb") as file:
+        file.write(flatbuffer)
+
+    return len(flatbuffer)
+
+
+def compare_models(reference, exported, X, batch_size=500):
+    """Run two models on the same windows and measure how much their predictions differ.
+    :param reference: The original model, taking batches of windows with the channel dimension
+    :param exported: The exported model (e.g. a `serve.lite.LiteModel`), with the same interface
+    :param X: The windows to classify (without the channel dimension)
+    :param batch_size: The number of windows per batch
+    :return: A dictionary with the number of windows, the proportion of identical predicted labels and the largest
+             difference between the probabilities of the two models
+    """
+    agreeing = 0
+    max_difference = 0.0
+
+    for start in range(0, len(X), batch_size):
+        batch = np.asarray(X[start:start + batch_size], dtype=np.float32)[..., np.newaxis]
+        expected = np.asarray(reference(batch, training=False))
+        actual = np.asarray(exported(batch, training=False))
+
+        agreeing += int(np.sum(np.argmax(expected, axis=1) == np.argmax(actual, axis=1)))
+        max_difference = max(max_difference, float(np.abs(expected - actual).max()))
+
+    return {"windows": len(X),
+            "agreement": agreeing / max(len(X), 1),
+            "max difference": max_difference}
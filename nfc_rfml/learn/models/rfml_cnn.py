@@ -1,3 +1,6 @@
+from functools import cached_property
+
+import tensorflow as tf
 from tensorflow.keras import Model
 from tensorflow.keras.layers import Dense, Conv2D, MaxPooling2D, Flatten, Input, Dropout
 
@@ -5,18 +8,44 @@ from tensorflow.keras.layers import Dense, Conv2D, MaxPooling2D, Flatten, Input,
 class RFMLCNN(Model):
     """
     Simple standard keras Model extended to make the summary work and parameterize the input shape
-    and the number of outputs.
+    and the number of outputs. It also exposes a traced inference function, optionally compiled with XLA.
     """
 
-    def __init__(self, nb_outputs, input_shape):
+    def __init__(self, nb_outputs, input_shape, jit_compile=False):
         super(RFMLCNN, self).__init__()
         self.nb_outputs = nb_outputs
         self.shape = input_shape
+        self.jit_inference = jit_compile
+
+    @cached_property
+    def functional_model(self):
+        """
+        Functional model built on the layers of this model, which allows the output shapes to be correctly shown.
+        (Cached properties are not tracked by Keras, so the layers are not saved twice.)
+        """
+        x = Input(shape=self.shape[1:])
+        return Model(inputs=[x], outputs=self.call(x))
 
     def summary(self, **kwargs):
         """
         Override summary method in order to first build a model.
         This allows the output shapes to be correctly shown.
         """
-        x = Input(shape=self.shape[1:])
-        Model(inputs=[x], outputs=self.call(x)).summary(**kwargs)
+        self.functional_model.summary(**kwargs)
+
+    @cached_property
+    def inference_function(self):
+        """
+        Forward pass in inference mode, traced once with a fixed input signature. The batch dimension is left
+        unknown, so that batches of any size reuse the same graph instead of retracing it.
+        """
+        spec = tf.TensorSpec(shape=(None,) + tuple(self.shape[1:]), dtype=tf.float32)
+        return tf.function(lambda inputs: self.call(inputs, training=False), input_signature=[spec],
+                           experimental_compile=self.jit_inference)
+
+    def warmup(self, batch_sizes=(1,)):
+        """Trace (and compile) the inference function before the first real prediction.
+        :param batch_sizes: The batch sizes to run, each one is compiled separately when XLA is used
+        """
+        for batch_size in batch_sizes:
+            self.inference_function(tf.zeros((batch_size,) + tuple(self.shape[1:])))
@@ -9,8 +9,8 @@ class RiyazCNN(RFMLCNN):
     "Riyaz et al. Deep Learning Convolutional Neural Networks for Radio Identification"
     """
 
-    def __init__(self, nb_outputs, input_shape):
-        super(RiyazCNN, self).__init__(nb_outputs, input_shape)
+    def __init__(self, nb_outputs, input_shape, jit_compile=False):
+        super(RiyazCNN, self).__init__(nb_outputs, input_shape, jit_compile)
 
         self.conv1 = Conv2D(50, (1, 3), padding="same", activation="relu", input_shape=self.shape,
                             bias_regularizer=l2(1e-4))
@@ -31,17 +31,14 @@ class RiyazCNN(RFMLCNN):
 
     def call(self, inputs, training=False):
         x = self.conv1(inputs)
-        if training:
-            x = self.dropout(x, training=training)
+        x = self.dropout(x, training=training)
         x = self.pool1(x)
 
         x = self.conv2(x)
-        if training:
-            x = self.dropout(x, training=training)
+        x = self.dropout(x, training=training)
         x = self.pool2(x)
 
         x = self.flat(x)
         x = self.dense(x)
-        if training:
-            x = self.dropout(x, training=training)
+        x = self.dropout(x, training=training)
         return self.out(x)
@@ -8,8 +8,8 @@ class YoussefCNN(RFMLCNN):
     "Youssef et al. Machine Learning Approach to RF Transmitter Identification"
     """
 
-    def __init__(self, nb_outputs, input_shape):
-        super(YoussefCNN, self).__init__(nb_outputs, input_shape)
+    def __init__(self, nb_outputs, input_shape, jit_compile=False):
+        super(YoussefCNN, self).__init__(nb_outputs, input_shape, jit_compile)
 
         self.conv1 = Conv2D(64, (2, 8), padding="same", activation="relu", input_shape=self.shape)
         self.pool1 = MaxPooling2D(pool_size=(2, 2))
@@ -28,16 +28,13 @@ class YoussefCNN(RFMLCNN):
     def call(self, inputs, training=False):
         x = self.conv1(inputs)
         x = self.pool1(x)
-        if training:
-            x = self.dropout(x, training=training)
+        x = self.dropout(x, training=training)
 
         x = self.conv2(x)
         x = self.pool2(x)
-        if training:
-            x = self.dropout(x, training=training)
+        x = self.dropout(x, training=training)
 
         x = self.flat(x)
         x = self.dense(x)
-        if training:
-            x = self.dropout(x, training=training)
+        x = self.dropout(x, training=training)
         return self.out(x)
@@ -0,0 +1,59 @@
+import numpy as np
+import tensorflow as tf
+
+"""
+Provide tf.data input pipelines which read the windows of a dataset batch by batch, so that the models can be trained
+and evaluated on (possibly memory-mapped) datasets without copying them in memory.
+"""
+
+AUTOTUNE = tf.data.experimental.AUTOTUNE
+
+
+def window_dataset(X, y, indices, batch_size, shuffle=False, cache=False, seed=None):
+    """Build a pipeline which gathers batches of windows (and their labels) from the dataset on the fly.
+    :param X: The formatted dataset, e.g. an array memory-mapped from the cache
+    :param y: The labels for the dataset, or None to only produce windows (e.g. for predictions)
+    :param indices: The indices of the windows to use, in order
+    :param batch_size: The number of windows per batch
+    :param shuffle: Whether to shuffle the windows at each epoch
+    :param cache: Whether to keep the gathered batches in memory after the first epoch (or a file name to cache
+                  them on disk). Shuffled pipelines then only shuffle the order of the batches after the first epoch
+    :param seed: The seed used to shuffle the windows
+    :return: A tf.data.Dataset of batches of windows with a channel dimension, and labels if given
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    window_shape = tuple(X.shape[1:]) + (1,)
+
+    def gather(batch_indices):
+        # Reading the windows in order is much faster on memory-mapped data, the batch keeps the given order though
+        order = np.argsort(batch_indices)
+        windows = np.empty((len(batch_indices),) + window_shape, dtype=np.float32)
+        windows[order, ..., 0] = X[batch_indices[order]]
+        if y is None:
+            return windows
+        return windows, y[batch_indices]
+
+    def gather_batch(batch_indices):
+        if y is None:
+            windows = tf.numpy_function(gather, [batch_indices], tf.float32)
+            windows.set_shape((None,) + window_shape)
+            return windows
+
+        windows, labels = tf.numpy_function(gather, [batch_indices], (tf.float32, tf.as_dtype(y.dtype)))
+        windows.set_shape((None,) + window_shape)
+        labels.set_shape((None,) + y.shape[1:])
+        return windows, labels
+
+    dataset = tf.data.Dataset.from_tensor_slices(indices)
+    if shuffle:
+        # Cached batches are gathered only once, so their content cannot change between epochs
+        dataset = dataset.shuffle(len(indices), seed=seed, reshuffle_each_iteration=not cache)
+
+    dataset = dataset.batch(batch_size).map(gather_batch, num_parallel_calls=AUTOTUNE)
+
+    if cache:
+        dataset = dataset.cache(cache if isinstance(cache, str) else "")
+        if shuffle:
+            dataset = dataset.shuffle(len(indices) // batch_size + 1, seed=seed, reshuffle_each_iteration=True)
+
+    return dataset.prefetch(AUTOTUNE)
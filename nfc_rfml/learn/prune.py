@@ -0,0 +1,110 @@
+import numpy as np
+from tensorflow.keras.callbacks import Callback
+
+"""
+Provide pruners stopping the unpromising trials of a sweep early, by comparing their validation loss to the one of
+the other trials at the same epoch. The validation curves of all the trials are kept in a store shared between the
+worker processes (a `multiprocessing.Manager` dictionary).
+"""
+
+
+class MedianPruner:
+    """
+    Stop a trial when its best validation loss so far is worse than the median of the best losses of the other
+    trials at the same epoch.
+    """
+
+    def __init__(self, warmup=5, min_trials=3):
+        """
+        :param warmup: The number of epochs during which a trial is never stopped
+        :param min_trials: The number of other trials which must have reached the epoch to compare with them
+        """
+        self.warmup = warmup
+        self.min_trials = min_trials
+
+    def should_prune(self, trial, curves):
+        """Decide whether to stop a trial after its last epoch.
+        :param trial: The number of the trial
+        :param curves: The validation losses of each epoch of every trial, indexed by trial
+        :return: True if the trial should be stopped
+        """
+        curve = curves[trial]
+        epoch = len(curve)
+        if epoch <= self.warmup:
+            return False
+
+        others = [min(losses[:epoch]) for other, losses in curves.items() if other != trial and len(losses) >= epoch]
+        if len(others) < self.min_trials:
+            return False
+
+        return min(curve) > np.median(others)
+
+
+class HalvingPruner:
+    """
+    Asynchronous successive halving: at each rung (after `min_epochs`, then `reduction` times more epochs, etc.),
+    only the best trial out of every `reduction` ones which reached the rung goes on.
+    """
+
+    def __init__(self, min_epochs=4, reduction=3):
+        """
+        :param min_epochs: The number of epochs of the first rung
+        :param reduction: The factor by which the number of trials is divided at each rung
+        """
+        self.min_epochs = min_epochs
+        self.reduction = reduction
+
+    def is_rung(self, epoch):
+        rung = self.min_epochs
+        while rung < epoch:
+            rung *= self.reduction
+        return rung == epoch
+
+    def should_prune(self, trial, curves):
+        """Decide whether to stop a trial after its last epoch (see `MedianPruner.should_prune`)."""
+        curve = curves[trial]
+        epoch = len(curve)
+        if not self.is_rung(epoch):
+            return False
+
+        # The trials which reach a rung first are promoted until there are enough of them to compare
+        losses = sorted(min(losses[:epoch]) for losses in curves.values() if len(losses) >= epoch)
+        if len(losses) < self.reduction:
+            return False
+
+        return min(curve) > losses[len(losses) // self.reduction - 1]
+
+
+PRUNERS = {
+    "median": MedianPruner,
+    "halving": HalvingPruner
+}
+
+
+def make_pruner(spec):
+    """Create a pruner from its description in a sweep, e.g. {"type": "halving", "min_epochs": 4}."""
+    parameters = {name: value for name, value in spec.items() if name != "type"}
+    return PRUNERS[spec['type']](**parameters)
+
+
+class PruningCallback(Callback):
+    """
+    Record the validation loss of a trial in the shared store after each epoch, and stop the training when the
+    pruner decides the trial is not promising.
+    """
+
+    def __init__(self, pruner, trial, store):
+        super(PruningCallback, self).__init__()
+        self.pruner = pruner
+        self.trial = trial
+        self.store = store
+        # The epoch after which the trial was stopped, if it was
+        self.pruned = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        # The store holds copies, the curve is replaced as a whole
+        self.store[self.trial] = list(self.store.get(self.trial, [])) + [float(logs['val_loss'])]
+
+        if self.pruner.should_prune(self.trial, dict(self.store)):
+            self.pruned = epoch + 1
+            self.model.stop_training = True
@@ -0,0 +1,113 @@
+import json
+import numpy as np
+import tensorflow as tf
+from sklearn.metrics import classification_report
+
+from learn.export import export_tflite
+from serve.engine import measure_latency
+from serve.lite import LiteModel
+
+"""
+Provide post-training quantization of the trained CNNs to TFLite, and a report comparing the accuracy of the
+quantized models to their latency and size.
+"""
+
+
+def dynamic_range(converter):
+    """Configure a converter to store the weights as 8-bit integers, the activations staying floats."""
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+
+def full_integer(representative_windows):
+    """Get a converter configuration running the whole model with 8-bit integers, inputs and outputs included.
+    :param representative_windows: Formatted windows (without the channel dimension) from which the ranges of the
+                                   activations are calibrated, e.g. drawn with `representative_windows`
+    :return: A function configuring a converter
+    """
+    def representative_dataset():
+        for window in representative_windows:
+            yield [np.asarray(window, dtype=np.float32)[np.newaxis, ..., np.newaxis]]
+
+    def configure(converter):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    return configure
+
+
+def representative_windows(X, indices, count=200, seed=42):
+    """Draw the windows used to calibrate a full-integer model.
+    :param X: The formatted dataset, as returned by `read_dataset`
+    :param indices: The indices of the windows to draw from (the training windows)
+    :param count: The number of windows to draw
+    :param seed: The seed of the draw
+    :return: An array of windows
+    """
+    rng = np.random.default_rng(seed)
+    selection = np.sort(rng.choice(indices, min(count, len(indices)), replace=False))
+    return np.asarray(X[selection], dtype=np.float32)
+
+
+def quantize_model(model, X, y, train, test, output_dir, batch_size=500):
+    """Export a trained model in float32, dynamic-range and full-integer versions and compare them.
+    :param model: The trained model (an `RFMLCNN`)
+    :param X: The formatted dataset
+    :param y: The labels of the dataset
+    :param train: The indices of the training windows, used to calibrate the full-integer model
+    :param test: The indices of the test windows, on which the models are compared
+    :param output_dir: The folder where the models (model.tflite, model-dynamic.tflite, model-int8.tflite) and the
+                       report (quantization.json and quantization.txt) are written
+    :param batch_size: The number of windows per batch, for the accuracy and the throughput
+    :return: The report as a dictionary indexed by version
+    """
+    versions = {"float32": ("model.tflite", None),
+                "dynamic": ("model-dynamic.tflite", dynamic_range),
+                "int8": ("model-int8.tflite", full_integer(representative_windows(X, train)))}
+    labels = np.asarray(y[test])
+    report = {}
+
+    for version, (file_name, options) in versions.items():
+        path = output_dir / file_name
+        size = export_tflite(model, path, options)
+        lite_model = LiteModel(path)
+
+        batches = np.array_split(test, max(len(test) // batch_size, 1))
+        y_pred = np.concatenate([np.argmax(lite_model(np.asarray(X[batch], dtype=np.float32)[..., np.newaxis]), axis=1)
+                                 for batch in batches])
+
+        report[version] = {"size": size,
+                           "latency": measure_latency(lite_model, X.shape[1:], 1),
+                           "batch latency": measure_latency(lite_model, X.shape[1:], batch_size, repetitions=10),
+                           "classification": classification_report(labels, y_pred, output_dict=True, zero_division=0)}
+        print(f"{version}: {size / 1024:.0f} KiB, {report[version]['latency']:.3f} ms per window, "
+              f"accuracy {report[version]['classification']['accuracy']:.4f}")
+
+    write_quantization_report(report, output_dir)
+    return report
+
+
+def write_quantization_report(report, output_dir):
+    """Write the comparison of the model versions, as json and as a readable table of per-class accuracy.
+    :param report: The report returned by `quantize_model`
+    :param output_dir: The folder where the files are to be written
+    """
+    with open(output_dir / "quantization.json", "w") as file:
+        json.dump(report, file, indent=2)
+
+    versions = list(report)
+    classes = [name for name in report[versions[0]]["classification"] if name not in ("accuracy", "macro avg",
+                                                                                       "weighted avg")]
+    lines = [f"{'':>16}" + "".join(f"{version:>12}" for version in versions),
+             f"{'size (KiB)':>16}" + "".join(f"{report[v]['size'] / 1024:>12.0f}" for v in versions),
+             f"{'latency (ms)':>16}" + "".join(f"{report[v]['latency']:>12.3f}" for v in versions),
+             f"{'batch (ms)':>16}" + "".join(f"{report[v]['batch latency']:>12.3f}" for v in versions),
+             f"{'accuracy':>16}" + "".join(f"{report[v]['classification']['accuracy']:>12.4f}" for v in versions),
+             "", "Recall per class:"]
+    lines += [f"{name:>16}" + "".join(f"{report[v]['classification'][name]['recall']:>12.4f}" for v in versions)
+              for name in classes]
+
+    with open(output_dir / "quantization.txt", "w") as file:
+        file.write("\n".join(lines) + "\n")
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+import matplotlib
+
+from dataset.normalize import channels
+
+"""
+Provide the plots of signal windows, and a way to render many of them in parallel worker processes. This module does
+not depend on TensorFlow, so that the workers start quickly.
+"""
+
+
+def use_agg():
+    """Select the non-interactive backend, which is all that is needed to write images (and is thread-safe)."""
+    matplotlib.use("Agg")
+
+
+def plot_signal_window(window, index, label, output_dir):
+    """Plot a signal window
+    :param window: The window to plot
+    :param index: The window index over the whole dataset
+    :param label: The label to which the window actually belongs
+    :param output_dir: The folder where our different files are to be written
+    """
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(30, 10))
+
+    ax.plot(window[0], 'b-')
+    ax.plot(window[1], 'r-')
+    ax.grid(True)
+    ax.set_title(f"Window index: {index}, Label: {label}")
+    ax.set_xlabel("Samples")
+    ax.set_ylabel("Amplitude")
+    ax.legend(["In phase", "In quadrature"], loc="upper left")
+
+    fig.savefig(output_dir / f"t{label}-{index}.png", bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_windows_tile(windows, indices, labels, predictions, path, columns=4):
+    """Plot several windows in a grid of small plots, in a single image.
+    :param windows: The formatted windows to plot (in the 2d or 3d layout)
+    :param indices: The index of each window over the whole dataset
+    :param labels: The label to which each window actually belongs
+    :param predictions: The label predicted for each window
+    :param path: The path of the image to write
+    :param columns: The number of plots per row
+    """
+    import matplotlib.pyplot as plt
+
+    rows = -(-len(windows) // columns)
+    fig, axes = plt.subplots(rows, columns, figsize=(4 * columns, 2 * rows), squeeze=False)
+    in_phase, quadrature = channels(np.asarray(windows))
+
+    for ax, i, q, index, label, prediction in zip(axes.flat, in_phase, quadrature, indices, labels, predictions):
+        ax.plot(i, 'b-', linewidth=0.5)
+        ax.plot(q, 'r-', linewidth=0.5)
+        ax.set_title(f"{index}: {label} predicted {prediction}", fontsize=8)
+        ax.set_xticks([])
+        ax.set_yticks([])
+    for ax in axes.flat[len(windows):]:
+        ax.axis("off")
+
+    fig.savefig(path, dpi=80, bbox_inches="tight")
+    plt.close(fig)
+
+
+def render(tasks, workers=None):
+    """Draw plots, in parallel if several workers are used.
+    :param tasks: A list of couples (plotting function, arguments)
+    :param workers: The number of worker processes (defaults to the number of CPUs), 1 to draw in this process
+    """
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(tasks) <= 1:
+        for function, arguments in tasks:
+            function(*arguments)
+        return
+
+    # The workers are started afresh, so that they do not inherit the state of TensorFlow
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=use_agg) as pool:
+        for future in [pool.submit(function, *arguments) for function, arguments in tasks]:
+            future.result()
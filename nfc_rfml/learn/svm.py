@@ -0,0 +1,189 @@
+from time import perf_counter
+import numpy as np
+from sklearn.svm import SVC, LinearSVC
+from sklearn.linear_model import SGDClassifier
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split
+
+from dataset.format import class_weights
+
+"""
+Provide support vector machines which scale to large datasets: a linear SVM, a linear SVM trained by stochastic
+gradient descent on mini-batches read from the (possibly memory-mapped) dataset, and approximations of the RBF kernel
+(Nyström and random Fourier features) followed by such a linear SVM. The exact RBF `SVC` remains the default.
+"""
+
+ENGINES = ["svc", "linear", "sgd", "nystroem", "rff"]
+# Engines trained batch by batch, which never hold more than a batch of the dataset in memory
+STREAMING_ENGINES = ["sgd", "nystroem", "rff"]
+# Number of windows from which the kernel approximations and the kernel width are fitted
+KERNEL_SAMPLES = 10000
+
+
+def train_test_indices(nb_windows, test_ratio=0.3, seed=42):
+    """Split the indices of a dataset in training and test indices, as the SVMs always have been.
+    :return: Two sorted arrays of indices, so that memory-mapped windows are read in order
+    """
+    train, test = train_test_split(np.arange(nb_windows), test_size=test_ratio, random_state=seed)
+    return np.sort(train), np.sort(test)
+
+
+def training_weights(y, indices):
+    """Compute the class weights compensating for unbalanced training windows (e.g. with the "weights" balance).
+    :param y: The labels of the dataset
+    :param indices: The indices of the training windows
+    :return: A dictionary of weights indexed by label (see `dataset.format.class_weights`), or None if the classes
+             are already balanced
+    """
+    weights = class_weights(y[indices])
+    return None if len(set(weights.values())) == 1 else weights
+
+
+def flat_rows(X, indices):
+    """Read windows of the dataset as flat feature vectors."""
+    return np.asarray(X[indices], dtype=np.float32).reshape(len(indices), -1)
+
+
+def scale_gamma(X):
+    """Compute the width of the RBF kernel as `SVC(gamma="scale")` does."""
+    return 1.0 / (X.shape[1] * X.var())
+
+
+class StreamingSVM:
+    """
+    Linear SVM (hinge loss) trained by stochastic gradient descent on mini-batches of windows, optionally on the
+    features of an approximation of the RBF kernel.
+    """
+
+    def __init__(self, kernel=None, components=1000, gamma="scale", alpha=1e-4, epochs=5, batch_size=1000, seed=42,
+                 class_weight=None):
+        """
+        :param kernel: None for a linear SVM, "nystroem" or "rff" for an approximation of the RBF kernel
+        :param components: The number of features of the kernel approximation
+        :param gamma: The width of the RBF kernel, or "scale" to compute it from the data
+        :param alpha: The regularization strength
+        :param epochs: The number of passes over the training windows
+        :param batch_size: The number of windows per batch
+        :param seed: The seed of the kernel approximation and of the order of the batches
+        :param class_weight: The weight of each class (see `training_weights`), or None to weigh them equally
+        """
+        self.kernel = kernel
+        self.components = components
+        self.gamma = gamma
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.seed = seed
+        self.kernel_map = None
+        self.classifier = SGDClassifier(loss="hinge", alpha=alpha, random_state=seed, class_weight=class_weight)
+
+    def transform(self, rows):
+        return rows if self.kernel_map is None else self.kernel_map.transform(rows)
+
+    def fit(self, X, y, indices):
+        """Train the SVM on some windows of a dataset, reading them batch by batch.
+        :param X: The formatted dataset (e.g. memory-mapped from the cache)
+        :param y: The labels of the dataset
+        :param indices: The sorted indices of the training windows
+        :return: The SVM itself
+        """
+        rng = np.random.default_rng(self.seed)
+
+        if self.kernel is not None:
+            sample = flat_rows(X, np.sort(rng.choice(indices, min(KERNEL_SAMPLES, len(indices)), replace=False)))
+            gamma = scale_gamma(sample) if self.gamma == "scale" else self.gamma
+            kernel_map = Nystroem if self.kernel == "nystroem" else RBFSampler
+            self.kernel_map = kernel_map(gamma=gamma, n_components=min(self.components, len(sample)),
+                                         random_state=self.seed).fit(sample)
+
+        classes = np.unique(y[indices])
+        for _ in range(self.epochs):
+            # The dataset is stored class by class, the windows are shuffled so that each batch mixes the classes
+            shuffled = rng.permutation(indices)
+            for start in range(0, len(shuffled), self.batch_size):
+                # Sorted within the batch, so that memory-mapped windows are still read in order
+                batch = np.sort(shuffled[start:start + self.batch_size])
+                self.classifier.partial_fit(self.transform(flat_rows(X, batch)), y[batch], classes)
+
+        return self
+
+    def predict(self, X, indices):
+        """Predict the labels of some windows of a dataset, batch by batch."""
+        batches = [indices[start:start + self.batch_size] for start in range(0, len(indices), self.batch_size)]
+        return np.concatenate([self.classifier.predict(self.transform(flat_rows(X, batch))) for batch in batches])
+
+
+class InMemorySVM:
+    """Exact RBF (`SVC`) or linear (`LinearSVC`) SVM, trained on all the training windows at once."""
+
+    def __init__(self, classifier):
+        self.classifier = classifier
+
+    def fit(self, X, y, indices):
+        self.classifier.fit(flat_rows(X, indices), y[indices])
+        return self
+
+    def predict(self, X, indices):
+        return self.classifier.predict(flat_rows(X, indices))
+
+
+def make_svm(model_conf, class_weight=None):
+    """Create the SVM described by the model configuration.
+    :param model_conf: The experiment parameters for the model: the "engine" (one of `ENGINES`, "svc" by default),
+                       and optionally "C", "gamma", "components", "alpha", "svmepochs" and "svmbatchsize" (the
+                       "epochs" and "batchsize" of the CNNs do not apply to the SVMs)
+    :param class_weight: The weight of each class (see `training_weights`), or None to weigh them equally
+    :return: An SVM with `fit(X, y, indices)` and `predict(X, indices)` methods
+    """
+    engine = model_conf.get('engine', "svc")
+    seed = model_conf.get('seed', 42)
+
+    if engine == "svc":
+        return InMemorySVM(SVC(C=model_conf.get('C', 1.0), gamma=model_conf.get('gamma', "scale"),
+                               class_weight=class_weight))
+    if engine == "linear":
+        return InMemorySVM(LinearSVC(C=model_conf.get('C', 1.0), dual=False, random_state=seed,
+                                     class_weight=class_weight))
+    if engine in STREAMING_ENGINES:
+        return StreamingSVM(kernel=None if engine == "sgd" else engine,
+                            components=model_conf.get('components', 1000),
+                            gamma=model_conf.get('gamma', "scale"),
+                            alpha=model_conf.get('alpha', 1e-4),
+                            epochs=model_conf.get('svmepochs', 5),
+                            batch_size=model_conf.get('svmbatchsize', 1000),
+                            seed=seed,
+                            class_weight=class_weight)
+
+    raise ValueError(f"Unknown SVM engine: {engine}")
+
+
+def compare_svms(X, y, train, test, model_conf, engines=ENGINES):
+    """Train the SVM engines on the same split and compare their training time, prediction time and accuracy.
+    :param X: The formatted dataset
+    :param y: The labels of the dataset
+    :param train: The indices of the training windows
+    :param test: The indices of the test windows
+    :param model_conf: The experiment parameters shared by the engines (see `make_svm`)
+    :param engines: The engines to compare
+    :return: A dictionary of results (fit and predict time in seconds, accuracy, macro F1) indexed by engine
+    """
+    results = {}
+    # Compensate for unbalanced classes, as the CNNs do
+    weights = training_weights(y, train)
+
+    for engine in engines:
+        model = make_svm(dict(model_conf, engine=engine), weights)
+
+        start = perf_counter()
+        model.fit(X, y, train)
+        fitted = perf_counter()
+        y_pred = model.predict(X, test)
+        predicted = perf_counter()
+
+        report = classification_report(y[test], y_pred, output_dict=True, zero_division=0)
+        results[engine] = {"fit": fitted - start, "predict": predicted - fitted,
+                           "accuracy": report['accuracy'], "f1": report['macro avg']['f1-score']}
+        print(f"{engine:>10}: fit {results[engine]['fit']:.2f} s, predict {results[engine]['predict']:.2f} s, "
+              f"accuracy {results[engine]['accuracy']:.4f}")
+
+    return results
@@ -0,0 +1,231 @@
+import os
+import csv
+import copy
+import json
+import random
+import itertools
+from time import perf_counter
+from pathlib import Path
+from contextlib import ExitStack
+from multiprocessing import get_context, Manager
+from concurrent.futures import ProcessPoolExecutor
+
+from dataset.configuration import resolve_conf, resolve_paths
+from dataset.format import read_dataset
+
+"""
+Provide a runner for hyperparameter sweeps: the variants of a base experiment are trained in parallel worker
+processes, and their results collected in a single table.
+"""
+
+# Environment variables limiting the number of threads of the numerical libraries
+THREAD_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "TF_NUM_INTRAOP_THREADS",
+                    "TF_NUM_INTEROP_THREADS"]
+RESULTS = "results.csv"
+# Columns of the results table, followed by the swept parameters
+COLUMNS = ["trial", "status", "accuracy", "f1", "val_loss", "epochs", "pruned", "duration", "model"]
+# Windows layouts which the CNNs accept (their convolutions expect one row per part of the signal)
+CNN_WINDOWS = ["3d"]
+
+
+def expand_grid(parameters):
+    """List every combination of the swept parameters.
+    :param parameters: A dictionary of lists of values, indexed by parameter (e.g. "data.windowsize")
+    :return: A list of assignments, dictionaries giving one value to each parameter
+    """
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in itertools.product(*parameters.values())]
+
+
+def sample_random(parameters, trials, seed=42):
+    """Draw distinct combinations of the swept parameters at random.
+    :param parameters: A dictionary of lists of values, indexed by parameter
+    :param trials: The number of combinations to draw (at most all of them)
+    :param seed: The seed of the draw
+    :return: A list of assignments
+    """
+    grid = expand_grid(parameters)
+    return random.Random(seed).sample(grid, min(trials, len(grid)))
+
+
+def apply_parameters(conf, assignment):
+    """Build the configuration of a trial.
+    :param conf: The base configuration, as read from its json file
+    :param assignment: The values of the swept parameters, indexed by "section.name"
+    :return: A modified copy of the configuration
+    """
+    conf = copy.deepcopy(conf)
+    for name, value in assignment.items():
+        section, key = name.split(".", 1)
+        conf[section][key] = value
+    return conf
+
+
+def check_trial(conf):
+    """Check that the windows layout of a trial suits its model, before any trial is started.
+    :param conf: The configuration of the trial, as read from a json file
+    :raise ValueError: If a CNN is given windows it cannot take
+    """
+    if conf['model']['type'] != "svm" and conf['data']['windows'] not in CNN_WINDOWS:
+        raise ValueError(f"The {conf['model']['type']} model needs the {' or '.join(CNN_WINDOWS)} windows layout, "
+                         f"not {conf['data']['windows']}")
+
+
+def read_sweep(spec_path):
+    """Read the description of a sweep and build the configuration of each trial.
+    The description is a json file with the path of the base experiment ("base"), the search method ("grid" or
+    "random", with a number of "trials" and a "seed"), the swept "parameters" (lists of values indexed by
+    "section.name", e.g. "model.batchsize") and optionally a "pruner" (see `learn.prune.make_pruner`).
+    :param spec_path: The path to the json file
+    :return: A couple (list of couples (assignment, configuration), pruner description or None)
+    :raise ValueError: If a trial gives a CNN a windows layout it cannot take
+    """
+    with open(spec_path, "r") as file:
+        spec = json.load(file)
+    # The base experiment is found next to the description, and its paths next to it, wherever the sweep is started
+    base_path = Path(spec_path).parent / spec['base']
+    with open(base_path, "r") as file:
+        base = resolve_paths(json.load(file), base_path.parent)
+
+    if spec.get('method', "grid") == "random":
+        assignments = sample_random(spec['parameters'], spec['trials'], spec.get('seed', 42))
+    else:
+        assignments = expand_grid(spec['parameters'])
+
+    trials = [(assignment, apply_parameters(base, assignment)) for assignment in assignments]
+    for _, conf in trials:
+        check_trial(conf)
+    return trials, spec.get('pruner')
+
+
+def limit_threads(threads):
+    """Limit the threads used by a worker process, so that the parallel trials do not oversubscribe the CPUs.
+    :param threads: The number of threads of each trial
+    """
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+
+
+def limit_tensorflow_threads():
+    """Apply the thread limit of the worker to TensorFlow, which is only imported by the trials training a CNN."""
+    import tensorflow as tf
+
+    threads = int(os.environ.get("TF_NUM_INTRAOP_THREADS", 0))
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+
+def prepare_data(data_conf):
+    """Preprocess the dataset of a data configuration once, storing it in the cache for the trials using it."""
+    read_dataset(resolve_conf({"data": copy.deepcopy(data_conf), "model": {}}, model=False)['data'])
+
+
+def run_trial(number, conf, output_dir, pruner=None, store=None):
+    """Train and evaluate the model of one trial (in a worker process).
+    :param number: The number of the trial
+    :param conf: The configuration of the trial, as read from a json file
+    :param output_dir: The folder of the sweep, in which the folder of the trial is created
+    :param pruner: The description of the pruner, if unpromising trials are to be stopped early
+    :param store: The validation curves of the trials, shared between the workers
+    :return: A row of the results table
+    """
+    check_trial(conf)
+    trial_dir = Path(output_dir) / f"trial-{number:03d}"
+    os.makedirs(trial_dir, exist_ok=True)
+    with open(trial_dir / "experiment.json", "w") as file:
+        json.dump(conf, file, indent=2)
+
+    start = perf_counter()
+    resolved = resolve_conf(copy.deepcopy(conf))
+    X, y, stats = read_dataset(resolved['data'])
+
+    from learn.build import build_cnn, build_svm
+
+    oversample = resolved['data'].get('balance') == "oversample"
+    if resolved['model']['type'] == "svm":
+        model_dir = trial_dir
+        metrics = build_svm(X, y, resolved['model'], oversample)
+    else:
+        limit_tensorflow_threads()
+        callbacks = []
+        if pruner is not None:
+            from learn.prune import make_pruner, PruningCallback
+            callbacks.append(PruningCallback(make_pruner(pruner), number, store))
+
+        model_dir = build_cnn(X, y, resolved['model'], trial_dir, callbacks, oversample)
+        with open(model_dir / "experiment.json", "w") as file:
+            json.dump(conf, file, indent=2)
+        if stats is not None:
+            stats.save(model_dir / "normalization.json")
+        with open(model_dir / "metrics.json", "r") as file:
+            metrics = json.load(file)
+
+        # The pruned trials are still evaluated, with their best weights so far
+        if callbacks and callbacks[0].pruned is not None:
+            metrics['pruned'] = callbacks[0].pruned
+            with open(model_dir / "metrics.json", "w") as file:
+                json.dump(metrics, file, indent=2)
+
+    status = "pruned" if 'pruned' in metrics else "complete"
+    return dict(metrics, trial=number, status=status, duration=perf_counter() - start, model=str(model_dir))
+
+
+def run_sweep(trials, output_dir, workers=1, threads=None, pruner=None):
+    """Run the trials of a sweep in parallel and collect their results in results.csv.
+    The datasets are preprocessed once per distinct data configuration, then shared through the cache.
+    :param trials: The list of couples (assignment, configuration) returned by `read_sweep`
+    :param output_dir: The folder of the sweep
+    :param workers: The number of trials run at the same time
+    :param threads: The number of threads of each trial (defaults to an equal share of the CPUs)
+    :param pruner: The description of the pruner stopping the unpromising trials, or None
+    :return: The rows of the results table, best accuracy first
+    """
+    output_dir = Path(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    threads = threads or max(os.cpu_count() // workers, 1)
+
+    # Without a cache, the trials would each preprocess their dataset again
+    for _, conf in trials:
+        conf['data'].setdefault('cache', str(output_dir / "cache"))
+    data_confs = {json.dumps(conf['data'], sort_keys=True): conf['data'] for _, conf in trials}
+
+    with ExitStack() as stack:
+        # The validation curves are shared between the workers through a manager process
+        store = stack.enter_context(Manager()).dict() if pruner is not None else None
+        # TensorFlow is not fork-safe, the workers are started afresh
+        pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                                       initializer=limit_threads, initargs=(threads,)))
+
+        print(f"Preprocess {len(data_confs)} datasets___________")
+        for future in [pool.submit(prepare_data, data_conf) for data_conf in data_confs.values()]:
+            future.result()
+
+        print(f"Run {len(trials)} trials____________________")
+        futures = [pool.submit(run_trial, number, conf, output_dir, pruner, store)
+                   for number, (_, conf) in enumerate(trials)]
+
+        rows = []
+        for number, ((assignment, _), future) in enumerate(zip(trials, futures)):
+            try:
+                row = future.result()
+            except Exception as error:
+                row = {"trial": number, "status": f"failed: {error!r}"}
+            rows.append(dict(assignment, **row))
+            print(rows[-1])
+
+    rows.sort(key=lambda row: row.get('accuracy', -1), reverse=True)
+    write_results(rows, output_dir / RESULTS)
+    return rows
+
+
+def write_results(rows, path):
+    """Write the results table of a sweep in a csv file.
+    :param rows: The rows of the table, as dictionaries
+    :param path: The path of the file
+    """
+    columns = COLUMNS + [name for name in dict.fromkeys(key for row in rows for key in row) if name not in COLUMNS]
+
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,128 @@
+import queue
+import threading
+from time import perf_counter
+from collections import namedtuple
+from concurrent.futures import Future
+import numpy as np
+
+"""
+Provide a scheduler which gathers the windows submitted by many concurrent callers (e.g. one inference engine per
+reader) into batches, so that the model runs one forward pass per batch instead of one per caller.
+"""
+
+Request = namedtuple("Request", ["windows", "future", "submitted"])
+
+
+def compiled_forward(model):
+    """Get the forward pass of a model as a function on NumPy arrays, traced once for any batch size when possible.
+    :param model: The trained model (an `RFMLCNN`, or any callable Keras model)
+    :return: A function taking a batch of windows (with the channel dimension) and returning the probabilities
+    """
+    if hasattr(model, "inference_function"):
+        forward = model.inference_function
+        return lambda X: forward(X).numpy()
+
+    return lambda X: np.asarray(model(X, training=False))
+
+
+class BatchScheduler:
+    """
+    Collect the windows submitted by concurrent callers and run them through the model in batches of up to
+    `max_batch_size` windows, waiting at most `max_wait` seconds after the first window of a batch for others to come.
+    A larger batch size improves the throughput, a shorter wait reduces the latency.
+    """
+
+    def __init__(self, forward, max_batch_size=64, max_wait=0.002):
+        self.forward = forward
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.served = 0
+        self.windows = 0
+        self.waiting_time = 0.0
+        self.busy_time = 0.0
+
+        self.worker = threading.Thread(target=self._serve, daemon=True)
+        self.worker.start()
+
+    def submit(self, windows):
+        """Submit windows to be classified with the next batch.
+        :param windows: The formatted windows, with the channel dimension
+        :return: A future of the probabilities of each window
+        """
+        future = Future()
+        self.requests.put(Request(windows, future, perf_counter()))
+        return future
+
+    def predict(self, windows):
+        """Classify windows with the next batch, waiting for the result.
+        :param windows: The formatted windows, with the channel dimension
+        :return: The probabilities of each window
+        """
+        return self.submit(windows).result()
+
+    def close(self):
+        """Stop the scheduler once the submitted windows have been classified."""
+        self.requests.put(None)
+        self.worker.join()
+
+    def _collect(self, first):
+        """Gather requests until the batch is full or the first request has waited long enough."""
+        batch = [first]
+        size = len(first.windows)
+        deadline = first.submitted + self.max_wait
+
+        while size < self.max_batch_size:
+            try:
+                request = self.requests.get(timeout=max(deadline - perf_counter(), 0))
+            except queue.Empty:
+                break
+            if request is None:
+                # Put the stop signal back for the main loop
+                self.requests.put(None)
+                break
+
+            batch.append(request)
+            size += len(request.windows)
+
+        return batch
+
+    def _serve(self):
+        while True:
+            first = self.requests.get()
+            if first is None:
+                return
+
+            batch = self._collect(first)
+            start = perf_counter()
+            try:
+                probabilities = self.forward(np.concatenate([request.windows for request in batch]))
+            except Exception as error:
+                for request in batch:
+                    request.future.set_exception(error)
+                continue
+
+            # Hand each caller the probabilities of its own windows
+            end = perf_counter()
+            sizes = np.cumsum([len(request.windows) for request in batch])[:-1]
+            for request, result in zip(batch, np.split(probabilities, sizes)):
+                request.future.set_result(result)
+
+            self.batches += 1
+            self.served += len(batch)
+            self.windows += len(probabilities)
+            self.busy_time += end - start
+            self.waiting_time += sum(start - request.submitted for request in batch)
+
+    def report(self):
+        """Summarize the activity of the scheduler.
+        :return: A dictionary with the number of batches and windows, the mean batch size, the throughput of the
+                 model (windows per second of forward pass) and the mean time a request waited for its batch (in ms)
+        """
+        return {"batches": self.batches,
+                "windows": self.windows,
+                "batch size": self.windows / max(self.batches, 1),
+                "throughput": self.windows / self.busy_time if self.busy_time else 0.0,
+                "waiting": self.waiting_time / max(self.served, 1) * 1000}
@@ -0,0 +1,200 @@
+from time import perf_counter
+from pathlib import Path
+from collections import deque, namedtuple
+import numpy as np
+
+from dataset.format import PeakWindowScanner, FixedWindowScanner
+from dataset.configuration import load_conf
+from dataset.normalize import WindowStats
+from serve.batching import compiled_forward
+
+"""
+Provide a long-running inference engine which identifies tags in a stream of I/Q samples with a trained model.
+"""
+
+# A tag identification: the start of the window in the stream, the predicted label and its tag number, the
+# probability of the prediction and the time between the reception of the window's last samples and the prediction
+Prediction = namedtuple("Prediction", ["start", "label", "tag", "confidence", "latency"])
+
+
+def window_shape(format_windows, window_size):
+    """Compute the shape of a formatted window (without the channel dimension).
+    :param format_windows: The function with which the signal is formatted into windows
+    :param window_size: The size of the signal windows
+    :return: The shape of one formatted window
+    """
+    return format_windows(np.zeros((1, window_size), dtype=np.complex64)).shape[1:]
+
+
+def measure_latency(forward, window_shape, batch_size, repetitions=100):
+    """Measure the time a model takes to classify a batch of windows.
+    :param forward: The forward pass of the model, taking batches of windows with the channel dimension
+    :param window_shape: The shape of one window, without the channel dimension
+    :param batch_size: The number of windows per batch
+    :param repetitions: The number of timed batches
+    :return: The median time per batch, in milliseconds
+    """
+    X = np.zeros((batch_size,) + tuple(window_shape) + (1,), dtype=np.float32)
+    # The first call traces the model or allocates its tensors
+    forward(X)
+
+    times = []
+    for _ in range(repetitions):
+        start = perf_counter()
+        forward(X)
+        times.append(perf_counter() - start)
+
+    return float(np.median(times)) * 1000
+
+
+class InferenceEngine:
+    """
+    Cut a stream of samples in windows exactly as the training data was (peak detection or fixed windows, formatting
+    and normalization), and classify the windows in micro-batches as soon as they are complete.
+    The model is only loaded once, so that each window costs a single (batched) forward pass. Engines reading from
+    several readers can share a `BatchScheduler`, which then batches their windows together.
+    """
+
+    def __init__(self, model, conf, stats=None, batch_size=32, height=0.1, threshold=0.005, history=10000,
+                 scheduler=None):
+        self.model = model
+        self.forward = compiled_forward(model)
+        self.conf = conf
+        self.scheduler = scheduler
+        self.tags = conf['data']['tags']
+        self.format_windows = conf['data']['windows']
+        self.stats = stats
+        self.batch_size = batch_size
+        # The models trained on unfiltered windows get every window of the stream, as in training
+        if conf['data'].get('filter', True):
+            self.scanner = PeakWindowScanner(conf['data']['windowsize'], height, threshold)
+        else:
+            self.scanner = FixedWindowScanner(conf['data']['windowsize'], conf['data'].get('hop'))
+        # The latencies of the last predictions, for reporting
+        self.latencies = deque(maxlen=history)
+
+    @classmethod
+    def from_saved_model(cls, model_dir, **kwargs):
+        """Load a trained model, its configuration and its normalization statistics from its folder.
+        :param model_dir: The folder in which the model was saved
+        :param kwargs: The other parameters of the engine
+        :return: An engine ready to classify samples
+        """
+        model_dir = Path(model_dir)
+        conf = load_conf(model_dir / "experiment.json")
+        stats_path = model_dir / "normalization.json"
+        stats = WindowStats.load(stats_path) if stats_path.exists() else None
+
+        shape = window_shape(conf['data']['windows'], conf['data']['windowsize'])
+        # TensorFlow is only imported when a Keras model is needed
+        from learn.build import reload_model
+        model = reload_model(model_dir / "model.tf", conf, shape)
+        # Pay the tracing cost before the first window comes
+        model.warmup()
+
+        return cls(model, conf, stats, **kwargs)
+
+    @classmethod
+    def from_exported_model(cls, model_dir, num_threads=None, **kwargs):
+        """Load a model exported to TFLite (see `learn.export`), its configuration and its normalization statistics
+        from its folder, without importing TensorFlow when the standalone interpreter is installed.
+        :param model_dir: The folder in which the model was saved
+        :param num_threads: The number of threads used by the interpreter
+        :param kwargs: The other parameters of the engine
+        :return: An engine ready to classify samples
+        """
+        from serve.lite import LiteModel
+
+        model_dir = Path(model_dir)
+        conf = load_conf(model_dir / "experiment.json", model=False)
+        stats_path = model_dir / "normalization.json"
+        stats = WindowStats.load(stats_path) if stats_path.exists() else None
+
+        model = LiteModel(model_dir / "model.tflite", num_threads)
+        model.warmup()
+
+        return cls(model, conf, stats, **kwargs)
+
+    @classmethod
+    def from_feature_model(cls, model_dir, **kwargs):
+        """Load a classical model trained on selected tsfresh features (see `serve.feature_model`) from its folder.
+        The windows are described by the selected features only, computed by a minimal extractor.
+        :param model_dir: The folder in which the model was saved
+        :param kwargs: The other parameters of the engine
+        :return: An engine ready to classify samples
+        """
+        from dataset.tsfeatures import SelectedFeatures
+        from serve.feature_model import FeatureModel, read_description
+
+        description = read_description(model_dir)
+        conf = {"data": {"tags": description['tags'],
+                         "windowsize": description['windowsize'],
+                         "windows": SelectedFeatures(description['features'],
+                                                     imputation=description.get('imputation'))}}
+
+        return cls(FeatureModel.load(model_dir), conf, **kwargs)
+
+    def feed(self, samples):
+        """Add samples to the stream and classify the windows they complete.
+        :param samples: The next samples of the stream as a 1D array of complex numbers
+        :return: The list of predictions for the completed windows
+        """
+        received = perf_counter()
+        windows = self.scanner.push(samples)
+        return self._classify(windows, self.scanner.starts, received)
+
+    def flush(self):
+        """Classify the last windows, once the end of the stream has been reached.
+        :return: The list of predictions for the last windows
+        """
+        received = perf_counter()
+        windows = self.scanner.flush()
+        return self._classify(windows, self.scanner.starts, received)
+
+    def run(self, source):
+        """Classify every window of a source of samples.
+        :param source: An iterable of arrays of samples (see `serve.sources`)
+        :return: A generator of predictions
+        """
+        for samples in source:
+            yield from self.feed(samples)
+
+        yield from self.flush()
+
+    def _classify(self, windows, starts, received):
+        predictions = []
+
+        for batch in range(0, len(windows), self.batch_size):
+            X = self.format_windows(windows[batch:batch + self.batch_size]).astype(np.float32)
+            if self.stats is not None:
+                self.stats.apply(X)
+
+            if self.scheduler is not None:
+                probabilities = self.scheduler.predict(X[..., np.newaxis])
+            else:
+                # The traced forward pass avoids the per-call overhead of `predict` on small batches
+                probabilities = self.forward(X[..., np.newaxis])
+            labels = np.argmax(probabilities, axis=1)
+            latency = perf_counter() - received
+
+            for start, label, probability in zip(starts[batch:], labels, probabilities):
+                predictions.append(Prediction(int(start), int(label), self.tags[label], float(probability[label]),
+                                              latency))
+                self.latencies.append(latency)
+
+        return predictions
+
+    def latency_report(self):
+        """Summarize the latency of the last predictions.
+        :return: A dictionary with the number of predictions and the mean, median, 99th percentile and maximum latency
+                 in milliseconds
+        """
+        if not self.latencies:
+            return {"predictions": 0}
+
+        latencies = np.array(self.latencies) * 1000
+        return {"predictions": len(latencies),
+                "mean": float(latencies.mean()),
+                "median": float(np.median(latencies)),
+                "p99": float(np.percentile(latencies, 99)),
+                "max": float(latencies.max())}
@@ -0,0 +1,66 @@
+import json
+import pickle
+from pathlib import Path
+import numpy as np
+
+"""
+Provide a classical model trained on a few selected tsfresh features (see `learn.build.build_feature_model`), as a
+drop-in replacement for the neural networks in the inference engine.
+"""
+
+MODEL = "model.pkl"
+DESCRIPTION = "features.json"
+
+
+class FeatureModel:
+    """
+    Classify windows from their selected features with a fitted scikit-learn classifier giving probabilities.
+    The windows are turned into features by the `SelectedFeatures` extractor of the engine, so this model only sees
+    batches of feature vectors.
+    """
+
+    def __init__(self, classifier):
+        self.classifier = classifier
+
+    @classmethod
+    def load(cls, model_dir):
+        """Load the classifier saved in a model folder."""
+        with open(Path(model_dir) / MODEL, "rb") as file:
+            return cls(pickle.load(file))
+
+    def save(self, model_dir):
+        with open(Path(model_dir) / MODEL, "wb") as file:
+            pickle.dump(self.classifier, file)
+
+    def __call__(self, X, training=False):
+        """Compute the probabilities of each class for a batch of windows.
+        :param X: The features of the windows, with the channel dimension
+        :param training: Ignored, the classifier is already fitted
+        :return: The probabilities as a float32 array
+        """
+        X = np.asarray(X, dtype=np.float32).reshape(len(X), -1)
+        return self.classifier.predict_proba(X).astype(np.float32)
+
+    def warmup(self):
+        """Nothing is compiled or allocated before the first prediction."""
+
+
+def read_description(model_dir):
+    """Read the description of a feature model: the selected features, the window size, the tags and the values
+    replacing the undefined features (missing for the models saved before they were kept)."""
+    with open(Path(model_dir) / DESCRIPTION, "r") as file:
+        return json.load(file)
+
+
+def write_description(model_dir, features, window_size, tags, imputation=None):
+    """Write the description of a feature model, which is all the engine needs besides the classifier.
+    :param model_dir: The folder of the model
+    :param features: The names of the selected features
+    :param window_size: The number of samples per window
+    :param tags: The tag numbers, in the order of the labels
+    :param imputation: The values replacing the undefined features, computed on the training windows (see
+                       `dataset.tsfeatures.imputation_values`)
+    """
+    with open(Path(model_dir) / DESCRIPTION, "w") as file:
+        json.dump({"features": features, "windowsize": window_size, "tags": tags, "imputation": imputation}, file,
+                  indent=2)
@@ -0,0 +1,62 @@
+import numpy as np
+
+try:
+    # The standalone interpreter only depends on NumPy, which keeps the startup of edge boxes light
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
+
+"""
+Provide a model running an exported TFLite classifier with the lightweight interpreter, as a drop-in replacement for
+the reloaded Keras models in the inference engine.
+"""
+
+
+class LiteModel:
+    """
+    Classify windows with a model exported by `learn.export.export_tflite`. The interpreter is resized when the
+    batch size changes, and quantized inputs and outputs are converted from and to floats.
+    Calls must not overlap: engines sharing a model should go through a `BatchScheduler`.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        self.interpreter = Interpreter(model_path=str(model_path), num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.shape = tuple(self.input['shape_signature'])
+        self.batch_size = None
+
+    def _resize(self, batch_size):
+        if batch_size != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input['index'], (batch_size,) + self.shape[1:])
+            self.interpreter.allocate_tensors()
+            self.batch_size = batch_size
+
+    def __call__(self, X, training=False):
+        """Compute the probabilities of each class for a batch of windows.
+        :param X: The formatted windows, with the channel dimension
+        :param training: Ignored, the exported model always runs in inference mode
+        :return: The probabilities as a float32 array
+        """
+        self._resize(len(X))
+
+        scale, zero_point = self.input['quantization']
+        if scale:
+            limits = np.iinfo(self.input['dtype'])
+            X = np.clip(np.round(X / scale + zero_point), limits.min, limits.max)
+        self.interpreter.set_tensor(self.input['index'], np.asarray(X, dtype=self.input['dtype']))
+        self.interpreter.invoke()
+
+        probabilities = self.interpreter.get_tensor(self.output['index'])
+        scale, zero_point = self.output['quantization']
+        if scale:
+            return (probabilities.astype(np.float32) - zero_point) * scale
+        return probabilities
+
+    def warmup(self, batch_sizes=(1,)):
+        """Allocate the tensors before the first real prediction.
+        :param batch_sizes: The batch sizes to run, the last one stays allocated
+        """
+        for batch_size in batch_sizes:
+            self(np.zeros((batch_size,) + self.shape[1:], dtype=np.float32))
@@ -0,0 +1,66 @@
+import os
+import time
+import socket
+import numpy as np
+
+"""
+Provide generators of I/Q samples read from live sources: a growing capture file, a FIFO or a socket, all carrying
+the raw complex64 samples written by the SDR flowgraphs.
+"""
+
+SAMPLE_SIZE = np.dtype(np.complex64).itemsize
+
+
+def samples_from_bytes(read, chunk_size):
+    """Turn a function reading raw bytes into a generator of complex samples, keeping incomplete samples for later.
+    :param read: A function taking a number of bytes and returning at most that many bytes, or None if nothing is
+                 available yet and b"" at the end of the stream
+    :param chunk_size: The maximum number of samples to read at once
+    :return: A generator of arrays of complex64 samples
+    """
+    remainder = b""
+
+    while True:
+        data = read(chunk_size * SAMPLE_SIZE - len(remainder))
+        if data is None:
+            continue
+        if not data:
+            return
+
+        data = remainder + data
+        usable = len(data) - len(data) % SAMPLE_SIZE
+        remainder = data[usable:]
+        if usable:
+            yield np.frombuffer(data[:usable], dtype=np.complex64)
+
+
+def file_source(path, chunk_size=4096, follow=False, poll_interval=0.01):
+    """Read samples from a capture file or a FIFO (e.g. the output of a GNU Radio file sink).
+    :param path: The path to the file
+    :param chunk_size: The maximum number of samples to read at once
+    :param follow: Whether to wait for new samples at the end of the file, like `tail -f`, instead of stopping
+    :param poll_interval: The time to wait before checking for new samples, in seconds
+    :return: A generator of arrays of complex64 samples
+    """
+    with open(path, "rb", buffering=0) as file:
+        def read(size):
+            data = file.read(size)
+            if not data and follow:
+                time.sleep(poll_interval)
+                return None
+            return data
+
+        yield from samples_from_bytes(read, chunk_size)
+
+
+def socket_source(address, chunk_size=4096):
+    """Read samples from a stream socket, e.g. a GNU Radio TCP sink or a local stand-in for the SDR.
+    :param address: A (host, port) couple for a TCP socket, or the path to a Unix socket
+    :param chunk_size: The maximum number of samples to read at once
+    :return: A generator of arrays of complex64 samples
+    """
+    family = socket.AF_UNIX if isinstance(address, (str, os.PathLike)) else socket.AF_INET
+
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(address if family == socket.AF_INET else os.fspath(address))
+        yield from samples_from_bytes(connection.recv, chunk_size)
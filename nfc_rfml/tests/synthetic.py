@@ -0,0 +1,36 @@
+import os
+import numpy as np
+
+"""
+Synthetic NFC captures shared by the tests: uniform noise of random phase, written like the tags
+captures of the dataset.
+"""
+
+
+def random_capture(rng, size, amplitude=0.2):
+    """
+    Draw a complex capture whose magnitudes are uniform in [0, amplitude) and phases uniform.
+
+    :param rng: numpy Generator the samples are drawn from
+    :param size: number of samples
+    :param amplitude: upper bound of the magnitudes
+    :return: complex64 array of shape (size,)
+    """
+    return (rng.random(size) * amplitude * np.exp(2j * np.pi * rng.random(size))).astype(np.complex64)
+
+
+def write_captures(path, rng, tags, captures=(1,), size=20000, amplitude=0.2):
+    """
+    Write a random capture per tag and capture number to tag{tag}-{capture}.nfc files.
+
+    :param path: directory the files are written in
+    :param rng: numpy Generator the samples are drawn from, tag after tag
+    :param tags: numbers of the tags
+    :param captures: numbers of the captures of each tag
+    :param size: number of samples of each capture
+    :param amplitude: upper bound of the magnitudes, or a function of the tag number returning it
+    """
+    for tag in tags:
+        for capture in captures:
+            scale = amplitude(tag) if callable(amplitude) else amplitude
+            random_capture(rng, size, scale).tofile(os.path.join(path, f"tag{tag}-{capture}.nfc"))
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from dataset.cache import cache_key, load_cached, store_cached, read_manifest
+from dataset.format import read_dataset, windows_2d, windows_3d
+from synthetic import write_captures
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        self.cache = os.path.join(self.path, "cache")
+
+        write_captures(self.path, np.random.default_rng(0), (1, 2), (1, 2), size=5000)
+
+        self.conf = {"datapath": self.path, "tags": [1, 2], "classes": [0, 1], "windowsize": 32,
+                     "windows": windows_3d, "filter": True, "normalize": True, "cache": self.cache}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_key_depends_on_conf_and_files(self):
+        files = [("tag1-1.nfc", "tag1-2.nfc")]
+        key = cache_key(self.conf, self.path, files)
+        self.assertEqual(key, cache_key(dict(self.conf, mmap=True, cache="elsewhere"), self.path, files))
+        self.assertNotEqual(key, cache_key(dict(self.conf, windowsize=64), self.path, files))
+
+        np.zeros(10, dtype=np.complex64).tofile(os.path.join(self.path, "tag1-1.nfc"))
+        self.assertNotEqual(key, cache_key(self.conf, self.path, files))
+
+    def test_key_ignores_only_execution_options(self):
+        files = [("tag1-1.nfc", "tag1-2.nfc"), ("tag2-1.nfc", "tag2-2.nfc")]
+        key = cache_key(self.conf, self.path, files)
+
+        # How the dataset is read or kept does not change it
+        for options in ({"mmap": True}, {"workers": 4}, {"chunksize": 1000}, {"cachesize": 1}):
+            self.assertEqual(cache_key(dict(self.conf, **options), self.path, files), key, options)
+
+        # Everything else does, so two different data sections never share an entry
+        variants = [{"windowsize": 64}, {"windows": windows_2d}, {"filter": False}, {"normalize": "standard"},
+                    {"tags": [2, 1]}, {"classes": [1, 0]}, {"balance": "oversample"}, {"hop": 16}]
+        keys = [cache_key(dict(self.conf, **variant), self.path, files) for variant in variants]
+        self.assertEqual(len(set(keys + [key])), len(variants) + 1)
+        self.assertNotEqual(cache_key(self.conf, self.path, files[:1]), key)
+
+    def test_concurrent_stores(self):
+        X, y = np.zeros((10, 2, 8), dtype=np.float32), np.zeros(10, dtype=int)
+        keys = [f"entry{i}" for i in range(100)]
+        with ProcessPoolExecutor(max_workers=4, mp_context=get_context("spawn")) as pool:
+            list(pool.map(store_cached, [self.cache] * len(keys), keys, [X] * len(keys), [y] * len(keys),
+                          [None] * len(keys), [1e9] * len(keys)))
+
+        # No process lost the entries of the others
+        self.assertEqual(sorted(read_manifest(self.cache)), sorted(keys))
+
+    def test_eviction_counts_unlisted_entries(self):
+        X, y = np.zeros((100, 2, 32), dtype=np.float32), np.zeros(100, dtype=int)
+        store_cached(self.cache, "a", X, y, None, 1e6)
+        os.remove(os.path.join(self.cache, "manifest.json"))
+        store_cached(self.cache, "b", X, y, None, 40000)
+        self.assertEqual(sorted(read_manifest(self.cache)), ["b"])
+        self.assertFalse(os.path.exists(os.path.join(self.cache, "a")))
+
+    def test_read_dataset_reuses_cache(self):
+        X, y, stats = read_dataset(self.conf)
+        self.assertEqual(len(read_manifest(self.cache)), 1)
+
+        cached_X, cached_y, cached_stats = read_dataset(self.conf)
+        self.assertIsInstance(cached_X, np.memmap)
+        np.testing.assert_array_equal(cached_X, X)
+        np.testing.assert_array_equal(cached_y, y)
+        self.assertEqual(cached_stats.to_dict(), stats.to_dict())
+        del cached_X
+
+    def test_lru_eviction(self):
+        X, y = np.zeros((100, 2, 32), dtype=np.float32), np.zeros(100, dtype=int)
+        store_cached(self.cache, "a", X, y, None, 1e6)
+        store_cached(self.cache, "b", X, y, None, 1e6)
+        load_cached(self.cache, "a")
+        # Only two entries fit, the least recently used one must go
+        store_cached(self.cache, "c", X, y, None, 70000)
+        self.assertEqual(sorted(read_manifest(self.cache)), ["a", "c"])
+        self.assertFalse(os.path.exists(os.path.join(self.cache, "b")))
+
+
+if __name__ == '__main__':
+    unittest.main()
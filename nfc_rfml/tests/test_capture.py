@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from dataset.capture import ConcatenatedSignal, load_captures
+
+
+class CaptureTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.parts = [(rng.standard_normal(n) + 1j * rng.standard_normal(n)).astype(np.complex64)
+                      for n in (7, 3, 11)]
+        self.full = np.concatenate(self.parts)
+        self.signal = ConcatenatedSignal(self.parts)
+
+    def test_length(self):
+        self.assertEqual(len(self.signal), len(self.full))
+
+    def test_slices_across_parts(self):
+        for start, stop in [(0, 21), (2, 5), (5, 12), (9, 10), (0, 7), (7, 10), (15, 30)]:
+            np.testing.assert_array_equal(self.signal[start:stop], self.full[start:stop])
+        np.testing.assert_array_equal(self.signal[1:20:3], self.full[1:20:3])
+
+    def test_fancy_indexing(self):
+        indices = np.array([[0, 6, 7], [9, 10, 20]])
+        np.testing.assert_array_equal(self.signal[indices], self.full[indices])
+        self.assertEqual(self.signal[-1], self.full[-1])
+
+    def test_read_only_slices(self):
+        # A slice within a part is a view of the capture, which must not be written through
+        view = self.signal[1:5]
+        with self.assertRaises(ValueError):
+            view[0] = 0
+        self.assertTrue(self.parts[0].flags.writeable)
+
+    def test_array_conversion(self):
+        np.testing.assert_array_equal(np.abs(self.signal), np.abs(self.full))
+
+    def test_load_captures(self):
+        with tempfile.TemporaryDirectory() as path:
+            for i, part in enumerate(self.parts):
+                part.tofile(os.path.join(path, f"tag1-{i}.nfc"))
+            signal = load_captures(path, ["tag1-0.nfc", "tag1-1.nfc", "tag1-2.nfc"])
+            self.assertEqual(signal.dtype, np.complex64)
+            np.testing.assert_array_equal(signal[3:15], self.full[3:15])
+            del signal
+
+
+if __name__ == '__main__':
+    unittest.main()
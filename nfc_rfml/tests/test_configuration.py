@@ -0,0 +1,42 @@
+import os
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from dataset.configuration import load_conf, save_conf
+from dataset.format import windows_3d
+
+
+class ConfigurationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+        os.makedirs(self.path / "project" / "data")
+
+        self.conf_path = self.path / "project" / "experiment.json"
+        with open(self.conf_path, "w") as file:
+            json.dump({"data": {"datapath": "data", "cache": "/tmp/cache", "windows": "3d"},
+                       "model": {"type": "svm"}}, file)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_paths_relative_to_file(self):
+        conf = load_conf(self.conf_path)
+        self.assertEqual(conf['data']['datapath'], str(self.path / "project" / "data"))
+        self.assertEqual(conf['data']['cache'], "/tmp/cache")
+        self.assertIs(conf['data']['windows'], windows_3d)
+
+    def test_saved_paths_relative_to_model(self):
+        model_dir = self.path / "saved_models" / "model"
+        os.makedirs(model_dir)
+        save_conf(self.conf_path, model_dir)
+
+        with open(model_dir / "experiment.json", "r") as file:
+            self.assertEqual(json.load(file)['data']['datapath'], os.path.join("..", "..", "project", "data"))
+        self.assertEqual(load_conf(model_dir / "experiment.json")['data']['datapath'],
+                         str(self.path / "project" / "data"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import re
+import unittest
+from pathlib import Path
+import numpy as np
+from dataset.decode import BIT_DURATION, SAMPLE_RATE, Frame, decode_signal, format_bits, format_frame
+
+REFERENCES = Path(__file__).resolve().parents[2] / "data" / "decoded-reader-frames"
+BIT = SAMPLE_RATE * BIT_DURATION
+
+
+def frame_bits(data, parity=True):
+    """Build the bits of a frame from its bytes, least significant bit first, each followed by its odd parity bit."""
+    bits = []
+    for value in data:
+        byte = [(value >> i) & 1 for i in range(8)]
+        bits += byte + ([1 - sum(byte) % 2] if parity else [])
+    return bits
+
+
+def reader_signal(signal, start, bits, pause=2.5e-6):
+    """Pause the carrier of a signal to send a reader frame."""
+    slot, previous = 0, 0
+    positions = [0.0]
+    for bit in list(bits) + [0]:
+        slot += 1
+        if bit:
+            positions.append(slot + 0.5)
+        elif not previous:
+            positions.append(slot)
+        previous = bit
+    for position in positions:
+        begin = int(round(start + position * BIT))
+        signal[begin:begin + int(round(pause * SAMPLE_RATE))] *= 0.02
+    return int(round(start + (slot + 2) * BIT))
+
+
+def tag_signal(signal, start, bits, depth=0.1, oversampling=16):
+    """Load-modulate the carrier of a signal to send a tag frame (Manchester coding on the subcarrier).
+    The modulation is built at a higher sample rate then averaged, as the receiver's decimation filters do.
+    """
+    time = (np.arange(len(signal) * oversampling) / oversampling - start) / BIT
+    slots = np.floor(time).astype(np.int64)
+    symbols = np.array([1] + list(bits))
+    inside = (slots >= 0) & (slots < len(symbols))
+    # A 1 is modulated during the first half of its bit, a 0 during the second half
+    first_half = (time - slots) < 0.5
+    modulated = inside & (first_half == (symbols[np.clip(slots, 0, len(symbols) - 1)] == 1))
+    # The subcarrier (16 periods of the carrier, 8 per bit) switches the tag's load on and off
+    subcarrier = np.floor(time * 16) % 2 == 0
+    signal *= (1 - depth * (modulated & subcarrier)).reshape(-1, oversampling).mean(axis=1)
+    return int(round(start + (len(bits) + 2) * BIT))
+
+
+def parse_reference(line):
+    """Rebuild frame bits which are formatted as the given line of the reference traces."""
+    bits = []
+    for token in re.findall(r" [0-9A-F]{2} |\([0-9A-F]{2}\)|/[0-9A-F]{2}\\|\[[0-9A-F]{2}\]|\(No parity\)", line):
+        if token == "(No parity)":
+            del bits[-1]
+            continue
+        value = int(token[1:3], 16)
+        if token[0] == "[":
+            bits += frame_bits([value])[:7]
+        elif token[0] == "/":
+            # The shortest number of bits holding the value (a lone 7-bit frame is a short frame)
+            bits += [(value >> i) & 1 for i in range(max(value.bit_length(), 1))]
+        else:
+            byte = frame_bits([value])
+            if token[0] == "(":
+                byte[-1] = 1 - byte[-1]
+            bits += byte
+    return bits
+
+
+class DecodeTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.carrier = (0.5 * np.exp(1j * rng.uniform(0, 2 * np.pi)) * np.ones(200000)).astype(np.complex64)
+        self.noise = (0.002 * (rng.standard_normal(200000) + 1j * rng.standard_normal(200000))).astype(np.complex64)
+
+    def test_format(self):
+        self.assertEqual(format_bits(frame_bits([0x30, 0x00, 0x02, 0xA8])), " 30   00   02   A8 ")
+        self.assertEqual(format_bits(frame_bits([0x26])[:7]), "[26]")
+        self.assertEqual(format_bits(frame_bits([0xF4], parity=False)), " F4  (No parity)")
+        self.assertEqual(format_bits(frame_bits([0xA5]) + [1, 1, 0, 1, 1, 1]), " A5  /3B\\")
+        wrong = frame_bits([0x30, 0xFE])
+        wrong[-1] = 1 - wrong[-1]
+        self.assertEqual(format_bits(wrong), " 30  (FE)")
+        self.assertEqual(format_frame(Frame("Tag", 0, np.array(frame_bits([0x04, 0x00])))), "Tag ->  04   00 ")
+
+    def test_reader_round_trip(self):
+        frames = [frame_bits([0x26])[:7], frame_bits([0x30, 0x00, 0x02, 0xA8]), frame_bits([0x93, 0x20]),
+                  frame_bits([0x50, 0x00, 0x57, 0xCD]), frame_bits([0x00, 0xFF, 0x55])]
+        signal, start = self.carrier.copy(), 1000
+        for bits in frames:
+            start = reader_signal(signal, start, bits) + 300
+
+        decoded = decode_signal(signal + self.noise)
+        self.assertEqual([frame.source for frame in decoded], ["Reader"] * len(frames))
+        self.assertEqual([frame.bits.tolist() for frame in decoded], frames)
+
+    def test_tag_round_trip(self):
+        # REQA, then the tag's ATQA, then READ and the 16 bytes of the answer
+        exchanges = [("Reader", frame_bits([0x26])[:7]), ("Tag", frame_bits([0x44, 0x00])),
+                     ("Reader", frame_bits([0x30, 0x04, 0x26, 0xEE])), ("Tag", frame_bits(range(0x41, 0x51))),
+                     ("Tag", [1, 0, 1, 0])]
+        signal, start = self.carrier.copy(), 1000
+        for source, bits in exchanges:
+            send = reader_signal if source == "Reader" else tag_signal
+            start = send(signal, start, bits) + 100
+
+        decoded = decode_signal(signal + self.noise)
+        self.assertEqual([(frame.source, frame.bits.tolist()) for frame in decoded],
+                         [(source, list(bits)) for source, bits in exchanges])
+        self.assertEqual(format_frame(decoded[1]), "Tag ->  44   00 ")
+
+    def test_reference_frames(self):
+        lines = sorted({line.rstrip("\n") for path in REFERENCES.glob("*.txt") for line in open(path)
+                        if line.startswith("Reader -> ")})
+        self.assertTrue(lines)
+
+        signal, start, expected = np.tile(self.carrier, 30), 1000, []
+        for line in lines:
+            bits = parse_reference(line)
+            self.assertEqual(format_bits(bits), line[len("Reader -> "):])
+            if start + (len(bits) + 10) * BIT < len(signal):
+                start = reader_signal(signal, start, bits) + 200
+                expected.append(line)
+
+        self.assertEqual([format_frame(frame) for frame in decode_signal(signal)], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
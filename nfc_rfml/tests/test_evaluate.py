@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from learn.evaluate import analyse_predictions
+
+
+class EvaluateTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+        os.makedirs(self.path / "wrong-predictions")
+        os.makedirs(self.path / "correct-predictions")
+
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(200, 2, 32)).astype(np.float32)
+        self.y = rng.integers(0, 3, 200)
+        self.y_pred = self.y.copy()
+        self.wrong = np.arange(0, 200, 4)
+        self.y_pred[self.wrong] = (self.y[self.wrong] + 1) % 3
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_plots_are_capped_and_summarized(self):
+        analyse_predictions(self.y, self.y_pred, self.X, self.path, max_plots=5, workers=2, tile_size=2)
+
+        summary = np.load(self.path / "misclassified.npz")
+        np.testing.assert_array_equal(summary["indices"], self.wrong)
+        np.testing.assert_array_equal(summary["windows"], self.X[self.wrong])
+        np.testing.assert_array_equal(summary["predictions"], self.y_pred[self.wrong])
+
+        for folder in ("wrong-predictions", "correct-predictions"):
+            files = os.listdir(self.path / folder)
+            self.assertEqual(len([file for file in files if file.startswith("t")]), 5)
+            self.assertEqual(sorted(file for file in files if file.startswith("overview")),
+                             ["overview-0.png", "overview-1.png", "overview-2.png"])
+
+    def test_no_wrong_predictions(self):
+        analyse_predictions(self.y, self.y, self.X.reshape(200, -1), self.path, workers=1)
+
+        self.assertEqual(len(np.load(self.path / "misclassified.npz")["indices"]), 0)
+        self.assertEqual(os.listdir(self.path / "wrong-predictions"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
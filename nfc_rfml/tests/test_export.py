@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+import numpy as np
+from learn.export import export_tflite, compare_models
+from learn.models.youssef_cnn import YoussefCNN
+from serve.lite import LiteModel
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.model = YoussefCNN(nb_outputs=3, input_shape=(None, 2, 64, 1))
+        self.X = np.random.default_rng(0).normal(size=(70, 2, 64)).astype(np.float32)
+
+    def test_exported_model_agrees(self):
+        with tempfile.TemporaryDirectory() as path:
+            model_path = os.path.join(path, "model.tflite")
+            size = export_tflite(self.model, model_path)
+            self.assertEqual(size, os.path.getsize(model_path))
+
+            comparison = compare_models(self.model, LiteModel(model_path), self.X, batch_size=32)
+
+        self.assertEqual(comparison["windows"], 70)
+        self.assertEqual(comparison["agreement"], 1.0)
+        self.assertLess(comparison["max difference"], 1e-5)
+
+    @unittest.skipUnless(importlib.util.find_spec("tflite_runtime"), "the standalone interpreter is not installed")
+    def test_serving_does_not_import_tensorflow(self):
+        code = "import sys; import serve.engine, serve.lite; print('tensorflow' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.stdout.strip(), "False", result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+import importlib.util
+import numpy as np
+from sklearn.svm import SVC
+from dataset.features import windows_features
+from dataset.format import filter_peaks_windows
+from dataset.tsfeatures import read_selected
+from serve.engine import InferenceEngine
+from serve.feature_model import FeatureModel, read_description, write_description
+from synthetic import random_capture
+
+
+class FeatureModelTest(unittest.TestCase):
+    def test_read_selected(self):
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, "names.csv"), "w") as file:
+                file.write("feature\nI__mean\nQ__variance\n")
+            self.assertEqual(read_selected(os.path.join(path, "names.csv")), ["I__mean", "Q__variance"])
+
+            # The table of selected features written by tsfresh
+            with open(os.path.join(path, "table.csv"), "w") as file:
+                file.write("id,I__mean,Q__variance\n0,0.1,0.2\n")
+            self.assertEqual(read_selected(os.path.join(path, "table.csv")), ["I__mean", "Q__variance"])
+
+    def test_saved_model_serves(self):
+        signal = random_capture(np.random.default_rng(0), 20000)
+        windows = filter_peaks_windows(signal, 64, np.asarray)
+        X = windows_features(windows)
+        y = (X[:, 3] > np.median(X[:, 3])).astype(int)
+
+        with tempfile.TemporaryDirectory() as path:
+            FeatureModel(SVC(probability=True, random_state=0).fit(X, y)).save(path)
+            write_description(path, ["crest_factor"], 64, [4, 7], {"min": [0.5], "max": [2.0], "median": [1.0]})
+            model = FeatureModel.load(path)
+            self.assertEqual(read_description(path)['tags'], [4, 7])
+            self.assertEqual(read_description(path)['imputation']['median'], [1.0])
+
+        # The engine formats the windows with the extractor of the features, the model only sees their vectors
+        conf = {"data": {"tags": [4, 7], "windows": windows_features, "windowsize": 64}}
+        engine = InferenceEngine(model, conf, batch_size=16)
+        predictions = list(engine.run([signal]))
+
+        self.assertEqual(len(predictions), len(windows))
+        np.testing.assert_allclose([p.confidence for p in predictions], model(X[..., np.newaxis]).max(axis=1),
+                                   rtol=1e-5)
+
+    @unittest.skipUnless(importlib.util.find_spec("tsfresh"), "tsfresh is not installed")
+    def test_selected_features(self):
+        from dataset.tsfeatures import SelectedFeatures, extract_windows_features
+
+        windows = np.random.default_rng(0).standard_normal((5, 64)).astype(np.complex64)
+        names = ["Q__variance", "I__fft_coefficient__attr_\"abs\"__coeff_3"]
+        extractor = SelectedFeatures(names)
+
+        result = extractor(windows)
+        self.assertEqual(result.shape, (5, 2))
+        np.testing.assert_allclose(result[:, 0], windows.imag.var(axis=1), rtol=1e-4)
+        reference = extract_windows_features(windows, extractor.parameters)
+        np.testing.assert_allclose(result, reference[names].to_numpy(), rtol=1e-5)
+        self.assertEqual(extractor(windows[:0]).shape, (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+from dataset import features
+from dataset.features import FEATURES, windows_features
+
+
+def feature(values, name):
+    return values[:, FEATURES.index(name)]
+
+
+class FeaturesTest(unittest.TestCase):
+    def setUp(self):
+        self.samples = np.arange(640)
+        # A tag's answer: the carrier load-modulated by a square subcarrier, between two quiet parts
+        envelope = np.where((self.samples >= 200) & (self.samples < 500), 1.0, 0.2)
+        envelope = envelope * (1 + 0.3 * np.sign(np.sin(2 * np.pi * 0.0625 * self.samples)))
+        self.window = (envelope * np.exp(2j * np.pi * 0.05 * self.samples)).astype(np.complex64)
+
+    def test_shape(self):
+        result = windows_features(np.stack([self.window] * 3))
+        self.assertEqual(result.shape, (3, len(FEATURES)))
+        self.assertEqual(result.dtype, np.float32)
+        self.assertEqual(windows_features(np.empty((0, 640), dtype=np.complex64)).shape, (0, len(FEATURES)))
+
+    def test_frequencies(self):
+        result = windows_features([self.window])
+        self.assertAlmostEqual(feature(result, "carrier_offset")[0], 0.05, places=3)
+        self.assertAlmostEqual(feature(result, "subcarrier_frequency")[0], 0.0625, places=3)
+        self.assertAlmostEqual(feature(result, "phase_noise")[0], 0, places=4)
+
+    def test_envelope(self):
+        step = np.where(self.samples >= 300, 1.0, 0.1).astype(np.complex64)
+        result = windows_features([step])
+        # The smoothing spreads the step over a few samples only
+        self.assertLess(feature(result, "rise_time")[0] * 640, features.SMOOTHING)
+        self.assertAlmostEqual(feature(result, "modulation_depth")[0], 0.9 / 1.1, places=5)
+
+    def test_iq_imbalance(self):
+        rng = np.random.default_rng(0)
+        noise = rng.standard_normal((100, 640)) + 0.5j * rng.standard_normal((100, 640))
+        result = windows_features(noise)
+        self.assertTrue(np.isfinite(result).all())
+        self.assertAlmostEqual(feature(result, "amplitude_imbalance").mean(), np.log(2), places=1)
+        self.assertAlmostEqual(feature(result, "phase_imbalance").mean(), 0, places=1)
+
+    def test_degenerate_windows(self):
+        # Silent and constant windows (e.g. the field off, or a saturated receiver) must not give NaN features
+        windows = np.zeros((4, 64), dtype=np.complex64)
+        windows[1] = 1
+        windows[2] = 1j
+        windows[3] = 0.3 - 0.7j
+        result = windows_features(windows)
+
+        for name in FEATURES:
+            with self.subTest(feature=name):
+                self.assertTrue(np.isfinite(feature(result, name)).all())
+        np.testing.assert_array_equal(feature(result, "phase_imbalance"), 0)
+        np.testing.assert_array_equal(feature(result, "spectral_kurtosis"), 0)
+
+    def test_chunks(self):
+        rng = np.random.default_rng(1)
+        windows = (rng.standard_normal((25, 64)) + 1j * rng.standard_normal((25, 64))).astype(np.complex64)
+        chunk_size = features.CHUNK_SIZE
+        try:
+            features.CHUNK_SIZE = 10
+            chunked = windows_features(windows)
+        finally:
+            features.CHUNK_SIZE = chunk_size
+        np.testing.assert_allclose(chunked, windows_features(windows), rtol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,14 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
 from pathlib import Path
-from preprocess.format import tags_files, partition, windows_2d, windows_3d, filter_peaks_windows
+import numpy as np
+from dataset.format import tags_files, partition, signal_windows, windows_2d, windows_3d, filter_peaks_windows, \
+    select_window_starts, gather_windows, stream_peaks_windows, read_dataset, split_indices, split_data, \
+    harmonize_length, class_weights, oversample_indices, format_tag, parallel_format_tags, FixedWindowScanner
+from dataset.capture import ConcatenatedSignal
+from synthetic import random_capture, write_captures
 
 DS1 = Path("../../data/dataset/1")
 
@@ -36,6 +44,166 @@ class FormatTest(unittest.TestCase):
         self.assertEqual(result, [[[0, 3.1], [5, -1]],
                                   [[0.3, 7], [-0.7, 0]]])
 
+    def test_signal_windows(self):
+        signal = np.arange(10) + 1j * np.arange(10)
+        result = signal_windows(signal, 4)
+        self.assertEqual(result.tolist(), [list(signal[0:4]), list(signal[4:8])])
+
+    def test_signal_windows_hop(self):
+        signal = np.arange(10)
+        result = signal_windows(signal, 4, hop=3)
+        self.assertEqual(result.tolist(), [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]])
+        self.assertEqual(signal_windows(signal, 12).shape, (0, 12))
+
+    def test_vectorized_windows_match_partition(self):
+        rng = np.random.default_rng(0)
+        signal = (rng.standard_normal(1003) + 1j * rng.standard_normal(1003)).astype(np.complex64)
+        windows = [window for window in partition(signal, 100) if len(window) == 100]
+
+        expected_2d = [np.append(np.real(window), [np.imag(window)]) for window in windows]
+        result_2d = windows_2d(signal_windows(signal, 100))
+        np.testing.assert_array_equal(result_2d, expected_2d)
+        self.assertEqual(result_2d.dtype, np.float32)
+        self.assertTrue(result_2d.flags['C_CONTIGUOUS'])
+
+        expected_3d = windows_3d(windows)
+        result_3d = windows_3d(signal_windows(signal, 100))
+        np.testing.assert_array_equal(result_3d, expected_3d)
+        self.assertEqual(result_3d.shape, (10, 2, 100))
+        self.assertEqual(result_3d.dtype, np.float32)
+        self.assertTrue(result_3d.flags['C_CONTIGUOUS'])
+
+    def test_select_window_starts(self):
+        rng = np.random.default_rng(1)
+        indices = np.unique(rng.integers(0, 100000, 5000))
+
+        expected = []
+        remaining = indices
+        while remaining.size != 0:
+            start = remaining[0]
+            remaining = remaining[remaining > start + 64]
+            expected.append(start)
+
+        self.assertEqual(select_window_starts(indices, 64).tolist(), expected)
+        self.assertEqual(select_window_starts(np.array([], dtype=int), 64).tolist(), [])
+
+    def test_gather_windows(self):
+        signal = np.arange(20) * 1j
+        result = gather_windows(signal, [0, 5, 17], 4)
+        self.assertEqual(result.tolist(), [list(signal[0:4]), list(signal[5:9])])
+
+        lazy = ConcatenatedSignal([signal[:6], signal[6:]])
+        np.testing.assert_array_equal(gather_windows(lazy, [0, 5, 17], 4), result)
+
+    def test_filter_peaks_windows(self):
+        signal = np.zeros(100, dtype=np.complex64)
+        signal[[10, 12, 40, 95]] = 1
+        result = filter_peaks_windows(signal, 8, windows_3d)
+        self.assertEqual(result.shape, (2, 2, 8))
+        self.assertEqual(result[:, 0, 0].tolist(), [1, 1])
+
+    def test_stream_peaks_windows(self):
+        signal = random_capture(np.random.default_rng(2), 20000)
+        expected = filter_peaks_windows(signal, 64, windows_2d)
+
+        for chunk_size in (1, 100, 5000, 50000):
+            batches = list(stream_peaks_windows(signal, 64, windows_2d, chunk_size=chunk_size, overlap=8))
+            np.testing.assert_array_equal(np.concatenate(batches), expected)
+
+    def test_fixed_window_scanner(self):
+        signal = np.arange(5000) * (1 + 1j)
+        for hop in (None, 16, 100):
+            for chunk_size in (1, 50, 999, 6000):
+                with self.subTest(hop=hop, chunk_size=chunk_size):
+                    scanner = FixedWindowScanner(64, hop)
+                    windows = [scanner.push(signal[start:start + chunk_size])
+                               for start in range(0, len(signal), chunk_size)]
+                    windows.append(scanner.flush())
+                    np.testing.assert_array_equal(np.concatenate(windows), signal_windows(signal, 64, hop))
+
+    def test_format_lazy_tag(self):
+        signal = random_capture(np.random.default_rng(4), 20000)
+        lazy = ConcatenatedSignal([signal[:7000], signal[7000:]])
+
+        def never_materialized(*args, **kwargs):
+            raise AssertionError("The lazy signal was read in memory at once")
+
+        with mock.patch.object(ConcatenatedSignal, "__array__", never_materialized):
+            for conf in ({"filter": True}, {"filter": False}, {"filter": False, "hop": 24, "chunksize": 1000}):
+                conf = dict(conf, windowsize=32, windows=windows_3d)
+                with self.subTest(conf=conf):
+                    np.testing.assert_array_equal(format_tag(lazy, conf), format_tag(signal, conf))
+
+    def test_parallel_read_dataset(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_captures(path, np.random.default_rng(3), (1, 2))
+
+            conf = {"datapath": path, "tags": [1, 2], "classes": [0, 1], "windowsize": 32,
+                    "windows": windows_3d, "filter": True, "normalize": True}
+            X, y, _ = read_dataset(conf)
+            parallel_X, parallel_y, _ = read_dataset(dict(conf, workers=2))
+
+        np.testing.assert_array_equal(parallel_X, X)
+        np.testing.assert_array_equal(parallel_y, y)
+
+    @unittest.skipUnless(os.path.isdir("/dev/shm"), "The shared memory blocks are listed in /dev/shm")
+    def test_parallel_failure_releases_blocks(self):
+        shared = set(os.listdir("/dev/shm"))
+        with tempfile.TemporaryDirectory() as path:
+            np.ones(5000, dtype=np.complex64).tofile(os.path.join(path, "tag1-1.nfc"))
+            conf = {"datapath": path, "windowsize": 32, "windows": windows_3d, "filter": False, "workers": 2}
+
+            # The second tag has no capture, its worker fails after the first one shared its windows
+            with self.assertRaises(FileNotFoundError):
+                parallel_format_tags(conf, [("tag1-1.nfc",), ("tag2-1.nfc",)])
+
+        self.assertEqual(set(os.listdir("/dev/shm")) - shared, set())
+
+    def test_split_indices(self):
+        y = np.repeat([0, 1, 2], 100)
+        train, validation, test = split_indices(y, 0.7, 0.2, 0.1)
+
+        self.assertEqual((len(train), len(validation), len(test)), (210, 60, 30))
+        self.assertEqual(len(np.unique(np.concatenate((train, validation, test)))), 300)
+        # Stratified and reproducible
+        self.assertEqual(np.bincount(y[test]).tolist(), [10, 10, 10])
+        np.testing.assert_array_equal(split_indices(y, 0.7, 0.2, 0.1)[0], train)
+        self.assertFalse(np.array_equal(split_indices(y, 0.7, 0.2, 0.1, seed=1)[0], train))
+
+    def test_split_data(self):
+        X, y = np.random.default_rng(0).random((100, 2, 8)), np.repeat([0, 1], 50)
+        (X_train, y_train), (X_val, y_val), (X_test, y_test) = split_data(X, y, 0.7, 0.2, 0.1)
+        self.assertEqual(X_train.shape, (70, 2, 8, 1))
+        self.assertEqual(y_test.shape, (10, 2))
+
+    def test_harmonize_length(self):
+        data = [np.full((n, 2, 4), label, dtype=np.float64) for label, n in enumerate((5, 3, 4))]
+
+        X, y = harmonize_length(data, [0, 1, 2])
+        self.assertEqual(X.dtype, np.float32)
+        self.assertEqual(y.tolist(), [0, 0, 0, 1, 1, 1, 2, 2, 2])
+        np.testing.assert_array_equal(X[:, 0, 0], y)
+
+        # The windows are only repeated once the dataset is split
+        X, y = harmonize_length(data, [0, 1, 2], "oversample")
+        self.assertEqual(np.bincount(y).tolist(), [5, 3, 4])
+        np.testing.assert_array_equal(X[:, 0, 0], y)
+
+        X, y = harmonize_length(data, [0, 1, 2], "weights")
+        self.assertEqual(np.bincount(y).tolist(), [5, 3, 4])
+        weights = class_weights(y)
+        self.assertAlmostEqual(weights[0] * 5, weights[1] * 3)
+
+    def test_oversample_indices(self):
+        y = np.repeat([0, 1, 2], [50, 30, 40])
+        train, validation, test = split_indices(y, 0.7, 0.2, 0.1)
+        oversampled = oversample_indices(y, train)
+
+        self.assertEqual(np.bincount(y[oversampled]).tolist(), [35, 35, 35])
+        self.assertEqual(set(oversampled.tolist()), set(train.tolist()))
+        self.assertTrue(np.all(np.diff(oversampled) >= 0))
+        self.assertFalse(set(oversampled.tolist()) & (set(validation.tolist()) | set(test.tolist())))
+
 
 if __name__ == '__main__':
     unittest.main()
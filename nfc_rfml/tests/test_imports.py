@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+import subprocess
+
+# Modules which take seconds to import and must only be loaded by the commands which need them
+HEAVY_MODULES = ["tensorflow", "sklearn", "matplotlib", "scipy"]
+# Import time allowed for the command-line entry points, in seconds (importing TensorFlow alone takes several)
+IMPORT_BUDGET = 1.0
+
+
+def import_times(module):
+    """Import a module in a new interpreter with `python -X importtime`.
+    :param module: The name of the module to import
+    :return: A dictionary of the cumulative import time (in seconds) of every module imported, indexed by name
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+
+    return times
+
+
+class ImportsTest(unittest.TestCase):
+    def test_light_modules(self):
+        for module in ["app", "dataset.format", "dataset.configuration", "serve.engine"]:
+            with self.subTest(module=module):
+                times = import_times(module)
+                self.assertEqual([name for name in times if name.split(".")[0] in HEAVY_MODULES], [])
+                self.assertLess(times[module], IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+from dataset.normalize import WindowStats, normalize_dataset, normalization_method
+from dataset.format import windows_3d
+from dataset.features import windows_features
+
+
+class NormalizeTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = (rng.standard_normal((5000, 2, 16)) * [[3], [0.5]] + [[1], [-2]]).astype(np.float32)
+
+    def test_max_matches_global_max(self):
+        expected = self.X / np.abs(self.X).max()
+        X, stats = normalize_dataset(self.X.copy(), "max")
+        np.testing.assert_allclose(X, expected)
+        self.assertEqual(X.dtype, np.float32)
+
+    def test_incremental_statistics(self):
+        stats = WindowStats("standard")
+        for start in range(0, len(self.X), 1000):
+            stats.update(self.X[start:start + 1000])
+
+        np.testing.assert_allclose(stats.mean, self.X.mean(axis=(0, 2)), rtol=1e-5)
+        np.testing.assert_allclose(stats.std, self.X.std(axis=(0, 2)), rtol=1e-5)
+
+        X = stats.apply(self.X.copy())
+        np.testing.assert_allclose(X.mean(axis=(0, 2)), [0, 0], atol=1e-4)
+        np.testing.assert_allclose(X.std(axis=(0, 2)), [1, 1], rtol=1e-4)
+
+    def test_2d_layout_channels(self):
+        X_2d = self.X.reshape(len(self.X), -1)
+        stats = WindowStats("standard")
+        stats.update(X_2d)
+        np.testing.assert_allclose(stats.mean, self.X.mean(axis=(0, 2)), rtol=1e-5)
+
+    def test_rms(self):
+        X, _ = normalize_dataset(self.X.copy(), "rms")
+        np.testing.assert_allclose(np.sqrt(np.mean(np.square(X), axis=(1, 2))), 1, rtol=1e-5)
+
+    def test_reused_statistics(self):
+        _, stats = normalize_dataset(self.X.copy(), "max")
+        X, reused = normalize_dataset(self.X[:10] * 2, "max", WindowStats(**stats.to_dict()))
+        np.testing.assert_allclose(X, self.X[:10] * 2 / stats.maximum)
+
+    def test_normalization_method(self):
+        self.assertEqual(normalization_method(True), "max")
+        self.assertIsNone(normalization_method(False))
+        self.assertEqual(normalization_method("standard", windows_3d), "standard")
+        self.assertIsNone(normalization_method(False, windows_features))
+
+        # The features are not I/Q samples, they must not be normalized as such
+        for method in ("standard", "rms"):
+            with self.assertRaises(ValueError):
+                normalization_method(method, windows_features)
+
+
+if __name__ == '__main__':
+    unittest.main()
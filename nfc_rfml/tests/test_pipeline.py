@@ -0,0 +1,35 @@
+import unittest
+import numpy as np
+from learn.pipeline import window_dataset
+
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.X = np.random.default_rng(0).random((50, 2, 8)).astype(np.float32)
+        self.y = np.arange(50)
+
+    def test_batches_keep_order(self):
+        indices = np.array([7, 3, 41, 0, 12])
+        batches = list(window_dataset(self.X, self.y, indices, 2).as_numpy_iterator())
+        windows = np.concatenate([batch[0] for batch in batches])
+        labels = np.concatenate([batch[1] for batch in batches])
+
+        self.assertEqual(windows.shape, (5, 2, 8, 1))
+        np.testing.assert_array_equal(windows[..., 0], self.X[indices])
+        np.testing.assert_array_equal(labels, indices)
+
+    def test_shuffled_epochs_cover_indices(self):
+        indices = np.arange(0, 50, 2)
+        for cache in (False, True):
+            dataset = window_dataset(self.X, self.y, indices, 4, shuffle=True, cache=cache, seed=1)
+            for _ in range(2):
+                labels = np.concatenate([batch[1] for batch in dataset.as_numpy_iterator()])
+                self.assertEqual(sorted(labels), list(indices))
+
+    def test_windows_only(self):
+        batches = list(window_dataset(self.X, None, np.arange(50), 16).as_numpy_iterator())
+        np.testing.assert_array_equal(np.concatenate(batches)[..., 0], self.X)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+import tensorflow as tf
+from learn.prune import MedianPruner, HalvingPruner, PruningCallback, make_pruner
+
+
+class PruneTest(unittest.TestCase):
+    def test_median_pruner(self):
+        pruner = MedianPruner(warmup=2, min_trials=2)
+        curves = {0: [1.0, 0.8, 0.6, 0.5], 1: [1.0, 0.9, 0.7, 0.6], 2: [1.2, 1.1, 1.0]}
+        self.assertTrue(pruner.should_prune(2, curves))
+        self.assertFalse(pruner.should_prune(2, {**curves, 2: [1.2, 1.1]}))
+        self.assertFalse(pruner.should_prune(0, {**curves, 0: [1.0, 0.8, 0.5]}))
+        # Not enough trials reached the epoch to compare
+        self.assertFalse(pruner.should_prune(2, {0: curves[0], 2: curves[2]}))
+
+    def test_halving_pruner(self):
+        pruner = HalvingPruner(min_epochs=2, reduction=2)
+        self.assertEqual([epoch for epoch in range(1, 20) if pruner.is_rung(epoch)], [2, 4, 8, 16])
+
+        curves = {0: [1.0, 0.5], 1: [1.0, 0.7], 2: [1.0, 0.9], 3: [1.0, 0.6]}
+        self.assertEqual([pruner.should_prune(trial, curves) for trial in curves], [False, True, True, False])
+        # Between rungs, and for the first trial to reach a rung, nothing is stopped
+        self.assertFalse(pruner.should_prune(2, {2: [1.0, 0.9, 0.9], 0: [1.0, 0.5, 0.4]}))
+        self.assertFalse(pruner.should_prune(2, {2: [1.0, 0.9], 0: [1.0]}))
+
+    def test_make_pruner(self):
+        pruner = make_pruner({"type": "halving", "min_epochs": 3})
+        self.assertIsInstance(pruner, HalvingPruner)
+        self.assertEqual((pruner.min_epochs, pruner.reduction), (3, 3))
+
+    def test_callback_stops_training(self):
+        store = {0: [0.01] * 10, 1: [0.01] * 10}
+        callback = PruningCallback(MedianPruner(warmup=2, min_trials=2), 2, store)
+
+        model = tf.keras.Sequential([tf.keras.Input((4,)), tf.keras.layers.Dense(2, activation="softmax")])
+        model.compile(optimizer="adam", loss="sparse_categorical_crossentropy")
+        X = np.random.default_rng(0).normal(size=(32, 4)).astype(np.float32)
+        y = (X[:, 0] > 0).astype(np.int64)
+        history = model.fit(X, y, validation_data=(X, y), epochs=10, callbacks=[callback], verbose=0)
+
+        self.assertEqual(callback.pruned, 3)
+        self.assertEqual(len(history.history['val_loss']), 3)
+        self.assertEqual(store[2], history.history['val_loss'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from learn.models.youssef_cnn import YoussefCNN
+from learn.quantize import quantize_model, representative_windows
+
+
+class QuantizeTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(120, 2, 64)).astype(np.float32)
+        self.y = np.repeat([0, 1, 2], 40)
+        self.model = YoussefCNN(nb_outputs=3, input_shape=(None, 2, 64, 1))
+
+    def test_representative_windows(self):
+        windows = representative_windows(self.X, np.arange(0, 120, 2), count=10)
+        self.assertEqual(windows.shape, (10, 2, 64))
+        self.assertTrue(all(any(np.array_equal(w, self.X[i]) for i in range(0, 120, 2)) for w in windows))
+
+    def test_quantize_model(self):
+        with tempfile.TemporaryDirectory() as path:
+            path = Path(path)
+            report = quantize_model(self.model, self.X, self.y, np.arange(80), np.arange(80, 120), path, batch_size=16)
+
+            for file in ["model.tflite", "model-dynamic.tflite", "model-int8.tflite", "quantization.json",
+                         "quantization.txt"]:
+                self.assertTrue((path / file).exists(), file)
+
+        self.assertEqual(list(report), ["float32", "dynamic", "int8"])
+        self.assertLess(report["int8"]["size"], report["float32"]["size"] / 2)
+        self.assertLess(report["dynamic"]["size"], report["float32"]["size"] / 2)
+        self.assertEqual(report["float32"]["classification"]["macro avg"]["support"], 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+import threading
+import numpy as np
+from dataset.format import windows_3d, filter_peaks_windows, signal_windows
+from serve.engine import InferenceEngine
+from serve.batching import BatchScheduler
+from serve.sources import samples_from_bytes, file_source
+from synthetic import random_capture
+
+
+class FirstSampleModel:
+    """Stand-in for a model, predicting the label from the magnitude of the first sample of a window"""
+
+    def __call__(self, X, training=False):
+        labels = (np.hypot(X[:, 0, 0, 0], X[:, 1, 0, 0]) > 0.15).astype(int)
+        return np.eye(2)[labels]
+
+
+class ServeTest(unittest.TestCase):
+    def setUp(self):
+        self.signal = random_capture(np.random.default_rng(0), 50000)
+        self.conf = {"data": {"tags": [4, 7], "windows": windows_3d, "windowsize": 64}}
+
+    def test_samples_from_bytes(self):
+        data = self.signal[:100].tobytes()
+        pieces = iter([data[:13], data[13:500], data[500:], b""])
+        samples = list(samples_from_bytes(lambda size: next(pieces), 64))
+        np.testing.assert_array_equal(np.concatenate(samples), self.signal[:100])
+
+    def test_engine_classifies_every_window(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.signal.tofile(os.path.join(path, "capture.nfc"))
+            engine = InferenceEngine(FirstSampleModel(), self.conf, batch_size=16)
+            predictions = list(engine.run(file_source(os.path.join(path, "capture.nfc"), chunk_size=3000)))
+
+        windows = filter_peaks_windows(self.signal, 64, windows_3d)
+        self.assertEqual(len(predictions), len(windows))
+        self.assertEqual([p.tag for p in predictions], [[4, 7][int(w[0, 0] ** 2 + w[1, 0] ** 2 > 0.15 ** 2)]
+                                                        for w in windows])
+        self.assertEqual(engine.latency_report()["predictions"], len(windows))
+
+    def test_engine_without_filter(self):
+        # A model trained on every window (with a hop) is served every window, not only those at the peaks
+        conf = {"data": dict(self.conf['data'], filter=False, hop=48)}
+        engine = InferenceEngine(FirstSampleModel(), conf, batch_size=16)
+        predictions = list(engine.run(self.signal[start:start + 3000] for start in range(0, len(self.signal), 3000)))
+
+        windows = signal_windows(self.signal, 64, 48)
+        self.assertEqual([p.start for p in predictions], list(range(0, 48 * len(windows), 48)))
+        self.assertEqual([p.tag for p in predictions], [[4, 7][int(abs(w[0]) > 0.15)] for w in windows])
+
+    def test_scheduler_batches_concurrent_callers(self):
+        batch_sizes = []
+
+        def forward(X):
+            batch_sizes.append(len(X))
+            return X.reshape(len(X), -1).sum(axis=1)
+
+        scheduler = BatchScheduler(forward, max_batch_size=32, max_wait=0.05)
+        results = {}
+
+        def call(caller):
+            X = np.full((4, 2), caller, dtype=np.float32)
+            results[caller] = scheduler.predict(X)
+
+        callers = [threading.Thread(target=call, args=(caller,)) for caller in range(8)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        scheduler.close()
+
+        self.assertEqual({caller: result.tolist() for caller, result in results.items()},
+                         {caller: [2.0 * caller] * 4 for caller in range(8)})
+        self.assertLess(len(batch_sizes), 8)
+        self.assertEqual(scheduler.report()["windows"], 32)
+
+    def test_engine_with_scheduler(self):
+        model = FirstSampleModel()
+        scheduler = BatchScheduler(lambda X: model(X), max_batch_size=64)
+        engine = InferenceEngine(None, self.conf, batch_size=16, scheduler=scheduler)
+        predictions = engine.feed(self.signal) + engine.flush()
+        scheduler.close()
+
+        self.assertEqual(len(predictions), len(filter_peaks_windows(self.signal, 64, windows_3d)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from learn.svm import ENGINES, make_svm, compare_svms, train_test_indices, training_weights
+
+
+class SvmTest(unittest.TestCase):
+    def setUp(self):
+        # Two classes of windows with different amplitudes, in the 3d layout
+        rng = np.random.default_rng(0)
+        self.y = np.repeat([0, 1], 600)
+        self.X = (rng.normal(size=(1200, 2, 16)) * (1 + self.y[:, np.newaxis, np.newaxis])).astype(np.float32)
+        self.train, self.test = train_test_indices(len(self.y))
+        self.conf = {"components": 200, "svmbatchsize": 100, "svmepochs": 20}
+
+    def test_split(self):
+        self.assertEqual((len(self.train), len(self.test)), (840, 360))
+        self.assertEqual(len(np.union1d(self.train, self.test)), 1200)
+        self.assertTrue(np.all(np.diff(self.train) > 0))
+
+    def test_engines(self):
+        results = compare_svms(self.X, self.y, self.train, self.test, self.conf)
+
+        self.assertEqual(list(results), ENGINES)
+        # The amplitude is not linearly separable, only the RBF kernel and its approximations find it
+        for engine in ("svc", "nystroem", "rff"):
+            self.assertGreater(results[engine]["accuracy"], 0.9, engine)
+
+    def test_streaming_from_memmap(self):
+        with tempfile.TemporaryDirectory() as path:
+            np.save(os.path.join(path, "X.npy"), self.X)
+            X = np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+
+            model = make_svm(dict(self.conf, engine="nystroem")).fit(X, self.y, self.train)
+            y_pred = model.predict(X, self.test)
+
+        self.assertEqual(len(y_pred), len(self.test))
+        self.assertGreater(np.mean(y_pred == self.y[self.test]), 0.9)
+
+    def test_mixed_batches(self):
+        model = make_svm(dict(self.conf, engine="sgd", svmepochs=2))
+        batches = []
+        model.classifier.partial_fit = lambda X, y, classes: batches.append(y)
+        model.fit(self.X, self.y, self.train)
+
+        self.assertEqual(sum(len(batch) for batch in batches), 2 * len(self.train))
+        # The training windows are sorted by class, but every batch holds both
+        self.assertTrue(all(len(np.unique(batch)) == 2 for batch in batches))
+
+    def test_cnn_parameters(self):
+        # The epochs and batch size of the CNNs do not apply to the SVMs
+        model = make_svm({"engine": "sgd", "epochs": 200, "batchsize": 500})
+        self.assertEqual((model.epochs, model.batch_size), (5, 1000))
+
+    def test_class_weights(self):
+        self.assertIsNone(training_weights(self.y, np.arange(1200)))
+
+        y = np.repeat([0, 1], [900, 300])
+        weights = training_weights(y, np.arange(1200))
+        self.assertAlmostEqual(weights[1], 3 * weights[0])
+        # Every engine weighs the classes, not only the CNNs
+        for engine in ENGINES:
+            model = make_svm({"engine": engine}, weights)
+            self.assertEqual(model.classifier.class_weight, weights, engine)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            make_svm({"engine": "tree"})
+
+
+if __name__ == '__main__':
+    unittest.main()
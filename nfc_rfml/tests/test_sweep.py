@@ -0,0 +1,83 @@
+import os
+import csv
+import json
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from dataset.cache import read_manifest
+from learn.sweep import expand_grid, sample_random, apply_parameters, read_sweep, run_sweep
+from synthetic import write_captures
+
+
+class SweepTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+        write_captures(self.path, np.random.default_rng(0), (1, 2), (1, 2), size=5000,
+                       amplitude=lambda tag: 0.1 + 0.05 * tag)
+
+        self.base = {"data": {"datapath": str(self.path), "tags": [1, 2], "classes": [0, 1], "windowsize": 32,
+                              "windows": "2d", "filter": False, "normalize": False},
+                     "model": {"type": "svm"}}
+        with open(self.path / "experiment.json", "w") as file:
+            json.dump(self.base, file)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_expand_grid(self):
+        grid = expand_grid({"data.windowsize": [32, 64], "model.batchsize": [10, 20, 30]})
+        self.assertEqual(len(grid), 6)
+        self.assertIn({"data.windowsize": 64, "model.batchsize": 20}, grid)
+
+    def test_sample_random(self):
+        parameters = {"data.windowsize": [32, 64], "model.batchsize": [10, 20, 30]}
+        sample = sample_random(parameters, 4, seed=1)
+        self.assertEqual(len(sample), 4)
+        self.assertEqual(len({json.dumps(a, sort_keys=True) for a in sample}), 4)
+        self.assertEqual(sample, sample_random(parameters, 4, seed=1))
+        self.assertEqual(len(sample_random(parameters, 10)), 6)
+
+    def test_apply_parameters(self):
+        conf = apply_parameters(self.base, {"data.windowsize": 64, "model.type": "youssef"})
+        self.assertEqual((conf['data']['windowsize'], conf['model']['type']), (64, "youssef"))
+        self.assertEqual(self.base['data']['windowsize'], 32)
+
+    def test_read_sweep(self):
+        # The base is relative to the description, not to the working directory
+        with open(self.path / "sweep.json", "w") as file:
+            json.dump({"base": "experiment.json", "parameters": {"data.windowsize": [16, 32]}}, file)
+        trials, _ = read_sweep(self.path / "sweep.json")
+        self.assertEqual([conf['data']['windowsize'] for _, conf in trials], [16, 32])
+
+        with open(self.path / "sweep.json", "w") as file:
+            json.dump({"base": "experiment.json", "parameters": {"model.type": ["svm", "youssef"]}}, file)
+        with self.assertRaises(ValueError):
+            read_sweep(self.path / "sweep.json")
+
+    def test_run_sweep(self):
+        with open(self.path / "sweep.json", "w") as file:
+            json.dump({"base": str(self.path / "experiment.json"),
+                       "parameters": {"data.windowsize": [16, 32], "data.normalize": [False, "rms"]}}, file)
+
+        trials, pruner = read_sweep(self.path / "sweep.json")
+        self.assertIsNone(pruner)
+        rows = run_sweep(trials, self.path / "sweep", workers=2, threads=1)
+
+        self.assertEqual(sorted(row['trial'] for row in rows), [0, 1, 2, 3])
+        self.assertTrue(all(row['status'] == "complete" for row in rows), rows)
+        self.assertEqual([row['accuracy'] for row in rows], sorted((row['accuracy'] for row in rows), reverse=True))
+        # One dataset was preprocessed for each distinct data section
+        self.assertEqual(len(read_manifest(self.path / "sweep" / "cache")), 4)
+
+        with open(self.path / "sweep" / "results.csv", newline="") as file:
+            table = list(csv.DictReader(file))
+        self.assertEqual(len(table), 4)
+        self.assertIn("data.windowsize", table[0])
+        self.assertTrue(os.path.exists(self.path / "sweep" / "trial-000" / "experiment.json"))
+
+
+if __name__ == '__main__':
+    unittest.main()
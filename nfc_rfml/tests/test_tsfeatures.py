@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+import importlib.util
+import numpy as np
+from dataset.tsfeatures import capture_tag, capture_key, extract_captures, read_table, write_table, \
+    imputation_values, impute_features
+
+HAS_TSFRESH = importlib.util.find_spec("tsfresh") is not None
+
+
+def write_capture(path, file, seed):
+    rng = np.random.default_rng(seed)
+    # Bursts of a modulated carrier separated by silences, so that peaks are found at each burst
+    signal = np.zeros(4000, dtype=np.complex64)
+    for start in range(0, 4000, 500):
+        signal[start:start + 200] = (0.5 + 0.1 * rng.standard_normal(200)) * np.exp(2j * np.pi * 0.05 * np.arange(200))
+    signal.tofile(os.path.join(path, file))
+
+
+class TsfeaturesTest(unittest.TestCase):
+    def test_capture_tag(self):
+        self.assertEqual(capture_tag("tag3-2.nfc"), 3)
+        self.assertEqual(capture_tag("tag12-1.nfc"), 12)
+        with self.assertRaises(ValueError):
+            capture_tag("capture.nfc")
+
+    def test_capture_key(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_capture(path, "tag1-1.nfc", 0)
+            key = capture_key(path, "tag1-1.nfc", {"windowsize": 256})
+            self.assertEqual(key, capture_key(path, "tag1-1.nfc", {"windowsize": 256}))
+            self.assertNotEqual(key, capture_key(path, "tag1-1.nfc", {"windowsize": 128}))
+
+            stat = os.stat(os.path.join(path, "tag1-1.nfc"))
+            os.utime(os.path.join(path, "tag1-1.nfc"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            self.assertNotEqual(key, capture_key(path, "tag1-1.nfc", {"windowsize": 256}))
+
+    def test_imputation(self):
+        training = np.array([[1, np.nan, 5], [3, np.nan, -np.inf], [2, np.nan, 7], [np.inf, np.nan, 6]])
+        values = imputation_values(training)
+        self.assertEqual(values, {"min": [1, 0, 5], "max": [3, 0, 7], "median": [2, 0, 6]})
+
+        # A batch is imputed with the values of the training windows, not with its own
+        batch = np.array([[np.nan, np.nan, np.inf], [-np.inf, 4, 100]], dtype=np.float32)
+        imputed = impute_features(batch, values)
+        self.assertEqual(imputed.dtype, np.float32)
+        np.testing.assert_array_equal(imputed, [[2, 0, 7], [1, 4, 100]])
+
+    @unittest.skipUnless(HAS_TSFRESH, "tsfresh is not installed")
+    def test_incremental_extraction(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache_dir = os.path.join(path, "cache")
+            write_capture(path, "tag1-1.nfc", 0)
+            write_capture(path, "tag2-1.nfc", 1)
+
+            first = extract_captures(path, ["tag1-1.nfc"], cache_dir, window_size=64, features="minimal")
+            self.assertEqual(first['tag'].unique().tolist(), [1])
+            self.assertEqual(first['window'].tolist(), list(range(len(first))))
+
+            # Only the new capture is extracted, the first one is read from the cache
+            table = extract_captures(path, ["tag1-1.nfc", "tag2-1.nfc"], cache_dir, window_size=64, features="minimal")
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            np.testing.assert_allclose(table[table['tag'] == 1]['I__mean'], first['I__mean'])
+
+            output = os.path.join(path, "features.npz")
+            write_table(table, output)
+            self.assertEqual(read_table(output).columns.tolist(), table.columns.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()